@@ -0,0 +1,763 @@
+"""Background AI analysis of videos.
+
+Endpoints submit an analysis and get an ID back straight away; the prompt
+runs on a small thread pool and the result is cached per (video ID, prompt
+version, model). The model client is replaceable: GeminiClient talks to
+the Gemini API, StubModelClient answers locally for tests and benchmarks.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import MODEL_SECONDS
+from transcripts import TranscriptUnavailable, chunk_transcript
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Bump when the prompts change so cached results from older prompts are not reused
+PROMPT_VERSION = "1"
+
+JSON_FORMAT = """Please provide analysis in this exact JSON format:
+{{
+  "summary": "{prefix} [Your analysis here. If {insufficient} is insufficient, acknowledge this limitation.]",
+  "keyPoints": ["key point 1", "key point 2", "key point 3"],
+  "topics": ["topic 1", "topic 2", "topic 3"]
+}}
+
+Only return the JSON object, no other text."""
+
+
+def video_details(video_data, video_title):
+    """The metadata lines shown to the model for one video"""
+    description = (video_data.get('description') or '')[:1000]  # Limit description length
+    duration = video_data.get('duration') or 0
+    uploader = video_data.get('uploader', 'Unknown')
+    view_count = video_data.get('view_count') or 0
+    upload_date = video_data.get('upload_date', 'Unknown')
+
+    return f"""Title: {video_title}
+Uploader: {uploader}
+Duration: {duration} seconds ({duration//60} minutes {duration%60} seconds)
+View Count: {view_count:,} views
+Upload Date: {upload_date}
+Description: {description[:800]}..."""
+
+
+def metadata_prompt(video_data, video_title):
+    """Prompt built from the yt-dlp metadata (title, uploader, description...)"""
+    return f"""Based on the available metadata for this YouTube video, provide an analysis in JSON format.
+
+CRITICAL LIMITATION: You are analyzing based on title and description ONLY. You cannot see, hear, or process the actual video content. You must acknowledge this limitation in your response.
+
+Video Information:
+{video_details(video_data, video_title)}
+
+MANDATORY INSTRUCTIONS:
+- Start your summary with "Based on the video metadata (title and description) only:"
+- Acknowledge that you cannot see the actual video content
+- Base your analysis ONLY on the provided title and description
+- If the description is too short or vague, explicitly state this limitation
+- Do not invent specific details not mentioned in the metadata
+- Focus on what can be reasonably inferred from the available information
+- If you cannot provide meaningful analysis due to limited information, state this clearly
+
+""" + JSON_FORMAT.format(prefix="Based on the video metadata (title and description) only:",
+                         insufficient="information")
+
+
+def title_prompt(video_title):
+    """Fallback prompt when only the title is known"""
+    return f"""Based on the video title only, provide a limited analysis in JSON format.
+
+CRITICAL LIMITATION: You only have access to the title: "{video_title}"
+You cannot see, hear, or process the actual video content. You must acknowledge this limitation.
+
+MANDATORY INSTRUCTIONS:
+- Start your summary with "Based on the video title only:"
+- Explicitly state that you cannot see the actual video content
+- Do not make assumptions about content you cannot see
+- If the title is unclear or insufficient, acknowledge this limitation
+- Focus only on what can be reasonably inferred from the title
+
+""" + JSON_FORMAT.format(prefix="Based on the video title only:", insufficient="the title")
+
+
+def url_prompt(url):
+    """Prompt for /analyze, which only has the URL"""
+    return f"""Based on the YouTube URL provided, provide a limited analysis in JSON format.
+
+CRITICAL LIMITATION: You are analyzing based on URL only. You cannot see, hear, or process the actual video content. You must acknowledge this limitation.
+
+MANDATORY INSTRUCTIONS:
+- Start your summary with "Based on the YouTube URL only:"
+- Explicitly state that you cannot see the actual video content
+- Do not make assumptions about content you cannot see
+- If you cannot access the video information, acknowledge this limitation
+- Focus only on what can be reasonably inferred from the URL
+
+YouTube URL: {url}
+
+""" + JSON_FORMAT.format(prefix="Based on the YouTube URL only:", insufficient="information")
+
+
+def video_prompt(video_data, video_title):
+    """Metadata prompt when the extraction succeeded, title-only prompt otherwise.
+
+    Returns (prompt kind, prompt); the kind is part of the cache key.
+    """
+    if video_data is not None:
+        try:
+            return "metadata", metadata_prompt(video_data, video_title)
+        except Exception:
+            pass
+    return "title", title_prompt(video_title)
+
+
+def _timestamp(seconds):
+    seconds = int(seconds or 0)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def chunk_prompt(video_title, chunk, count):
+    """Prompt summarizing one transcript chunk (see transcripts.chunk_transcript)"""
+    return f"""Below is part {chunk["index"] + 1} of {count} of the transcript of the YouTube video "{video_title}", from {_timestamp(chunk["start"])} to {_timestamp(chunk["end"])}.
+
+Summarize what is said in this part in JSON format.
+
+MANDATORY INSTRUCTIONS:
+- Base your summary ONLY on this part of the transcript
+- Automatic captions can contain recognition errors; do not repeat obvious mistakes
+- Do not guess what happens in the other parts of the video
+
+Transcript:
+{chunk["text"]}
+
+Please provide the summary in this exact JSON format:
+{{
+  "summary": "[What this part of the video covers, in a few sentences.]",
+  "keyPoints": ["key point 1", "key point 2", "key point 3"],
+  "topics": ["topic 1", "topic 2"]
+}}
+
+Only return the JSON object, no other text."""
+
+
+def reduce_prompt(video_title, partials):
+    """Prompt combining the chunk summaries of a transcript into the final analysis"""
+    parts = "\n\n".join(
+        f"Part {number} ({_timestamp(part['start'])}-{_timestamp(part['end'])}):\n{part['summary']}\n"
+        + "\n".join(f"- {point}" for point in part.get("keyPoints", []))
+        for number, part in enumerate(partials, 1))
+    return f"""Below are summaries of consecutive parts of the transcript of the YouTube video "{video_title}". Combine them into an analysis of the whole video in JSON format.
+
+MANDATORY INSTRUCTIONS:
+- Start your summary with "Based on the video transcript:"
+- Base your analysis ONLY on the part summaries below
+- Keep the key points to the most important ones across the whole video
+- Do not invent details that are not in the summaries
+
+{parts}
+
+""" + JSON_FORMAT.format(prefix="Based on the video transcript:", insufficient="the transcript")
+
+
+def batch_prompt(sections):
+    """One prompt covering several videos; `sections` are video_details() texts"""
+    videos = "\n\n".join(f"Video {number}:\n{section}" for number, section in enumerate(sections, 1))
+    return f"""Based on the available metadata for the {len(sections)} YouTube videos below, provide a separate analysis of each video in JSON format.
+
+CRITICAL LIMITATION: You are analyzing based on title and description ONLY. You cannot see, hear, or process the actual video content. You must acknowledge this limitation in every summary.
+
+{videos}
+
+MANDATORY INSTRUCTIONS:
+- Analyze every video on its own; do not mix up details between videos
+- Start every summary with "Based on the video metadata (title and description) only:"
+- Base each analysis ONLY on that video's title and description
+- If a description is too short or vague, explicitly state this limitation
+- Do not invent specific details not mentioned in the metadata
+
+Please provide the analyses as a JSON array with exactly one object per video, in this exact format:
+[
+  {{
+    "video": 1,
+    "summary": "Based on the video metadata (title and description) only: [Your analysis here.]",
+    "keyPoints": ["key point 1", "key point 2", "key point 3"],
+    "topics": ["topic 1", "topic 2", "topic 3"]
+  }}
+]
+
+Only return the JSON array, no other text."""
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) used to pack batches"""
+    return len(text) // 4 + 1
+
+
+def _strip_code_block(text):
+    # Extract JSON string from markdown code block if present
+    response_text = text.strip()
+    if response_text.startswith('```json') and response_text.endswith('```'):
+        return response_text[len('```json'):-len('```')].strip()
+    return response_text
+
+
+def parse_batch(text, count):
+    """Per-video results from a batch answer as {index: result}; missing or malformed entries are left out"""
+    try:
+        answer = json.loads(_strip_code_block(text))
+    except json.JSONDecodeError:
+        return {}
+    if isinstance(answer, dict):
+        answer = answer.get("videos") or answer.get("analyses") or []
+    if not isinstance(answer, list):
+        return {}
+
+    results = {}
+    for position, item in enumerate(answer):
+        if not isinstance(item, dict) or not item.get("summary"):
+            continue
+        try:
+            index = int(item.get("video", position + 1)) - 1
+        except (TypeError, ValueError):
+            index = position
+        if 0 <= index < count and index not in results:
+            results[index] = {
+                "summary": item.get("summary", ""),
+                "keyPoints": item.get("keyPoints", []),
+                "topics": item.get("topics", [])
+            }
+    return results
+
+
+def parse_analysis(text):
+    """Read the model's JSON answer; returns (result, parsed) where parsed is False for the fallback"""
+    try:
+        ai_response = json.loads(_strip_code_block(text))
+        return {
+            "summary": ai_response.get("summary", ""),
+            "keyPoints": ai_response.get("keyPoints", []),
+            "topics": ai_response.get("topics", [])
+        }, True
+    except json.JSONDecodeError:
+        # Fallback if AI doesn't return valid JSON
+        return {
+            "summary": f"Unable to parse AI response. Raw response: {text[:200]}...",
+            "keyPoints": ["Analysis failed - unable to parse AI response"],
+            "topics": ["Error in analysis"]
+        }, False
+
+
+class GeminiClient:
+    """Gemini API client; the SDK is imported and configured on first use"""
+
+    def __init__(self, model_name="gemini-1.5-flash", api_key=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def generate(self, prompt):
+        return self._get_model().generate_content(prompt).text
+
+
+class StubModelClient:
+    """Offline stand-in for the model: answers every prompt with fixed JSON after `delay` seconds"""
+
+    model_name = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        videos = re.findall(r"^Video (\d+):$", prompt, re.MULTILINE)
+        if videos:
+            return json.dumps([{
+                "video": int(number),
+                "summary": f"Stub analysis of video {number} in a batch of {len(videos)}",
+                "keyPoints": ["stub key point 1", "stub key point 2", "stub key point 3"],
+                "topics": ["stub topic"]
+            } for number in videos])
+        first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+        return json.dumps({
+            "summary": f"Stub analysis ({len(prompt)} prompt characters): {first_line[:80]}",
+            "keyPoints": ["stub key point 1", "stub key point 2", "stub key point 3"],
+            "topics": ["stub topic"]
+        })
+
+
+class RateLimiter:
+    """Blocks callers so that at most `per_minute` calls start in any 60 second window"""
+
+    def __init__(self, per_minute, window=60.0):
+        self.per_minute = per_minute
+        self.window = window
+        self._starts = deque()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._starts and self._starts[0] <= now - self.window:
+                    self._starts.popleft()
+                if len(self._starts) < self.per_minute:
+                    self._starts.append(now)
+                    return
+                delay = self._starts[0] + self.window - now
+                self.waited += delay
+            time.sleep(delay)
+
+
+class TimedClient:
+    """Model client wrapper recording the latency and outcome of every call"""
+
+    def __init__(self, client):
+        self.client = client
+        self.model_name = client.model_name
+
+    def generate(self, prompt):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            text = self.client.generate(prompt)
+            outcome = "ok"
+            return text
+        finally:
+            MODEL_SECONDS.labels(model=self.model_name, outcome=outcome).observe(time.perf_counter() - start)
+
+
+class RateLimitedClient:
+    """Model client wrapper that keeps every call within the requests-per-minute quota"""
+
+    def __init__(self, client, per_minute):
+        self.client = client
+        self.limiter = RateLimiter(per_minute)
+        self.model_name = client.model_name
+
+    def generate(self, prompt):
+        self.limiter.acquire()
+        return self.client.generate(prompt)
+
+
+def create_model_client(backend="gemini", model_name="gemini-1.5-flash", api_key=None, stub_delay=0.0,
+                        requests_per_minute=0):
+    if backend == "stub":
+        client = StubModelClient(delay=stub_delay)
+    else:
+        client = GeminiClient(model_name, api_key)
+    # Timed inside the rate limit, so waits for the quota are not counted as latency
+    client = TimedClient(client)
+    if requests_per_minute > 0:
+        client = RateLimitedClient(client, requests_per_minute)
+    return client
+
+
+class AnalysisService:
+    """Runs analyses in the background and caches their results.
+
+    `submit(video_id, prompt_kind, build_prompt)` returns an analysis ID at
+    once. A cached result completes the analysis immediately, and a second
+    submission for an analysis that is already running gets the running
+    one's ID. Analysis records use the same `state` values as download jobs
+    (pending, running, done, error), so they can be followed with the same
+    progress stream; `broadcaster` is notified on every change. Finished
+    records are dropped `record_ttl` seconds after they were created, and
+    one still pending or running after `run_timeout` seconds is failed, so
+    the next submission starts over instead of joining it.
+    """
+
+    def __init__(self, client, workers=2, ttl=86400, max_entries=1024, record_ttl=3600, broadcaster=None,
+                 run_timeout=3 * 3600):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.record_ttl = record_ttl
+        self.run_timeout = max(run_timeout, record_ttl)
+        self.broadcaster = broadcaster
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # cache key -> (expires, result)
+        self._records = OrderedDict()  # analysis ID -> record, oldest first
+        self._inflight = {}  # cache key -> analysis ID
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, video_id, prompt_kind):
+        return f"{video_id}|{prompt_kind}-v{PROMPT_VERSION}|{self.client.model_name}"
+
+    def reserve(self, video_id, prompt_kind):
+        """Claim an analysis for a video: the cached result, the running analysis, or a new one.
+
+        Returns (analysis_id, record copy, is_new); the caller must run new
+        analyses and report them through `finish` or `fail`.
+        """
+        key = self.cache_key(video_id, prompt_kind)
+        now = time.time()
+        with self._lock:
+            stuck = self._prune(now)
+        if self.broadcaster is not None:
+            for analysis_id in stuck:
+                self.broadcaster.publish(analysis_id)
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > now:
+                self._results.move_to_end(key)
+                self.hits += 1
+                analysis_id = uuid.uuid4().hex
+                self._records[analysis_id] = self._record("done", key, now, result=cached[1], cached=True)
+                return analysis_id, dict(self._records[analysis_id]), False
+
+            self.misses += 1
+            analysis_id = self._inflight.get(key)
+            if analysis_id is not None:
+                return analysis_id, dict(self._records[analysis_id]), False
+
+            analysis_id = uuid.uuid4().hex
+            self._records[analysis_id] = self._record("pending", key, now)
+            self._inflight[key] = analysis_id
+            return analysis_id, dict(self._records[analysis_id]), True
+
+    def submit(self, video_id, prompt_kind, build_prompt):
+        """Start (or join) an analysis; returns (analysis_id, record copy)"""
+        analysis_id, record, is_new = self.reserve(video_id, prompt_kind)
+        if is_new:
+            self._executor.submit(self._run, analysis_id, build_prompt)
+        return analysis_id, record
+
+    def run_in_background(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def _run(self, analysis_id, build_prompt):
+        self.start(analysis_id)
+        try:
+            result, parsed = parse_analysis(self.client.generate(build_prompt()))
+            # Unparseable answers are returned but not cached, so the next visit retries
+            self.finish(analysis_id, result, cache=parsed)
+        except Exception as e:
+            log.warning("AI analysis failed: %s", e, extra={"analysisId": analysis_id})
+            self.fail(analysis_id, str(e))
+
+    def start(self, analysis_id):
+        self._update(analysis_id, {"state": "running"})
+
+    def finish(self, analysis_id, result, cache=True):
+        with self._lock:
+            record = self._records.get(analysis_id)
+            key = record["cacheKey"] if record else None
+            if key is not None and cache:
+                self._results[key] = (time.time() + self.ttl, result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            if self._inflight.get(key) == analysis_id:
+                del self._inflight[key]
+        self._update(analysis_id, {"state": "done", "result": result})
+
+    def fail(self, analysis_id, message):
+        with self._lock:
+            record = self._records.get(analysis_id)
+            key = record["cacheKey"] if record else None
+            if self._inflight.get(key) == analysis_id:
+                del self._inflight[key]
+        self._update(analysis_id, {"state": "error", "error_message": message})
+
+    @staticmethod
+    def _record(state, key, now, result=None, cached=False):
+        return {"state": state, "cacheKey": key, "created": now, "result": result,
+                "cached": cached, "error_message": None}
+
+    def progress(self, analysis_id, fields):
+        """Publish intermediate fields (e.g. partial results) of a running analysis"""
+        self._update(analysis_id, fields)
+
+    def _update(self, analysis_id, fields):
+        with self._lock:
+            record = self._records.get(analysis_id)
+            if record is None:
+                return
+            record.update(fields)
+        if self.broadcaster is not None:
+            self.broadcaster.publish(analysis_id)
+
+    def _prune(self, now):
+        """Drop expired records and fail stuck ones; returns the IDs of those failed"""
+        expired = []
+        stuck = []
+        # Records are kept in creation order, so expired ones are at the front
+        for analysis_id, record in self._records.items():
+            if record["created"] > now - self.record_ttl:
+                break
+            if record["state"] not in ("pending", "running"):
+                expired.append(analysis_id)
+            elif record["created"] <= now - self.run_timeout:
+                stuck.append(analysis_id)
+        for analysis_id in expired:
+            del self._records[analysis_id]
+            if self.broadcaster is not None:
+                self.broadcaster.forget(analysis_id)
+        for analysis_id in stuck:
+            # Pruned like any failed record on a later call, once followers have seen it
+            record = self._records[analysis_id]
+            record.update(state="error", error_message="Analysis timed out")
+            if self._inflight.get(record["cacheKey"]) == analysis_id:
+                del self._inflight[record["cacheKey"]]
+        return stuck
+
+    def get(self, analysis_id):
+        with self._lock:
+            record = self._records.get(analysis_id)
+            return dict(record) if record is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {"model": self.client.model_name, "cachedResults": len(self._results),
+                    "records": len(self._records), "running": len(self._inflight),
+                    "hits": self.hits, "misses": self.misses}
+
+
+class BatchAnalyzer:
+    """Metadata analyses for many videos, packed several to a model request.
+
+    `submit(urls)` reserves a "metadata" analysis per video through the
+    service, so cached and already-running analyses are reused, and returns
+    their IDs at once. The new ones are fetched concurrently with
+    `fetch_metadata(url)`, packed greedily into prompts of at most
+    `token_budget` estimated tokens and `max_videos` videos, and each prompt
+    runs as one task on the service's pool. Videos the batch answer leaves
+    out are retried with the single-video prompt.
+    """
+
+    def __init__(self, service, fetch_metadata, video_id_for, token_budget=6000, max_videos=10, fetch_workers=8):
+        self.service = service
+        self.fetch_metadata = fetch_metadata
+        self.video_id_for = video_id_for
+        self.token_budget = token_budget
+        self.max_videos = max_videos
+        self._fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="analysis-fetch")
+        self._overhead = estimate_tokens(batch_prompt([]))
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_videos = 0
+        self.fallbacks = 0
+
+    def submit(self, urls):
+        """Reserve an analysis per URL; returns [(url, analysis_id, record copy)] in input order"""
+        reserved = []
+        new = []
+        for url in urls:
+            analysis_id, record, is_new = self.service.reserve(self.video_id_for(url), "metadata")
+            reserved.append((url, analysis_id, record))
+            if is_new:
+                new.append((url, analysis_id))
+        if new:
+            threading.Thread(target=self._prepare, args=(new,), name="analysis-batch", daemon=True).start()
+        return reserved
+
+    def _fetch(self, item):
+        url, analysis_id = item
+        try:
+            video_data = self.fetch_metadata(url)
+            title = video_data.get('title') or "Unknown Title"
+            return analysis_id, video_data, title, video_details(video_data, title)
+        except Exception as e:
+            self.service.fail(analysis_id, f"Metadata extraction failed: {e}")
+            return None
+
+    def _prepare(self, items):
+        videos = [video for video in self._fetch_executor.map(self._fetch, items) if video is not None]
+        for group in self.pack(videos):
+            self.service.run_in_background(self._run_group, group)
+
+    def pack(self, videos):
+        """Split (analysis_id, video_data, title, section) tuples into groups that fit one prompt"""
+        groups = []
+        group, tokens = [], self._overhead
+        for video in videos:
+            cost = estimate_tokens(video[3]) + 4
+            if group and (tokens + cost > self.token_budget or len(group) >= self.max_videos):
+                groups.append(group)
+                group, tokens = [], self._overhead
+            group.append(video)
+            tokens += cost
+        if group:
+            groups.append(group)
+        return groups
+
+    def _run_group(self, group):
+        for analysis_id, _, _, _ in group:
+            self.service.start(analysis_id)
+        try:
+            if len(group) == 1:
+                results = {}
+            else:
+                text = self.service.client.generate(batch_prompt([video[3] for video in group]))
+                results = parse_batch(text, len(group))
+                with self._lock:
+                    self.batches += 1
+                    self.batched_videos += len(results)
+        except Exception as e:
+            log.warning("AI batch analysis failed, analyzing videos one by one: %s", e)
+            results = {}
+
+        for index, (analysis_id, video_data, title, _) in enumerate(group):
+            if index in results:
+                self.service.finish(analysis_id, results[index])
+                continue
+            if len(group) > 1:
+                with self._lock:
+                    self.fallbacks += 1
+            try:
+                result, parsed = parse_analysis(self.service.client.generate(metadata_prompt(video_data, title)))
+                self.service.finish(analysis_id, result, cache=parsed)
+            except Exception as e:
+                log.warning("AI analysis failed: %s", e, extra={"analysisId": analysis_id})
+                self.service.fail(analysis_id, str(e))
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self.batches, "batchedVideos": self.batched_videos, "fallbacks": self.fallbacks,
+                    "tokenBudget": self.token_budget, "maxVideos": self.max_videos}
+
+
+class TranscriptAnalyzer:
+    """Analyses grounded in the video's transcript, summarized chunk by chunk.
+
+    The transcript is cut into chunks (transcripts.chunk_transcript) that
+    are summarized concurrently on the service's pool. Each summary is
+    published on the analysis record as it arrives (`partials`, in
+    transcript order), so a client following the analysis sees the start
+    of a long video within one model call. Once every chunk is done a
+    reduce prompt combines them into the final result. Chunk summaries are
+    cached by chunk content, so analysing a video again (after the final
+    result expired, or once its transcript grew) only summarizes chunks it
+    has not seen. Videos without a transcript fall
+    back to the metadata prompt.
+    """
+
+    def __init__(self, service, transcripts, chunk_chars=6000, max_entries=4096):
+        self.service = service
+        self.transcripts = transcripts
+        self.chunk_chars = chunk_chars
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._summaries = OrderedDict()  # (chunk key, prompt version, model) -> result
+        self.chunks_summarized = 0
+        self.chunks_cached = 0
+        self.fallbacks = 0
+
+    def submit(self, video_id, transcript_id, video_title, fallback_prompt):
+        """Start (or join) a transcript analysis; returns (analysis_id, record copy).
+
+        `transcript_id` is the bare YouTube video ID, or None for other
+        sites; `fallback_prompt` is used when there is no transcript.
+        """
+        analysis_id, record, is_new = self.service.reserve(video_id, "transcript")
+        if is_new:
+            threading.Thread(target=self._run, args=(analysis_id, transcript_id, video_title, fallback_prompt),
+                             name="analysis-transcript", daemon=True).start()
+        return analysis_id, record
+
+    def _summary_key(self, chunk):
+        return (chunk["key"], PROMPT_VERSION, self.service.client.model_name)
+
+    def _summarize(self, video_title, chunk, count):
+        result, parsed = parse_analysis(self.service.client.generate(chunk_prompt(video_title, chunk, count)))
+        if not parsed:
+            raise ValueError("Unparseable chunk summary")
+        with self._lock:
+            self._summaries[self._summary_key(chunk)] = result
+            while len(self._summaries) > self.max_entries:
+                self._summaries.popitem(last=False)
+            self.chunks_summarized += 1
+        return result
+
+    def _run(self, analysis_id, transcript_id, video_title, fallback_prompt):
+        self.service.start(analysis_id)
+        try:
+            try:
+                if transcript_id is None:
+                    raise TranscriptUnavailable("Transcripts are only available for YouTube videos")
+                chunks = chunk_transcript(self.transcripts.get(transcript_id), self.chunk_chars)
+                if not chunks:
+                    raise TranscriptUnavailable("The transcript is empty")
+            except TranscriptUnavailable as e:
+                with self._lock:
+                    self.fallbacks += 1
+                self.service.progress(analysis_id, {"source": "metadata", "transcriptError": str(e)})
+                result, _ = parse_analysis(self.service.client.generate(fallback_prompt))
+                # Not cached: the transcript may become available later
+                self.service.finish(analysis_id, result, cache=False)
+                return
+
+            partials = self._summarize_chunks(analysis_id, video_title, chunks)
+            if not partials:
+                raise RuntimeError("Every transcript chunk failed to summarize")
+            if len(chunks) == 1:
+                result = {key: partials[0][key] for key in ("summary", "keyPoints", "topics")}
+                parsed = True
+            else:
+                result, parsed = parse_analysis(self.service.client.generate(reduce_prompt(video_title, partials)))
+            self.service.finish(analysis_id, result, cache=parsed and len(partials) == len(chunks))
+        except Exception as e:
+            log.warning("AI transcript analysis failed: %s", e, extra={"analysisId": analysis_id})
+            self.service.fail(analysis_id, str(e))
+
+    def _summarize_chunks(self, analysis_id, video_title, chunks):
+        done = {}
+        futures = {}
+        for chunk in chunks:
+            with self._lock:
+                cached = self._summaries.get(self._summary_key(chunk))
+                if cached is not None:
+                    self._summaries.move_to_end(self._summary_key(chunk))
+                    self.chunks_cached += 1
+            if cached is not None:
+                done[chunk["index"]] = cached
+            else:
+                futures[self.service.run_in_background(self._summarize, video_title, chunk, len(chunks))] = chunk
+
+        def partials():
+            return [dict(done[chunk["index"]], start=chunk["start"], end=chunk["end"])
+                    for chunk in chunks if chunk["index"] in done]
+
+        failed = 0
+        self.service.progress(analysis_id, {"source": "transcript", "chunks": len(chunks),
+                                            "chunksFailed": failed, "partials": partials()})
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                done[chunk["index"]] = future.result()
+            except Exception as e:
+                log.warning("AI chunk summary failed: %s", e, extra={"chunk": chunk["index"]})
+                failed += 1
+            self.service.progress(analysis_id, {"chunksFailed": failed, "partials": partials()})
+        return partials()
+
+    def stats(self):
+        with self._lock:
+            return {"chunkSummaries": len(self._summaries), "chunksSummarized": self.chunks_summarized,
+                    "chunksCached": self.chunks_cached, "fallbacks": self.fallbacks,
+                    "transcripts": self.transcripts.stats()}
@@ -1,52 +1,77 @@
 import os
-import google.generativeai as genai
-import json
-import subprocess
 import threading
 import time
 import re
 import unicodedata
 import shutil
+import uuid
 import tempfile
-from flask import Flask, request, jsonify, send_file
+from urllib.parse import quote
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from dotenv import load_dotenv
 
-# Ensure the downloads directory exists
-DOWNLOAD_DIR = 'downloads'
-TEMP_DIR = 'temp_downloads'  # Temporary directory for downloads
-if not os.path.exists(DOWNLOAD_DIR):
-    os.makedirs(DOWNLOAD_DIR)
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
-
-load_dotenv()
+import config
+import logs
+import metrics
+from ytdlp_engine import create_engine, ExtractionError, DownloadError
+from metadata_cache import MetadataCache, normalize_url, canonical_video_id
+from extraction import CircuitBreaker, CircuitOpen, ExtractionPolicy
+from formats import FormatIndex, codec_family, quality_max_height
+from scheduler import DownloadScheduler, QueueFull
+from artifact_cache import ArtifactCache, artifact_key
+from artifact_store import ArtifactStore, file_digest
+from progress_events import ProgressBroadcaster, progress_stream
+from job_store import create_job_store
+from bulk_downloads import BulkDownloads
+from direct_stream import DirectStreamer
+from bandwidth import BandwidthBudget
+from storage import StorageManager, StorageFull
+from postprocess import PostProcessor, StageTimings
+import job_dirs
+from gallery_catalog import GalleryCatalog
+from media_info import MediaInfoCache
+from analysis import AnalysisService, BatchAnalyzer, TranscriptAnalyzer, create_model_client, video_prompt, url_prompt
+from transcripts import TranscriptCache
+
+log = logs.get_logger("app")
 
 app = Flask(__name__)
 CORS(app)
 
-# Configure Gemini API key
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-# Create a model instance (Gemini-pro or gemini-1.5-flash)
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-def parse_size_to_bytes(size_str):
-    """Convert size string like '123.4MiB' to bytes"""
-    try:
-        size_str = size_str.strip()
-        if 'GiB' in size_str:
-            return int(float(size_str.replace('GiB', '')) * 1024 * 1024 * 1024)
-        elif 'MiB' in size_str:
-            return int(float(size_str.replace('MiB', '')) * 1024 * 1024)
-        elif 'KiB' in size_str:
-            return int(float(size_str.replace('KiB', '')) * 1024)
-        elif 'B' in size_str:
-            return int(float(size_str.replace('B', '')))
-        else:
-            return int(float(size_str))
-    except (ValueError, AttributeError):
-        return 0
+# Directories and services of this process, set up by init_services() (see create_app)
+DOWNLOAD_DIR = TEMP_DIR = None
+model_client = analysis_broadcaster = analysis_service = transcript_analyzer = None
+engine = extraction_policy = metadata_cache = batch_analyzer = None
+job_store = progress_broadcaster = download_scheduler = stage_timings = post_processor = None
+artifact_store = artifact_cache = storage = gallery_catalog = media_info = None
+bulk_downloads = direct_streamer = bandwidth_budget = None
+_app_created = False
+_services_pid = None
+_services_lock = threading.Lock()
+
+@app.before_request
+def ensure_services():
+    if _services_pid != os.getpid():
+        init_services()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # Streamed bodies (SSE, direct streams) are timed until their headers are ready
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.labels(route=route, method=request.method, status=response.status_code) \
+            .observe(time.perf_counter() - started)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text exposition of the backend's metrics"""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 def sanitize_filename(filename):
     """Sanitize filename to be safe for HTTP headers and file system"""
@@ -72,168 +97,101 @@ def sanitize_filename(filename):
     
     return filename if filename else "video"
 
+def analysis_response(analysis_id, record, **fields):
+    """Response for a submitted analysis; carries the result right away on a cache hit"""
+    body = dict(fields, analysisId=analysis_id, status="pending")
+    if record["state"] == "done":
+        body.update(record["result"], status="completed", cached=record["cached"])
+    return body
+
 @app.route("/api/video/info", methods=["GET"])
 def get_video_info():
+    """Video title and duration plus a background AI analysis.
+
+    The analysis result comes back inline when it is cached; otherwise
+    follow `analysisId` through /api/analysis/<id> or /api/analysis/events.
+    With `mode=transcript` the analysis is based on the video's transcript
+    and its record carries chunk summaries (`partials`) while it runs.
+    """
     try:
         url = request.args.get("url")
         if not url:
             return jsonify({"error": "No URL provided"}), 400
+        mode = request.args.get("mode", "metadata")
+        if mode not in ("metadata", "transcript"):
+            return jsonify({"error": "mode must be 'metadata' or 'transcript'"}), 400
 
-        # Normalize Shorts URLs to avoid extractor quirks
-        if "/shorts/" in url:
-            # Extract video ID from Shorts URL and convert to watch URL
-            video_id_match = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
-            if video_id_match:
-                video_id = video_id_match.group(1)
-                url = f"https://www.youtube.com/watch?v={video_id}"
-                print(f"AI Analysis - Normalized Shorts URL to: {url}")
-
-        # First, get video title using yt-dlp
+        # Title and metadata come from a single cached --dump-json extraction
         try:
-            title_cmd = ["yt-dlp", "--get-title", "--user-agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36", url]
-            title_result = subprocess.run(title_cmd, capture_output=True, text=True, timeout=15)
-            
-            if title_result.returncode != 0:
-                # Try without user agent as fallback
-                title_cmd = ["yt-dlp", "--get-title", url]
-                title_result = subprocess.run(title_cmd, capture_output=True, text=True, timeout=15)
-            
-            video_title = title_result.stdout.strip() if title_result.returncode == 0 else "Unknown Title"
-        except:
-            video_title = "Unknown Title"
-
-        # Initialize variables
-        duration = 0
-        uploader = 'Unknown'
-        view_count = 0
-        upload_date = 'Unknown'
-        description = ''
-        
-        # Get video metadata using yt-dlp
-        try:
-            metadata_cmd = ["yt-dlp", "--dump-json", "--user-agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36", url]
-            metadata_result = subprocess.run(metadata_cmd, capture_output=True, text=True, timeout=45)
-            
-            if metadata_result.returncode != 0:
-                # Try without user agent as fallback
-                metadata_cmd = ["yt-dlp", "--dump-json", url]
-                metadata_result = subprocess.run(metadata_cmd, capture_output=True, text=True, timeout=30)
-            
-            if metadata_result.returncode == 0:
-                video_data = json.loads(metadata_result.stdout)
-                description = video_data.get('description', '')[:1000]  # Limit description length
-                duration = video_data.get('duration', 0)
-                uploader = video_data.get('uploader', 'Unknown')
-                view_count = video_data.get('view_count', 0)
-                upload_date = video_data.get('upload_date', 'Unknown')
-                
-                # Create a more detailed prompt with actual video information
-                prompt = f"""Based on the available metadata for this YouTube video, provide an analysis in JSON format. 
-
-CRITICAL LIMITATION: You are analyzing based on title and description ONLY. You cannot see, hear, or process the actual video content. You must acknowledge this limitation in your response.
-
-Video Information:
-Title: {video_title}
-Uploader: {uploader}
-Duration: {duration} seconds ({duration//60} minutes {duration%60} seconds)
-View Count: {view_count:,} views
-Upload Date: {upload_date}
-Description: {description[:800]}...
-
-MANDATORY INSTRUCTIONS:
-- Start your summary with "Based on the video metadata (title and description) only:"
-- Acknowledge that you cannot see the actual video content
-- Base your analysis ONLY on the provided title and description
-- If the description is too short or vague, explicitly state this limitation
-- Do not invent specific details not mentioned in the metadata
-- Focus on what can be reasonably inferred from the available information
-- If you cannot provide meaningful analysis due to limited information, state this clearly
-
-Please provide analysis in this exact JSON format:
-{{
-  "summary": "Based on the video metadata (title and description) only: [Your analysis here. If information is insufficient, acknowledge this limitation.]",
-  "keyPoints": ["key point 1", "key point 2", "key point 3"],
-  "topics": ["topic 1", "topic 2", "topic 3"]
-}}
-
-Only return the JSON object, no other text."""
-            else:
-                # Fallback to basic prompt if metadata extraction fails
-                prompt = f"""Based on the video title only, provide a limited analysis in JSON format.
-
-CRITICAL LIMITATION: You only have access to the title: "{video_title}"
-You cannot see, hear, or process the actual video content. You must acknowledge this limitation.
-
-MANDATORY INSTRUCTIONS:
-- Start your summary with "Based on the video title only:"
-- Explicitly state that you cannot see the actual video content
-- Do not make assumptions about content you cannot see
-- If the title is unclear or insufficient, acknowledge this limitation
-- Focus only on what can be reasonably inferred from the title
-
-Please provide analysis in this exact JSON format:
-{{
-  "summary": "Based on the video title only: [Your analysis here. If the title is insufficient, acknowledge this limitation.]",
-  "keyPoints": ["key point 1", "key point 2", "key point 3"],
-  "topics": ["topic 1", "topic 2", "topic 3"]
-}}
-
-Only return the JSON object, no other text."""
-        except:
-            # Fallback to basic prompt if metadata extraction fails
-            prompt = f"""Based on the video title only, provide a limited analysis in JSON format.
-
-CRITICAL LIMITATION: You only have access to the title: "{video_title}"
-You cannot see, hear, or process the actual video content. You must acknowledge this limitation.
-
-MANDATORY INSTRUCTIONS:
-- Start your summary with "Based on the video title only:"
-- Explicitly state that you cannot see the actual video content
-- Do not make assumptions about content you cannot see
-- If the title is unclear or insufficient, acknowledge this limitation
-- Focus only on what can be reasonably inferred from the title
-
-Please provide analysis in this exact JSON format:
-{{
-  "summary": "Based on the video title only: [Your analysis here. If the title is insufficient, acknowledge this limitation.]",
-  "keyPoints": ["key point 1", "key point 2", "key point 3"],
-  "topics": ["topic 1", "topic 2", "topic 3"]
-}}
-
-Only return the JSON object, no other text."""
-        
-        response = model.generate_content(prompt)
+            video_data = metadata_cache.get(url)
+        except ExtractionError as e:
+            log.warning("Metadata extraction for AI analysis failed: %s", e)
+            video_data = None
 
-        try:
-            # Extract JSON string from markdown code block if present
-            response_text = response.text.strip()
-            if response_text.startswith('```json') and response_text.endswith('```'):
-                json_string = response_text[len('```json'):-len('```')].strip()
-            else:
-                json_string = response_text
-
-            ai_response = json.loads(json_string)
-            summary = ai_response.get("summary", "")
-            key_points = ai_response.get("keyPoints", [])
-            topics = ai_response.get("topics", [])
-        except json.JSONDecodeError:
-             # Fallback if AI doesn't return valid JSON
-             summary = f"Unable to parse AI response. Raw response: {response.text[:200]}..."
-             key_points = ["Analysis failed - unable to parse AI response"]
-             topics = ["Error in analysis"]
+        return jsonify(video_info_body(url, mode, video_data))
 
-        return jsonify({
-            "title": video_title,
-            "aiSummary": summary,
-            "keyPoints": key_points,
-            "topics": topics,
-            "duration": duration,
-            "status": "completed"
-        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def video_info_body(url, mode, video_data):
+    """Submit the analysis for a video and build the /api/video/info response body"""
+    video_title = (video_data or {}).get('title') or "Unknown Title"
+    duration = (video_data or {}).get('duration') or 0
+
+    prompt_kind, prompt = video_prompt(video_data, video_title)
+    video_id = canonical_video_id(normalize_url(url))
+    if mode == "transcript":
+        transcript_id = video_id[len("youtube:"):] if video_id.startswith("youtube:") else None
+        analysis_id, record = transcript_analyzer.submit(video_id, transcript_id, video_title, prompt)
+    else:
+        analysis_id, record = analysis_service.submit(video_id, prompt_kind, lambda: prompt)
+
+    body = analysis_response(analysis_id, record, title=video_title, duration=duration)
+    if "summary" in body:
+        body["aiSummary"] = body.pop("summary")
+    return body
+
+@app.route("/api/analysis/batch", methods=["POST"])
+def analyze_batch():
+    """Metadata analyses for a list of URLs (`{"urls": [...]}`), batched into shared model requests.
+
+    Returns one entry per URL in the same order, each with its `analysisId`
+    and, when it was cached, the result itself.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        urls = data.get("urls")
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url for url in urls):
+            return jsonify({"error": "No URLs provided"}), 400
+        if len(urls) > config.AI_BATCH_MAX_URLS:
+            return jsonify({"error": f"At most {config.AI_BATCH_MAX_URLS} URLs per request"}), 400
+
+        analyses = [analysis_response(analysis_id, record, url=url)
+                    for url, analysis_id, record in batch_analyzer.submit(urls)]
+        return jsonify({"analyses": analyses})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/analysis/<analysis_id>", methods=["GET"])
+def get_analysis(analysis_id):
+    record = analysis_service.get(analysis_id)
+    if record is None:
+        return jsonify({"error": "Analysis ID not found"}), 404
+    return jsonify(record)
+
+@app.route("/api/analysis/events", methods=["GET"])
+def stream_analysis_events():
+    """Server-sent events for one analysis (`?id=`); ends once it is done or failed"""
+    analysis_id = request.args.get("id")
+    if not analysis_id:
+        return jsonify({"error": "No analysis ID provided"}), 400
+    stream = progress_stream(analysis_broadcaster, [analysis_id], analysis_service.get)
+    response = Response(stream_with_context(stream), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route("/api/video/formats", methods=["GET"])
 def get_video_formats():
     try:
@@ -241,80 +199,35 @@ def get_video_formats():
         if not url:
             return jsonify({"error": "No URL provided"}), 400
 
-        # Normalize Shorts URLs to avoid extractor quirks
-        if "/shorts/" in url:
-            # Extract video ID from Shorts URL and convert to watch URL
-            video_id_match = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
-            if video_id_match:
-                video_id = video_id_match.group(1)
-                url = f"https://www.youtube.com/watch?v={video_id}"
-                print(f"Formats - Normalized Shorts URL to: {url}")
-
-        # Get available formats using yt-dlp
-        cmd = ["yt-dlp", "--list-formats", "--user-agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36", url]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
-            # Try without user agent as fallback
-            cmd = ["yt-dlp", "--list-formats", url]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode != 0:
-                return jsonify({"error": "Failed to get video formats"}), 500
+        # Available formats come from the shared metadata cache
+        try:
+            video_data = metadata_cache.get(url)
+        except CircuitOpen as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+        except ExtractionError:
+            return jsonify({"error": "Failed to get video formats"}), 500
 
-        # Parse the output to extract available qualities
-        lines = result.stdout.strip().split('\n')
-        formats = []
-        
-        for line in lines:
-            # Skip header lines and non-format lines
-            if not line.strip() or 'ID' in line or '─' in line or 'Available formats' in line:
-                continue
-                
-            parts = line.split()
-            if len(parts) >= 3:
-                format_id = parts[0]
-                ext = parts[1]
-                resolution = parts[2]
-                
-                # Check if this is a video format with resolution (exclude storyboards)
-                if resolution and resolution != 'audio' and 'x' in resolution and ext != 'mhtml':
-                    # Extract height from resolution (e.g., "640x360" -> "360p")
-                    try:
-                        height = resolution.split('x')[1]
-                        if height.isdigit():
-                            height_int = int(height)
-                            if height_int >= 2160:
-                                resolution_str = "4k"
-                            elif height_int >= 1440:
-                                resolution_str = "1440p"
-                            elif height_int >= 1080:
-                                resolution_str = "1080p"
-                            elif height_int >= 720:
-                                resolution_str = "720p"
-                            elif height_int >= 480:
-                                resolution_str = "480p"
-                            elif height_int >= 360:
-                                resolution_str = "360p"
-                            else:
-                                resolution_str = "240p"
-                            
-                            formats.append({
-                                "id": format_id,
-                                "resolution": resolution_str,
-                                "format": ext
-                            })
-                    except:
-                        continue
-
-        return jsonify({
-            "formats": formats,
-            "available_qualities": list(set([f["resolution"] for f in formats if f["resolution"] != "unknown"]))
-        })
+        return jsonify(formats_body(video_data))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def formats_body(video_data):
+    """The /api/video/formats response body for an info dict"""
+    index = FormatIndex.from_info(video_data)
+    qualities = index.qualities()
+
+    # Video formats sorted by height, best first (storyboards are never indexed)
+    formats = [index.describe(fmt) for fmt in index.video_only + index.muxed]
+    formats.sort(key=lambda f: f["height"], reverse=True)
+
+    return {
+        "formats": formats,
+        "audio_formats": [index.describe(fmt) for fmt in reversed(index.audio_only)],
+        "available_qualities": [q["quality"] for q in qualities],
+        "qualities": qualities
+    }
+
 @app.route("/analyze", methods=["POST"])
 def analyze():
     try:
@@ -324,57 +237,77 @@ def analyze():
         if not url:
             return jsonify({"error": "No URL provided"}), 400
 
-        # Generate analysis
-        prompt = f"""Based on the YouTube URL provided, provide a limited analysis in JSON format.
-
-CRITICAL LIMITATION: You are analyzing based on URL only. You cannot see, hear, or process the actual video content. You must acknowledge this limitation.
-
-MANDATORY INSTRUCTIONS:
-- Start your summary with "Based on the YouTube URL only:"
-- Explicitly state that you cannot see the actual video content
-- Do not make assumptions about content you cannot see
-- If you cannot access the video information, acknowledge this limitation
-- Focus only on what can be reasonably inferred from the URL
-
-YouTube URL: {url}
-
-Please provide analysis in this exact JSON format:
-{{
-  "summary": "Based on the YouTube URL only: [Your analysis here. If information is insufficient, acknowledge this limitation.]",
-  "keyPoints": ["key point 1", "key point 2", "key point 3"],
-  "topics": ["topic 1", "topic 2", "topic 3"]
-}}
-
-Only return the JSON object, no other text."""
-        response = model.generate_content(prompt)
-
-        try:
-            # Extract JSON string from markdown code block if present
-            response_text = response.text.strip()
-            if response_text.startswith('```json') and response_text.endswith('```'):
-                json_string = response_text[len('```json'):-len('```')].strip()
-            else:
-                json_string = response_text
-
-            ai_response = json.loads(json_string)
-            summary = ai_response.get("summary", "")
-            key_points = ai_response.get("keyPoints", [])
-            topics = ai_response.get("topics", [])
-        except json.JSONDecodeError:
-             # Fallback if AI doesn't return valid JSON
-             summary = f"Unable to parse AI response. Raw response: {response.text[:200]}..."
-             key_points = ["Analysis failed - unable to parse AI response"]
-             topics = ["Error in analysis"]
-
-        return jsonify({"summary": summary, "keyPoints": key_points,
-            "topics": topics, "status": "completed"})
+        # Generate analysis in the background from the URL alone
+        video_id = canonical_video_id(normalize_url(url))
+        analysis_id, record = analysis_service.submit(video_id, "url", lambda: url_prompt(url))
+        return jsonify(analysis_response(analysis_id, record))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Dictionary to store download progress with thread lock for safety
-download_progress = {}
-download_progress_lock = threading.Lock()
+def update_download(download_id, fields, buffered=False):
+    """Apply field changes to a tracked download and notify its streams.
+
+    Progress ticks pass `buffered=True` so a persistent store can batch them.
+    """
+    if not job_store.update(download_id, fields, buffered=buffered):
+        return False
+    if fields.get("state") in ("done", "error"):
+        # The files left behind are counted as they are from now on
+        storage.release(download_id)
+    progress_broadcaster.publish(download_id)
+    bulk_downloads.child_updated(download_id, fields)
+    return True
+
+def snapshot_download(download_id):
+    return job_store.get(download_id)
+
+def expire_jobs(interval=60):
+    """Drop finished jobs nobody collected within JOB_TTL, with their job directories"""
+    while True:
+        time.sleep(interval)
+        try:
+            for download_id, job in job_store.expire():
+                job_dir = job.get("jobDir")
+                # A newer job for the same content may have taken the directory over
+                manifest = job_dirs.read_manifest(job_dir) if job_dir else None
+                if manifest is not None and manifest.get("downloadId") == download_id:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                progress_broadcaster.forget(download_id)
+                log.info("Expired download job", extra={"downloadId": download_id})
+        except Exception:
+            log.exception("Error expiring download jobs")
+
+def pool_jobs():
+    """Queued and running work per pool, for the download_jobs gauge"""
+    scheduler_stats = download_scheduler.stats()
+    postprocess_stats = post_processor.stats()
+    analysis_stats = analysis_service.stats()
+    return {
+        ("download", "queued"): scheduler_stats["queued"],
+        ("download", "active"): scheduler_stats["active"],
+        ("postprocess", "queued"): postprocess_stats["queued"],
+        ("postprocess", "active"): postprocess_stats["active"],
+        ("stream", "active"): direct_streamer.stats()["active"],
+        ("analysis", "active"): analysis_stats["running"]
+    }
+
+def audio_quality_for(quality):
+    """yt-dlp/ffmpeg VBR level for an audio quality label (0 is best)"""
+    if quality == "256":
+        return "5"  # High quality
+    if quality == "128":
+        return "9"  # Standard quality
+    return "0"  # Best quality
+
+def download_priority(format_type, quality):
+    """Scheduler lane for a request: audio first, then by resolution"""
+    if format_type == "audio":
+        return 0
+    max_height = quality_max_height(quality)
+    if max_height is None or max_height > 1080:
+        return 3
+    return 1 if max_height <= 480 else 2
 
 @app.route("/api/download", methods=["POST"])
 def download_video():
@@ -383,58 +316,336 @@ def download_video():
     format_type = data.get("format", "video") # 'video' or 'audio'
     quality = data.get("quality", "best")
 
-    print(f"Download request - URL: {url}")
-    print(f"Download request - Format: {format_type}")
-    print(f"Download request - Quality: {quality}")
+    log.info("Download request", extra={"url": url, "format": format_type, "quality": quality})
 
     if not url:
         return jsonify({"error": "URL is required"}), 400
 
-    download_id = str(time.time())
-    
-    # Create unique job directory for this download
-    job_dir = tempfile.mkdtemp(prefix=f"job_{download_id}_", dir=TEMP_DIR)
-    
-    with download_progress_lock:
-        download_progress[download_id] = {
-            "state": "started",
-            "progress": 0,
-            "filePath": None,
-            "tempFilePath": None,
-            "jobDir": job_dir,
+    # Queue the download on the worker pool; refuse it if the queue is full
+    client = request.headers.get("X-Client-Id") or request.remote_addr
+    try:
+        return jsonify(start_download(url, format_type, quality, client))
+    except StorageFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '300'
+        return response, 507
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+def start_download(url, format_type, quality, client):
+    """Create (or join) the job for one video and queue it; raises QueueFull or StorageFull.
+
+    Returns the response body of POST /api/download.
+    """
+    download_id = uuid.uuid4().hex
+    cache_key = artifact_key(canonical_video_id(normalize_url(url)), format_type, quality)
+
+    # Serve a finished copy straight from the downloads directory
+    cached_path = artifact_cache.lookup(cache_key) or stored_artifact(url, format_type, quality, cache_key)
+    if cached_path:
+        cached_name = os.path.basename(cached_path)
+        job_store.create(download_id, {
+            "state": "done",
+            "progress": 100,
+            "filePath": cached_name,
+            "sanitizedFilename": cached_name,
+            "tempFilePath": os.path.abspath(cached_path),
+            "jobDir": None,
             "error_message": None,
             "speed": None,
-            "eta": None
-        }
+            "eta": None,
+            "queuePosition": None,
+            "cacheKey": None,
+            "cached": True,
+            "subscribers": 1
+        })
+        log.info("Serving cached artifact", extra={"downloadId": download_id, "cacheKey": cache_key, "path": cached_path})
+        return {"status": "started", "download_id": download_id, "cached": True}
+
+    # Attach to an identical download that is already queued or running
+    existing_id = job_store.attach(cache_key, download_id, {
+        "state": "started",
+        "progress": 0,
+        "filePath": None,
+        "tempFilePath": None,
+        "jobDir": None,
+        "error_message": None,
+        "speed": None,
+        "eta": None,
+        "queuePosition": None,
+        "cacheKey": cache_key,
+        "cached": False,
+        "subscribers": 1
+    })
+
+    if existing_id != download_id:
+        progress_broadcaster.publish(existing_id)
+        log.info("Attached download request to in-flight job", extra={"downloadId": existing_id})
+        return {"status": "started", "download_id": existing_id, "attached": True}
+
+    # Reserve the disk space it needs, in a lower quality if only that fits
+    try:
+        admitted_quality = admit_download(download_id, url, format_type, quality)
+    except StorageFull as e:
+        refuse_download(download_id, e)
+        raise
+    body = {"status": "started", "download_id": download_id}
+    if admitted_quality != quality:
+        log.info("Download downgraded to fit the disk budget",
+                 extra={"downloadId": download_id, "quality": quality, "admittedQuality": admitted_quality})
+        body["downgradedFrom"] = quality
+        quality = admitted_quality
+        cache_key = artifact_key(canonical_video_id(normalize_url(url)), format_type, quality)
+        job_store.update(download_id, {"cacheKey": cache_key})
+
+    # Stable per-content directory, so partial files of an earlier attempt are resumed
+    job_dir = job_dirs.work_dir_for(TEMP_DIR, cache_key)
+    job_dirs.claim(job_dir, {
+        "downloadId": download_id,
+        "cacheKey": cache_key,
+        "url": url,
+        "format": format_type,
+        "quality": quality,
+        "state": "started"
+    })
+    job_store.update(download_id, {"jobDir": job_dir})
 
-    # Run download in a separate thread to avoid blocking the main Flask thread
-    threading.Thread(target=execute_download, args=(url, format_type, quality, download_id)).start()
-    
-    # Start a fallback progress simulation in case yt-dlp progress parsing fails
-    def simulate_progress():
-        import time
-        progress = 0
-        while progress < 90 and download_id in download_progress:
-            with download_progress_lock:
-                if download_id not in download_progress or download_progress[download_id]["state"] != "downloading":
-                    break
-                if download_progress[download_id]["progress"] == 0:
-                    progress += 5  # Increment by 5% every 2 seconds
-                    download_progress[download_id]["progress"] = progress
-                    print(f"Fallback progress simulation: {progress}%")
-            time.sleep(2)  # Update every 2 seconds
-    
-    threading.Thread(target=simulate_progress).start()
+    try:
+        position = queue_download(download_id, url, format_type, quality, client)
+    except QueueFull as e:
+        job_dirs.release(job_dir)
+        refuse_download(download_id, e)
+        raise
+
+    return dict(body, queuePosition=position)
+
+def refuse_download(download_id, error):
+    """Fail a job that was not admitted.
+
+    Clients may have attached to it since it was created, so it is marked
+    as failed rather than deleted; new requests for the same content start
+    a fresh job.
+    """
+    update_download(download_id, {"state": "error", "error_message": str(error)})
+
+def stored_artifact(url, format_type, quality, cache_key):
+    """A stored file with exactly the streams this request would fetch (e.g. "best" and "1080p" of a 1080p video)"""
+    video_data = metadata_cache.peek(url)
+    format_spec = download_format(FormatIndex.from_info(video_data), format_type, quality) if video_data else None
+    if not format_spec:
+        return None
+    path = artifact_store.lookup(artifact_identity(canonical_video_id(normalize_url(url)), format_spec,
+                                                   format_type, quality))
+    if path:
+        artifact_cache.add(cache_key, path)
+    return path
+
+def admit_download(download_id, url, format_type, quality):
+    """Reserve temp disk space for a new download; returns the quality to fetch. Raises StorageFull.
+
+    Sizes come from a cached extraction (the formats list is normally
+    fetched before a download); without one the download is admitted as
+    long as the disk is not already short.
+    """
+    video_data = metadata_cache.peek(url)
+    index = FormatIndex.from_info(video_data) if video_data else None
+    qualities = [quality]
+    if index is not None and format_type == "video" and config.STORAGE_DOWNGRADE:
+        max_height = quality_max_height(quality)
+        qualities += [option["quality"] for option in index.qualities()
+                      if max_height is None or option["height"] < max_height]
+
+    video_key = canonical_video_id(normalize_url(url))
+    options = [(job_dirs.work_dir_for(TEMP_DIR, artifact_key(video_key, format_type, option)),
+                index.estimated_size(format_type, option) if index is not None else None)
+               for option in qualities]
+    return qualities[storage.reserve(download_id, options)]
+
+@app.route("/api/download/bulk", methods=["POST"])
+def download_bulk():
+    """Download every video of a playlist or channel as child jobs of one parent job.
+
+    Follow the returned `download_id` like a single download: its status
+    has the aggregated progress, speed and ETA plus the per-video `items`.
+    Finished videos are moved into the downloads directory (the gallery).
+    """
+    data = request.get_json(silent=True) or {}
+    url = data.get("url")
+    if not url:
+        return jsonify({"error": "URL is required"}), 400
+    try:
+        limit = int(data.get("maxItems") or config.BULK_MAX_ITEMS)
+    except (TypeError, ValueError):
+        return jsonify({"error": "maxItems must be a number"}), 400
+
+    client = request.headers.get("X-Client-Id") or request.remote_addr
+    parent_id = bulk_downloads.create(url, data.get("format", "video"), data.get("quality", "best"), client, limit)
+    return jsonify({"status": "started", "download_id": parent_id, "bulk": True})
+
+@app.route("/api/download/bulk/<parent_id>/retry", methods=["POST"])
+def retry_bulk(parent_id):
+    """Queue the failed videos of a bulk download again"""
+    client = request.headers.get("X-Client-Id") or request.remote_addr
+    count = bulk_downloads.retry_failed(parent_id, client)
+    if count is None:
+        return jsonify({"error": "Download ID not found"}), 404
+    return jsonify({"status": "started", "download_id": parent_id, "retried": count})
+
+def queue_download(download_id, url, format_type, quality, client):
+    """Submit a tracked job to the worker pool and return its queue position"""
+    queued_at = time.monotonic()
+    return download_scheduler.submit(
+        download_id,
+        lambda: execute_download(url, format_type, quality, download_id, queued_at),
+        priority=download_priority(format_type, quality),
+        client=client
+    )
+
+def recover_interrupted_downloads():
+    """Resume downloads left in temp_downloads by a process that died.
+
+    Jobs keep their download ID, so clients that were following them pick
+    up where they left off; finished but uncollected files are listed again.
+    Every server process runs this at start; each directory is taken over,
+    and its job resumed, by whichever gets to it first.
+    """
+    for job_dir, manifest in job_dirs.scan(TEMP_DIR, config.PARTIAL_MAX_AGE):
+        download_id = manifest.get("downloadId")
+        cache_key = manifest.get("cacheKey")
+        state = manifest.get("state")
+        if not download_id or not cache_key or state == "error":
+            continue
+        if state != "done" and not config.RESUME_INTERRUPTED:
+            continue
+        if job_dirs.take_over(job_dir, manifest) is None:
+            continue
+
+        job = job_store.get(download_id)
+        if state == "done":
+            temp_file_path = manifest.get("tempFilePath")
+            if job is None and temp_file_path and os.path.exists(temp_file_path):
+                job_store.create(download_id, {
+                    "state": "done",
+                    "progress": 100,
+                    "filePath": os.path.basename(temp_file_path),
+                    "sanitizedFilename": manifest.get("sanitizedFilename"),
+                    "tempFilePath": temp_file_path,
+                    "jobDir": job_dir,
+                    "error_message": None,
+                    "speed": None,
+                    "eta": None,
+                    "queuePosition": None,
+                    "cacheKey": cache_key,
+                    "cached": False,
+                    "subscribers": 1
+                })
+            continue
+
+        if job is not None and job["state"] in ("done", "error"):
+            continue
+        fields = {"state": "started", "progress": 0, "speed": None, "eta": None, "jobDir": job_dir}
+        if job is None:
+            job_store.create(download_id, dict(fields, filePath=None, tempFilePath=None, error_message=None,
+                                               queuePosition=None, cacheKey=cache_key, cached=False, subscribers=1))
+        else:
+            job_store.update(download_id, fields)
 
-    return jsonify({"status": "started", "download_id": download_id})
+        try:
+            queue_download(download_id, manifest["url"], manifest["format"], manifest["quality"], "recovery")
+            log.info("Resuming interrupted download", extra={"downloadId": download_id, "jobDir": job_dir})
+        except QueueFull:
+            update_download(download_id, {"state": "error", "error_message": "Download queue is full"})
+
+def download_status(download_id):
+    """Copy of a job's fields with its live queue position, or None"""
+    job = snapshot_download(download_id)
+    if job is not None and job["state"] == "started":
+        job["queuePosition"] = download_scheduler.position(download_id)
+    elif job is not None and job.get("kind") == "bulk":
+        job.update(bulk_downloads.aggregate(job))
+    return job
 
 @app.route("/api/download/status", methods=["GET"])
 def get_download_status():
     download_id = request.args.get("id")
-    with download_progress_lock:
-        if download_id and download_id in download_progress:
-            return jsonify(download_progress[download_id])
-    return jsonify({"error": "Download ID not found"}), 404
+    job = download_status(download_id)
+    if job is None:
+        return jsonify({"error": "Download ID not found"}), 404
+    return jsonify(job)
+
+@app.route("/api/download/events", methods=["GET"])
+def stream_download_events():
+    """Server-sent events with progress deltas for one or more downloads.
+
+    Follow a single job with `?id=<download_id>` or several over one
+    connection with `?ids=<id1>,<id2>`. `rate` caps batches per second.
+    """
+    try:
+        job_ids, rate, poll_interval = download_events_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stream = progress_stream(progress_broadcaster, job_ids, download_status, max_rate=rate,
+                             poll_interval=poll_interval)
+    response = Response(stream_with_context(stream), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def download_events_params(args):
+    """(job IDs, max rate, poll interval) of a download events request; raises ValueError"""
+    ids = args.get("ids") or args.get("id") or ""
+    job_ids = [i for i in dict.fromkeys(ids.split(",")) if i]
+    if not job_ids:
+        raise ValueError("No download ID provided")
+    if len(job_ids) > config.SSE_MAX_IDS:
+        raise ValueError(f"At most {config.SSE_MAX_IDS} downloads per stream")
+
+    try:
+        rate = min(float(args.get("rate", config.SSE_MAX_RATE)), config.SSE_MAX_RATE)
+    except ValueError:
+        rate = config.SSE_MAX_RATE
+
+    # Other workers' updates to a shared store are picked up by re-reading it
+    poll_interval = config.JOB_FLUSH_INTERVAL * 2 if config.JOB_STORE == "sqlite" else None
+    return job_ids, rate, poll_interval
+
+def file_response(file_path, download_name, immutable=False):
+    """Attachment response for a finished file with Range, ETag and Last-Modified support.
+
+    With FILE_OFFLOAD set the body is left to the front proxy (X-Sendfile or
+    X-Accel-Redirect); otherwise werkzeug streams it, which WSGI servers
+    such as gunicorn turn into sendfile(2). `immutable` marks files whose
+    URL can never point at different content.
+    """
+    file_path = os.path.abspath(file_path)
+    if config.FILE_OFFLOAD == "x-accel":
+        relative = os.path.relpath(file_path, os.path.abspath(config.X_ACCEL_ROOT))
+        response = Response(mimetype='application/octet-stream')
+        response.headers['X-Accel-Redirect'] = config.X_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+    else:
+        response = send_file(
+            file_path,
+            mimetype='application/octet-stream',
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=True,
+            max_age=None
+        )
+
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    if immutable:
+        response.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    else:
+        # Revalidate every time; an unchanged file costs a 304
+        response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Range, If-Range, If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'Accept-Ranges, Content-Range, Content-Length, ETag, Last-Modified'
+    return response
 
 @app.route("/api/download", methods=["GET"])
 def serve_downloaded_file():
@@ -442,53 +653,102 @@ def serve_downloaded_file():
     download_id = request.args.get("download_id")
     
     if download_id:
-        with download_progress_lock:
-            if download_id in download_progress:
-                # Serve from stored tempFilePath for this specific job
-                temp_file_path = download_progress[download_id].get("tempFilePath")
-                if temp_file_path and os.path.exists(temp_file_path):
-                    # Use sanitized filename for download
-                    sanitized_filename = download_progress[download_id].get("sanitizedFilename", os.path.basename(temp_file_path))
-                    
-                    # Force browser download popup
-                    response = send_file(
-                        temp_file_path, 
-                        as_attachment=True,
-                        download_name=sanitized_filename
-                    )
-                    # Set headers to force download
-                    response.headers['Content-Disposition'] = f'attachment; filename="{sanitized_filename}"'
-                    response.headers['Content-Type'] = 'application/octet-stream'
-                    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                    response.headers['Pragma'] = 'no-cache'
-                    response.headers['Expires'] = '0'
-                    response.headers['Access-Control-Allow-Origin'] = '*'
-                    response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-                    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-                    return response
+        # Only the job lookup is synchronized; the file is sent without any lock held
+        job = job_store.get(download_id)
+        if job is not None and job["state"] == "done":
+            # Serve from stored tempFilePath for this specific job
+            temp_file_path = job.get("tempFilePath")
+            if temp_file_path and os.path.exists(temp_file_path):
+                # Use sanitized filename for download
+                sanitized_filename = job.get("sanitizedFilename") or os.path.basename(temp_file_path)
+                # A finished job's file never changes under its download ID
+                return file_response(temp_file_path, sanitized_filename, immutable=True)
     elif filename:
         # Legacy support for gallery downloads
         file_path = os.path.join(DOWNLOAD_DIR, filename)
         if os.path.exists(file_path):
             # Sanitize filename for gallery downloads too
             sanitized_filename = sanitize_filename(os.path.splitext(filename)[0]) + os.path.splitext(filename)[1]
-            response = send_file(
-                file_path, 
-                as_attachment=True,
-                download_name=sanitized_filename
-            )
-            response.headers['Content-Disposition'] = f'attachment; filename="{sanitized_filename}"'
-            response.headers['Content-Type'] = 'application/octet-stream'
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            return response
+            return file_response(file_path, sanitized_filename)
     
     return jsonify({"error": "File not found"}), 404
 
+@app.route("/api/download/stream", methods=["GET"])
+def stream_download():
+    """Media piped to the client while it is being fetched, without a job or a second request.
+
+    Takes `url`, `format` and `quality` like POST /api/download. Video
+    arrives as fragmented MP4 and audio as MP3, in a chunked response with
+    no Content-Length and no Range support. A finished copy in the
+    downloads directory is sent as a file instead. With `cache=1` the
+    stream is also written to disk and added to the downloads directory
+    once it ends cleanly.
+    """
+    try:
+        url, format_type, quality = direct_stream_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache_key = artifact_key(canonical_video_id(url), format_type, quality)
+    cached_path = artifact_cache.lookup(cache_key)
+    if cached_path:
+        return file_response(cached_path, os.path.basename(cached_path))
+
+    # Direct stream URLs let ffmpeg fetch by itself; without them yt-dlp feeds it
+    try:
+        video_data = metadata_cache.get(url)
+    except ExtractionError as e:
+        log.info("Metadata cache miss for direct stream, piping through yt-dlp: %s", e)
+        video_data = None
+
+    extension = "mp3" if format_type == "audio" else "mp4"
+    title = (video_data or {}).get("title") or "video"
+    download_name = f"{sanitize_filename(title)}.{extension}"
+    commands = direct_streamer.commands(url, video_data, format_type, quality, audio_quality_for(quality))
+
+    tee_path = None
+    if request.args.get("cache") in ("1", "true"):
+        tee_path = os.path.join(tempfile.mkdtemp(prefix=job_dirs.STREAM_DIR_PREFIX, dir=TEMP_DIR), download_name)
+
+    def keep_streamed_file(path):
+        name = artifact_store.publish(path, os.path.basename(path))
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        artifact_cache.add(cache_key, os.path.join(DOWNLOAD_DIR, name))
+        gallery_catalog.add(name)
+        media_info.schedule(name)
+
+    try:
+        stream = direct_streamer.open(commands, tee_path=tee_path, on_complete=keep_streamed_file)
+    except OSError as e:
+        if tee_path:
+            shutil.rmtree(os.path.dirname(tee_path), ignore_errors=True)
+        return jsonify({"error": f"Failed to start stream: {e}"}), 500
+    if stream is None:
+        if tee_path:
+            shutil.rmtree(os.path.dirname(tee_path), ignore_errors=True)
+        response = jsonify({"error": "Too many streams in progress"})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    # The WSGI server closes the body when the client goes away, which stops the pipeline
+    response = Response(stream, mimetype="audio/mpeg" if format_type == "audio" else "video/mp4",
+                        direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def direct_stream_params(args):
+    """(normalized URL, format, quality) of a direct-stream request; raises ValueError"""
+    url = args.get("url")
+    format_type = args.get("format", "video")
+    if not url:
+        raise ValueError("URL is required")
+    if format_type not in ("video", "audio"):
+        raise ValueError("format must be 'video' or 'audio'")
+    return normalize_url(url), format_type, args.get("quality", "best")
+
 @app.route("/api/download/cleanup", methods=["POST"])
 def cleanup_downloaded_file():
     """Move temporary file to downloads directory and clean up job directory"""
@@ -498,71 +758,187 @@ def cleanup_downloaded_file():
         filename = data.get("filename")
         
         if download_id:
-            with download_progress_lock:
-                if download_id in download_progress:
-                    # Move temporary file to downloads directory
-                    temp_file_path = download_progress[download_id].get("tempFilePath")
-                    job_dir = download_progress[download_id].get("jobDir")
-                    
-                    if temp_file_path and os.path.exists(temp_file_path):
-                        # Get the sanitized filename
-                        sanitized_filename = download_progress[download_id].get("sanitizedFilename", os.path.basename(temp_file_path))
-                        
-                        # Move file to downloads directory
-                        download_file_path = os.path.join(DOWNLOAD_DIR, sanitized_filename)
-                        
-                        # Ensure downloads directory exists
-                        if not os.path.exists(DOWNLOAD_DIR):
-                            os.makedirs(DOWNLOAD_DIR)
-                        
-                        # Move the file
-                        shutil.move(temp_file_path, download_file_path)
-                        
-                        # Clean up job directory
-                        if job_dir and os.path.exists(job_dir):
-                            try:
-                                shutil.rmtree(job_dir)
-                                print(f"Cleaned up job directory: {job_dir}")
-                            except Exception as e:
-                                print(f"Error cleaning up job directory: {e}")
-                        
-                        # Remove from progress tracking
-                        del download_progress[download_id]
-                        return jsonify({"message": "File moved to downloads successfully"})
+            status, _ = collect_download(download_id)
+            if status == "released":
+                return jsonify({"message": "Download released"})
+            if status == "moved":
+                return jsonify({"message": "File moved to downloads successfully"})
         elif filename:
             # Legacy cleanup for gallery files
             file_path = os.path.join(DOWNLOAD_DIR, filename)
             if os.path.exists(file_path):
-                os.remove(file_path)
+                artifact_store.remove(filename)
+                artifact_cache.discard_file(filename)
+                gallery_catalog.remove(filename)
+                media_info.discard(filename)
                 return jsonify({"message": "File cleaned up successfully"})
         
         return jsonify({"error": "File not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def collect_download(download_id):
+    """Drop one client's hold on a finished job; the last one moves its file into the downloads directory.
+
+    Returns (status, file name) where status is "released" while other
+    clients still hold the job, "moved" once the file is in the downloads
+    directory, or None if the job or its file is gone.
+    """
+    job = job_store.release(download_id)
+    if job is None:
+        return None, None
+
+    # Other clients attached to this job still need the file
+    if job.get("subscribers", 0) > 0:
+        progress_broadcaster.publish(download_id)
+        return "released", None
+
+    # Cached artifacts already live in the downloads directory
+    if job.get("cached"):
+        job_store.delete(download_id)
+        progress_broadcaster.forget(download_id)
+        return "moved", job.get("sanitizedFilename")
+
+    # Move temporary file to downloads directory
+    temp_file_path = job.get("tempFilePath")
+    job_dir = job.get("jobDir")
+
+    if not temp_file_path or not os.path.exists(temp_file_path):
+        return None, None
+
+    # Get the sanitized filename
+    sanitized_filename = job.get("sanitizedFilename") or os.path.basename(temp_file_path)
+
+    # Rename into the artifact store and link it into the downloads directory;
+    # the name gets a suffix if another video already has it
+    sanitized_filename = artifact_store.publish(temp_file_path, sanitized_filename,
+                                                identity=job.get("artifactId"), digest=job.get("contentHash"))
+    download_file_path = os.path.join(DOWNLOAD_DIR, sanitized_filename)
+    if job.get("cacheKey"):
+        artifact_cache.add(job["cacheKey"], download_file_path)
+    gallery_catalog.add(sanitized_filename)
+    media_info.schedule(sanitized_filename)
+
+    # Clean up job directory
+    if job_dir and os.path.exists(job_dir):
+        try:
+            shutil.rmtree(job_dir)
+            log.debug("Cleaned up job directory", extra={"jobDir": job_dir})
+        except Exception as e:
+            log.error("Error cleaning up job directory: %s", e, extra={"jobDir": job_dir})
+
+    # Remove from progress tracking
+    job_store.delete(download_id)
+    progress_broadcaster.forget(download_id)
+    return "moved", sanitized_filename
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    return jsonify({
+        "metadataCache": metadata_cache.stats(),
+        "extraction": extraction_policy.stats(),
+        "artifactCache": artifact_cache.stats(),
+        "artifactStore": artifact_store.stats(),
+        "scheduler": download_scheduler.stats(),
+        "directStreams": direct_streamer.stats(),
+        "bandwidth": bandwidth_budget.stats(),
+        "storage": storage.stats(),
+        "postprocess": post_processor.stats(),
+        "stages": stage_timings.stats(),
+        "jobs": job_store.stats(),
+        "gallery": gallery_catalog.stats(),
+        "mediaInfo": media_info.stats(),
+        "analysis": analysis_service.stats(),
+        "analysisBatch": batch_analyzer.stats(),
+        "analysisTranscript": transcript_analyzer.stats()
+    })
+
+def gallery_media(info):
+    """Public form of a media_info result; None while it is still being computed"""
+    if info is None:
+        return None
+    media = {k: v for k, v in info.items() if k not in ("thumbnail", "hasPicture")}
+    media["thumbnailUrl"] = f"/api/gallery/thumbnail/{info['thumbnail']}" if info.get("thumbnail") else None
+    return media
+
+def gallery_file(entry):
+    inode = entry.pop("inode", None)
+    mtime_ns = entry.pop("mtimeNs", None)
+    media = media_info.lookup(entry["name"], (inode, mtime_ns, entry["size"]) if inode is not None else None)
+    return dict(entry,
+                media=gallery_media(media),
+                downloadUrl=f"/api/download?filename={quote(entry['name'])}",
+                deleteUrl=f"/api/gallery/delete?filename={quote(entry['name'])}")
+
 @app.route("/api/gallery", methods=["GET"])
 def get_gallery():
+    """Downloaded files, newest first, from the gallery catalog.
+
+    `limit` and `cursor` page through the files (`nextCursor` is null on the
+    last page), `type` (video or audio), `minSize` and `maxSize` filter them.
+    `since=<changeToken>` returns only what changed after an earlier
+    response; `reset: true` means the token is too old and the client
+    should reload.
+    """
     try:
-        files = []
-        if os.path.exists(DOWNLOAD_DIR):
-            for filename in os.listdir(DOWNLOAD_DIR):
-                file_path = os.path.join(DOWNLOAD_DIR, filename)
-                if os.path.isfile(file_path) and filename.endswith(('.mp4', '.mp3', '.webm', '.m4a')):
-                    file_stat = os.stat(file_path)
-                    files.append({
-                        "name": filename,
-                        "size": file_stat.st_size,
-                        "modified": file_stat.st_mtime,
-                        "downloadUrl": f"/api/download?filename={filename}",
-                        "deleteUrl": f"/api/gallery/delete?filename={filename}"
-                    })
-        
-        # Sort by modification time (newest first)
-        files.sort(key=lambda x: x["modified"], reverse=True)
-        return jsonify({"files": files})
+        since = request.args.get("since")
+        if since:
+            changes, token = gallery_catalog.changes(since)
+            if changes is None:
+                return jsonify({"reset": True, "changes": [], "changeToken": token})
+            changes = [dict(change, file=gallery_file(dict(change["file"]))) if change["op"] == "upsert" else change
+                       for change in changes]
+            return jsonify({"reset": False, "changes": changes, "changeToken": token})
+
+        limit = request.args.get("limit", type=int)
+        min_size = request.args.get("minSize", type=int)
+        max_size = request.args.get("maxSize", type=int)
+        if limit is not None:
+            limit = min(max(limit, 1), config.GALLERY_MAX_PAGE_SIZE)
+
+        # Take the token first so a change racing with this page is replayed, not lost
+        token = gallery_catalog.change_token()
+        files, next_cursor, total = gallery_catalog.page(
+            cursor=request.args.get("cursor"),
+            limit=limit,
+            media_type=request.args.get("type"),
+            min_size=min_size,
+            max_size=max_size
+        )
+        return jsonify({
+            "files": [gallery_file(entry) for entry in files],
+            "nextCursor": next_cursor,
+            "total": total,
+            "changeToken": token
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/gallery/media", methods=["GET"])
+def get_gallery_media():
+    """Duration, resolution, codecs and thumbnail URL of one gallery file (202 while pending)"""
+    filename = request.args.get("filename")
+    if not filename or os.path.basename(filename) != filename:
+        return jsonify({"error": "Invalid filename"}), 400
+    if not os.path.isfile(os.path.join(DOWNLOAD_DIR, filename)):
+        return jsonify({"error": "File not found"}), 404
+    media = gallery_media(media_info.lookup(filename))
+    if media is None:
+        return jsonify({"status": "pending"}), 202
+    return jsonify(media)
+
+@app.route("/api/gallery/thumbnail/<key>.jpg", methods=["GET"])
+def get_gallery_thumbnail(key):
+    # Thumbnail names are content keys, so a URL always means the same image
+    if not re.fullmatch(r"[0-9a-f]{40}", key):
+        return jsonify({"error": "Invalid thumbnail"}), 400
+    path = os.path.abspath(media_info.thumbnail_path(key))
+    if not os.path.exists(path):
+        return jsonify({"error": "Thumbnail not found"}), 404
+    response = send_file(path, mimetype="image/jpeg", conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route("/api/gallery/delete", methods=["DELETE"])
 def delete_file():
     try:
@@ -570,279 +946,433 @@ def delete_file():
         if filename:
             file_path = os.path.join(DOWNLOAD_DIR, filename)
             if os.path.exists(file_path):
-                os.remove(file_path)
+                artifact_store.remove(filename)
+                artifact_cache.discard_file(filename)
+                gallery_catalog.remove(filename)
+                media_info.discard(filename)
                 return jsonify({"message": "File deleted successfully"})
         return jsonify({"error": "File not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def execute_download(url, format_type, quality, download_id):
+def split_streams(video_data, format_spec):
+    """Stream descriptions (codec families by format ID) for a spec like '137+140', or None"""
+    if not video_data or not format_spec:
+        return None
+    formats = {fmt.get("format_id"): fmt for fmt in video_data.get("formats") or []}
+    streams = []
+    for format_id in format_spec.split("+"):
+        fmt = formats.get(format_id)
+        if fmt is None:
+            return None
+        streams.append({"formatId": format_id, "vcodec": codec_family(fmt.get("vcodec")),
+                        "acodec": codec_family(fmt.get("acodec"))})
+    return streams
+
+def download_format(index, format_type, quality):
+    """Exact format spec a download fetches for a request, or None to let yt-dlp select"""
+    format_spec = index.select(format_type, quality)
+    if (format_type == "audio" and config.POSTPROCESS_STAGE and config.AUDIO_OUTPUT == "auto"
+            and audio_quality_for(quality) == "0"):
+        # AAC can be delivered as .m4a without a transcode
+        copyable = index.best_audio(codecs=("aac", "mp3"))
+        if copyable:
+            format_spec = copyable["format_id"]
+    return format_spec
+
+def artifact_identity(video_key, format_spec, format_type, quality):
+    """What a finished file is made of: the video, its exact streams and the post-processing"""
+    if format_type == "audio":
+        processing = f"audio:{config.AUDIO_OUTPUT}:{audio_quality_for(quality)}"
+    else:
+        processing = "video:mp4"
+    return f"{video_key}|{format_spec}|{processing}"
+
+def execute_download(url, format_type, quality, download_id, queued_at=None):
     try:
         # Get job directory for this download
-        with download_progress_lock:
-            if download_id not in download_progress:
-                print(f"Download ID {download_id} not found in progress tracking")
-                return
-            job_dir = download_progress[download_id]["jobDir"]
-            download_progress[download_id]["state"] = "downloading"
-
-        # Normalize Shorts URLs to avoid extractor quirks
-        if "/shorts/" in url:
-            # Extract video ID from Shorts URL and convert to watch URL
-            video_id_match = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
-            if video_id_match:
-                video_id = video_id_match.group(1)
-                url = f"https://www.youtube.com/watch?v={video_id}"
-                print(f"Normalized Shorts URL to: {url}")
-
-        # yt-dlp command construction - save to JOB-SPECIFIC folder
+        job = job_store.get(download_id)
+        if job is None:
+            log.warning("Download ID not found in progress tracking", extra={"downloadId": download_id})
+            return
+        job_dir = job["jobDir"]
+        update_download(download_id, {"state": "downloading", "queuePosition": None})
+        timings = {}
+        if queued_at is not None:
+            timings["downloadWait"] = round(time.monotonic() - queued_at, 3)
+        started = time.monotonic()
+
+        url = normalize_url(url)
+
+        # Save to JOB-SPECIFIC folder
         output_template = os.path.join(job_dir, "%(title)s.%(ext)s")
-        cmd = ["yt-dlp", url, "-o", output_template, "--newline", "--user-agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"]
+        options = {"format": None, "concurrent_fragments": config.DOWNLOAD_CONCURRENT_FRAGMENTS}
+        audio_quality = audio_quality_for(quality)
 
-        if format_type == "audio":
+        # Reuse the cached extraction so yt-dlp does not extract the video again,
+        # and resolve the quality to an exact format ID from the same data
+        video_data = None
+        try:
+            video_data = metadata_cache.get(url)
+            options["format"] = download_format(FormatIndex.from_info(video_data), format_type, quality)
+        except ExtractionError as e:
+            log.info("Metadata cache miss for download, letting yt-dlp extract: %s", e,
+                     extra={"downloadId": download_id})
+
+        if options["format"]:
+            # Recorded with the stored file, so other requests for the same streams can reuse it
+            job_store.update(download_id, {"artifactId": artifact_identity(
+                canonical_video_id(url), options["format"], format_type, quality)})
+
+        # With exact format IDs, yt-dlp only fetches the streams and the
+        # post-processing pool muxes or converts them afterwards
+        streams = split_streams(video_data, options["format"]) if config.POSTPROCESS_STAGE else None
+        if streams is not None:
+            output_template = os.path.join(job_dir, "%(title)s.f%(format_id)s.%(ext)s")
+            options["format"] = ",".join(stream["formatId"] for stream in streams)
+        elif format_type == "audio":
             # For audio extraction (MP3)
-            cmd.extend(["-x", "--audio-format", "mp3"])
+            options["extract_audio"] = "mp3"
             
             # Add audio quality settings
-            if quality == "320":
-                cmd.extend(["--audio-quality", "0"])  # Best quality
-            elif quality == "256":
-                cmd.extend(["--audio-quality", "5"])  # High quality
-            elif quality == "128":
-                cmd.extend(["--audio-quality", "9"])  # Standard quality
-            else:
-                cmd.extend(["--audio-quality", "0"])  # Default to best
+            options["audio_quality"] = audio_quality
         else:
-            # For video formats
-            if quality == "best" or not quality:
-                # Best available quality
-                cmd.append("-f")
-                cmd.append("bestvideo+bestaudio/best")
-            elif quality == "4k":
-                cmd.append("-f")
-                cmd.append("bestvideo[height<=2160]+bestaudio/best[height<=2160]/best")
-            elif quality == "1080p":
-                cmd.append("-f")
-                cmd.append("bestvideo[height<=1080]+bestaudio/best[height<=1080]/best")
-            elif quality == "720p":
-                cmd.append("-f")
-                cmd.append("bestvideo[height<=720]+bestaudio/best[height<=720]/best")
-            elif quality == "480p":
-                cmd.append("-f")
-                cmd.append("bestvideo[height<=480]+bestaudio/best[height<=480]/best")
-            elif quality == "360p":
-                cmd.append("-f")
-                cmd.append("bestvideo[height<=360]+bestaudio/best[height<=360]/best")
-            else:
-                # Default to best quality if unknown quality specified
-                cmd.append("-f")
-                cmd.append("bestvideo+bestaudio/best")
-
-        # Add progress hook and other options
-        cmd.extend([
-            "--progress"
-        ])
-        
-        # Add merge output format for video
-        if format_type == "video":
-            cmd.extend(["--merge-output-format", "mp4"])
-
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+            if not options["format"]:
+                # No usable format data - let yt-dlp solve the selector itself
+                max_height = quality_max_height(quality)
+                if max_height:
+                    options["format"] = f"bestvideo[height<={max_height}]+bestaudio/best[height<={max_height}]/best"
+                else:
+                    options["format"] = "bestvideo+bestaudio/best"
+            options["merge_output_format"] = "mp4"
 
-        final_file_path = None
-        
-        for line in process.stdout:
-            # Debug: Print all lines to see what yt-dlp outputs
-            print(f"yt-dlp output: {line.strip()}")
-            
-            # Track final file path from yt-dlp output
-            if "[Merger] Merging formats into" in line:
-                # Extract final video file path
-                file_path_match = re.search(r'\[Merger\] Merging formats into "([^"]+)"', line)
-                if file_path_match:
-                    final_file_path = file_path_match.group(1)
-                    print(f"Final video file: {final_file_path}")
-            elif "[ExtractAudio] Destination:" in line:
-                # Extract final audio file path
-                file_path_match = re.search(r'\[ExtractAudio\] Destination: (.+)', line)
-                if file_path_match:
-                    final_file_path = file_path_match.group(1).strip()
-                    print(f"Final audio file: {final_file_path}")
-            
-            # Simple percentage extraction - look for any percentage in the line
-            if "%" in line:
-                try:
-                    # Find percentage in the line
-                    percent_match = re.search(r'(\d+\.?\d*)%', line)
-                    if percent_match:
-                        progress = float(percent_match.group(1))
-                        print(f"Found progress: {progress}%")
-                        
-                        with download_progress_lock:
-                            if download_id in download_progress:
-                                download_progress[download_id]["progress"] = progress
-                                download_progress[download_id]["state"] = "downloading"
-                                
-                                # Try to extract speed
-                                speed_match = re.search(r'(\d+\.?\d*[KM]iB/s)', line)
-                                if speed_match:
-                                    download_progress[download_id]["speed"] = speed_match.group(1)
-                                    print(f"Found speed: {speed_match.group(1)}")
-                                
-                                # Try to extract ETA
-                                eta_match = re.search(r'ETA (\d+:\d+)', line)
-                                if eta_match:
-                                    download_progress[download_id]["eta"] = eta_match.group(1)
-                                    print(f"Found ETA: {eta_match.group(1)}")
-                except Exception as e:
-                    print(f"Error parsing progress: {e}")
-            
-            # Parse download progress with more detailed information
-            if "[download]" in line:
-                print(f"Found download line: {line.strip()}")
-                if "%" in line:
-                    try:
-                        # Extract percentage from lines like: [download] 45.2% of 123.4MiB at 2.3MiB/s ETA 00:30
-                        parts = line.split()
-                        for i, part in enumerate(parts):
-                            if "%" in part:
-                                percent_str = part.replace("%", "")
-                                progress = float(percent_str)
-                                print(f"Parsed progress: {progress}%")
-                                
-                                with download_progress_lock:
-                                    if download_id in download_progress:
-                                        download_progress[download_id]["progress"] = progress
-                                        download_progress[download_id]["state"] = "downloading"
-                                        
-                                        # Also extract speed and ETA if available
-                                        if i + 1 < len(parts) and ("MiB/s" in parts[i + 1] or "KiB/s" in parts[i + 1]):
-                                            download_progress[download_id]["speed"] = parts[i + 1]
-                                            print(f"Parsed speed: {parts[i + 1]}")
-                                        if "ETA" in line:
-                                            eta_start = line.find("ETA")
-                                            if eta_start != -1:
-                                                eta_part = line[eta_start:].split()[1]
-                                                download_progress[download_id]["eta"] = eta_part
-                                                print(f"Parsed ETA: {eta_part}")
-                                break
-                    except ValueError as e:
-                        print(f"Error parsing percentage: {e}")
-                        pass
-                elif "of" in line and "at" in line:
-                    # Parse lines like: [download] 45.2MiB of 123.4MiB at 2.3MiB/s ETA 00:30
-                    try:
-                        parts = line.split()
-                        for i, part in enumerate(parts):
-                            if part == "of" and i > 0 and i + 1 < len(parts):
-                                downloaded = parts[i - 1]
-                                total = parts[i + 1]
-                                
-                                print(f"Downloaded: {downloaded}, Total: {total}")
-                                
-                                # Convert to bytes for percentage calculation
-                                downloaded_bytes = parse_size_to_bytes(downloaded)
-                                total_bytes = parse_size_to_bytes(total)
-                                
-                                print(f"Downloaded bytes: {downloaded_bytes}, Total bytes: {total_bytes}")
-                                
-                                if total_bytes > 0:
-                                    progress = (downloaded_bytes / total_bytes) * 100
-                                    progress = min(progress, 99.9)  # Cap at 99.9% until complete
-                                    print(f"Calculated progress: {progress}%")
-                                    
-                                    with download_progress_lock:
-                                        if download_id in download_progress:
-                                            download_progress[download_id]["progress"] = progress
-                                            download_progress[download_id]["state"] = "downloading"
-                                            
-                                            # Extract speed
-                                            for j, speed_part in enumerate(parts):
-                                                if "MiB/s" in speed_part or "KiB/s" in speed_part:
-                                                    download_progress[download_id]["speed"] = speed_part
-                                                    print(f"Parsed speed: {speed_part}")
-                                                    break
-                                            
-                                            # Extract ETA
-                                            if "ETA" in line:
-                                                eta_start = line.find("ETA")
-                                                if eta_start != -1:
-                                                    eta_part = line[eta_start:].split()[1]
-                                                    download_progress[download_id]["eta"] = eta_part
-                                                    print(f"Parsed ETA: {eta_part}")
-                                break
-                    except (ValueError, IndexError) as e:
-                        print(f"Error parsing size-based progress: {e}")
-                        pass
-            elif "[ExtractAudio] Destination:" in line or "[Merger] Merging into" in line:
-                print("Found processing line")
-                with download_progress_lock:
-                    if download_id in download_progress:
-                        download_progress[download_id]["state"] = "processing"
-                        download_progress[download_id]["progress"] = 95  # Set to 95% during processing
-
-        process.wait()
-
-        if process.returncode == 0:
-            # Use the captured final file path or find file in job directory
-            try:
-                if final_file_path and os.path.exists(final_file_path):
-                    # Use the file path captured from yt-dlp output
-                    file_path = final_file_path
-                    print(f"Using captured file path: {file_path}")
+        try:
+            with bandwidth_budget.transfer():
+                if bandwidth_budget.rate:
+                    # The in-process engine draws from the shared budget as bytes arrive;
+                    # a yt-dlp child gets a fixed share of it
+                    options["throttle"] = bandwidth_budget.consume
+                    options["rate_limit"] = bandwidth_budget.share()
+                file_paths = engine.download_files(
+                    url, output_template, options, info=video_data,
+                    on_update=lambda fields: update_download(download_id, fields, buffered=True)
+                )
+            download_failed = None
+        except DownloadError as e:
+            file_paths = []
+            download_failed = str(e)
+        timings["download"] = round(time.monotonic() - started, 3)
+        for stage, seconds in timings.items():
+            stage_timings.record(stage, seconds)
+
+        if download_failed is not None:
+            # Partial files stay in the job directory for the next attempt
+            job_dirs.write_manifest(job_dir, {"state": "error"})
+            metrics.DOWNLOADS.labels(outcome="error").inc()
+            update_download(download_id, {"state": "error", "error_message": download_failed, "timings": timings})
+            return
+
+        if streams is not None:
+            if len(file_paths) != len(streams) or not all(os.path.exists(p) for p in file_paths):
+                # A lone video-only or audio-only stream is not a finished download
+                log.warning("Split download did not deliver every stream",
+                            extra={"downloadId": download_id, "streams": len(streams), "files": len(file_paths)})
+                job_dirs.write_manifest(job_dir, {"state": "error"})
+                metrics.DOWNLOADS.labels(outcome="error").inc()
+                update_download(download_id, {"state": "error", "timings": timings,
+                                              "error_message": "yt-dlp did not deliver every selected stream"})
+                return
+            for stream, path in zip(streams, file_paths):
+                stream["path"] = path
+            update_download(download_id, {"state": "processing", "progress": 95, "speed": None, "eta": None,
+                                          "timings": timings})
+
+            def processed(path, error, postprocess_timings):
+                all_timings = dict(timings, **postprocess_timings)
+                if error is not None:
+                    # The stream files stay in the job directory for the next attempt
+                    job_dirs.write_manifest(job_dir, {"state": "error"})
+                    metrics.DOWNLOADS.labels(outcome="error").inc()
+                    update_download(download_id, {"state": "error", "error_message": f"Post-processing failed: {error}",
+                                                  "timings": all_timings})
                 else:
-                    # Fallback: look for files in job-specific directory only
-                    downloaded_files = []
-                    for f in os.listdir(job_dir):
-                        if f.endswith(('.mp4', '.mp3', '.webm', '.m4a')):
-                            file_path = os.path.join(job_dir, f)
-                            if os.path.isfile(file_path):
-                                downloaded_files.append((f, os.path.getmtime(file_path)))
-                    
-                    if downloaded_files:
-                        # Get the most recently modified file from job directory
-                        latest_file = max(downloaded_files, key=lambda x: x[1])[0]
-                        file_path = os.path.join(job_dir, latest_file)
-                        print(f"Found file in job directory: {file_path}")
-                    else:
-                        print("No downloaded files found in job directory")
-                        raise Exception("No downloaded files found")
-                
-                # Create a sanitized filename for download
-                original_name = os.path.basename(file_path)
-                file_ext = os.path.splitext(original_name)[1]
-                base_name = os.path.splitext(original_name)[0]
-                sanitized_name = sanitize_filename(base_name) + file_ext
-                
-                with download_progress_lock:
-                    if download_id in download_progress:
-                        download_progress[download_id]["filePath"] = original_name
-                        download_progress[download_id]["sanitizedFilename"] = sanitized_name
-                        download_progress[download_id]["tempFilePath"] = file_path
-                        download_progress[download_id]["state"] = "done"
-                        download_progress[download_id]["progress"] = 100
-                        print(f"Download completed: {original_name}")
-                        print(f"Sanitized filename: {sanitized_name}")
-                        print(f"File path: {file_path}")
-                
-            except Exception as e:
-                print(f"Error finding downloaded file: {e}")
-                with download_progress_lock:
-                    if download_id in download_progress:
-                        download_progress[download_id]["state"] = "error"
-                        download_progress[download_id]["error_message"] = f"Failed to locate downloaded file: {str(e)}"
-        else:
-            with download_progress_lock:
-                if download_id in download_progress:
-                    download_progress[download_id]["state"] = "error"
-                    download_progress[download_id]["error_message"] = f"yt-dlp failed with exit code {process.returncode}"
+                    finish_download(download_id, job_dir, path, all_timings)
+
+            # The network worker moves on; ffmpeg runs on the post-processing pool
+            post_processor.submit(streams, format_type, audio_quality, processed)
+            return
+
+        finish_download(download_id, job_dir, file_paths[-1] if file_paths else None, timings)
 
     except Exception as e:
-        print(f"Download error: {e}")
-        with download_progress_lock:
-            if download_id in download_progress:
-                download_progress[download_id]["state"] = "error"
-                download_progress[download_id]["error_message"] = str(e)
+        log.exception("Download error", extra={"downloadId": download_id})
+        metrics.DOWNLOADS.labels(outcome="error").inc()
+        update_download(download_id, {"state": "error", "error_message": str(e)})
+
+def finish_download(download_id, job_dir, final_file_path, timings):
+    """Record the delivered file of a download and mark the job done"""
+    # Use the captured final file path or find file in job directory
+    try:
+        if final_file_path and os.path.exists(final_file_path):
+            # Use the file path captured from yt-dlp output
+            file_path = final_file_path
+            log.debug("Using captured file path", extra={"downloadId": download_id, "path": file_path})
+        else:
+            # Fallback: look for files in job-specific directory only
+            downloaded_files = []
+            for f in os.listdir(job_dir):
+                if f.endswith(('.mp4', '.mp3', '.webm', '.m4a')):
+                    file_path = os.path.join(job_dir, f)
+                    if os.path.isfile(file_path):
+                        downloaded_files.append((f, os.path.getmtime(file_path)))
+            
+            if downloaded_files:
+                # Get the most recently modified file from job directory
+                latest_file = max(downloaded_files, key=lambda x: x[1])[0]
+                file_path = os.path.join(job_dir, latest_file)
+                log.debug("Found file in job directory", extra={"downloadId": download_id, "path": file_path})
+            else:
+                raise Exception("No downloaded files found")
+        
+        # Create a sanitized filename for download
+        original_name = os.path.basename(file_path)
+        file_ext = os.path.splitext(original_name)[1]
+        base_name = os.path.splitext(original_name)[0]
+        sanitized_name = sanitize_filename(base_name) + file_ext
+        
+        # Hashed here, on a worker, so publishing it later is only a rename
+        content_hash = file_digest(file_path)
+        job_dirs.write_manifest(job_dir, {
+            "state": "done",
+            "tempFilePath": file_path,
+            "sanitizedFilename": sanitized_name
+        })
+        if update_download(download_id, {
+            "filePath": original_name,
+            "sanitizedFilename": sanitized_name,
+            "tempFilePath": file_path,
+            "contentHash": content_hash,
+            "state": "done",
+            "progress": 100,
+            "timings": timings
+        }):
+            log.info("Download completed", extra={"downloadId": download_id, "file": sanitized_name,
+                                                  "path": file_path})
+        metrics.DOWNLOADS.labels(outcome="done").inc()
+        size = os.path.getsize(file_path)
+        metrics.DOWNLOAD_BYTES.inc(size)
+        if timings.get("download"):
+            metrics.DOWNLOAD_THROUGHPUT.observe(size / timings["download"])
+        
+    except Exception as e:
+        log.error("Error finding downloaded file: %s", e, extra={"downloadId": download_id})
+        metrics.DOWNLOADS.labels(outcome="error").inc()
+        update_download(download_id, {
+            "state": "error",
+            "error_message": f"Failed to locate downloaded file: {str(e)}"
+        })
+
+def create_app(**settings):
+    """The Flask application, with `settings` overriding values of config by name.
+
+    Cheap and free of side effects: no directories, threads, databases or
+    yt-dlp import happen here, so a pre-fork server may call it in its
+    master process (gunicorn --preload). Every process builds its own
+    services on its first request, or earlier by calling init_services()
+    (gunicorn.conf.py does so right after each fork).
+    """
+    global _app_created
+    for name, value in settings.items():
+        if not name.isupper() or not hasattr(config, name):
+            raise TypeError(f"Unknown setting: {name}")
+        setattr(config, name, value)
+    logs.configure(config.LOG_LEVEL, config.LOG_FORMAT, config.LOG_RATE_BURST, config.LOG_RATE_INTERVAL)
+    app.config['USE_X_SENDFILE'] = config.FILE_OFFLOAD == "x-sendfile"
+    _app_created = True
+    return app
+
+def init_services():
+    """Create the directories and services of this process and start its background work.
+
+    Runs once per process: a process forked from one that already ran it
+    builds its own, since threads, SQLite connections and pools do not
+    survive a fork.
+    """
+    global DOWNLOAD_DIR, TEMP_DIR, model_client, analysis_broadcaster, analysis_service, transcript_analyzer, \
+        engine, extraction_policy, metadata_cache, batch_analyzer, job_store, progress_broadcaster, \
+        download_scheduler, stage_timings, post_processor, artifact_store, artifact_cache, storage, \
+        gallery_catalog, media_info, bulk_downloads, direct_streamer, bandwidth_budget, _services_pid
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+        if not _app_created:
+            # Served as app:app, without the factory
+            create_app()
+        DOWNLOAD_DIR = config.DOWNLOAD_DIR
+        TEMP_DIR = config.TEMP_DIR
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        os.makedirs(TEMP_DIR, exist_ok=True)
+
+        # Gemini (or, with AI_BACKEND=stub, a local stand-in) behind a background analysis pool
+        model_client = create_model_client(
+            config.AI_BACKEND,
+            model_name=config.AI_MODEL,
+            api_key=config.GEMINI_API_KEY,
+            stub_delay=config.AI_STUB_DELAY,
+            requests_per_minute=config.AI_RPM
+        )
+        analysis_broadcaster = ProgressBroadcaster()
+        analysis_service = AnalysisService(
+            model_client,
+            workers=config.AI_WORKERS,
+            ttl=config.AI_CACHE_TTL,
+            max_entries=config.AI_CACHE_MAX_ENTRIES,
+            broadcaster=analysis_broadcaster
+        )
+        # Transcript-grounded analyses, summarized chunk by chunk with partial results
+        transcript_analyzer = TranscriptAnalyzer(
+            analysis_service,
+            TranscriptCache(os.path.join(DOWNLOAD_DIR, ".transcripts"), languages=config.TRANSCRIPT_LANGUAGES),
+            chunk_chars=config.TRANSCRIPT_CHUNK_CHARS
+        )
+
+        # yt-dlp runs inside this process unless YTDLP_ENGINE=subprocess; the package is imported on first use
+        engine = create_engine(config.YTDLP_ENGINE, config.YTDLP_BIN)
+
+        # Hedged extractions, remembered permanent failures and a breaker for upstream outages
+        extraction_policy = ExtractionPolicy(
+            engine,
+            hedge_after=config.EXTRACT_HEDGE_AFTER,
+            negative_ttl=config.EXTRACT_NEGATIVE_TTL,
+            breaker=CircuitBreaker(
+                failure_ratio=config.EXTRACT_BREAKER_RATIO,
+                min_calls=config.EXTRACT_BREAKER_MIN_CALLS,
+                window=config.EXTRACT_BREAKER_WINDOW,
+                cooldown=config.EXTRACT_BREAKER_COOLDOWN
+            ),
+            workers=config.EXTRACT_WORKERS
+        )
+
+        # yt-dlp info dicts shared by /api/video/info, /api/video/formats and downloads
+        metadata_cache = MetadataCache(
+            extraction_policy.extract_info,
+            max_entries=config.METADATA_CACHE_MAX_ENTRIES,
+            max_bytes=config.METADATA_CACHE_MAX_BYTES,
+            ttl=config.METADATA_CACHE_TTL
+        )
+
+        # Many-video analyses share model requests, packed up to a token budget
+        batch_analyzer = BatchAnalyzer(
+            analysis_service,
+            metadata_cache.get,
+            lambda url: canonical_video_id(normalize_url(url)),
+            token_budget=config.AI_BATCH_TOKEN_BUDGET,
+            max_videos=config.AI_BATCH_MAX_VIDEOS
+        )
+
+        # Download job state, in memory or in a SQLite database shared by all workers
+        job_store = create_job_store(
+            config.JOB_STORE,
+            path=config.JOB_STORE_PATH,
+            ttl=config.JOB_TTL,
+            flush_interval=config.JOB_FLUSH_INTERVAL
+        )
+
+        # Wakes up /api/download/events streams when a job changes
+        progress_broadcaster = ProgressBroadcaster()
+
+        # Finished jobs nobody collected are dropped in the background
+        threading.Thread(target=expire_jobs, name="job-expiry", daemon=True).start()
+
+        # Bounded worker pool that runs execute_download for queued jobs
+        download_scheduler = DownloadScheduler(
+            worker_count=config.DOWNLOAD_WORKERS,
+            max_queued=config.DOWNLOAD_QUEUE_SIZE,
+            max_queued_per_client=config.DOWNLOAD_QUEUE_PER_CLIENT
+        )
+        download_scheduler.start()
+
+        # Bandwidth shared by downloads and direct streams, handed out as they start and finish
+        bandwidth_budget = BandwidthBudget(config.DOWNLOAD_BANDWIDTH_LIMIT)
+
+        # Seconds spent per stage (queue, download, post-processing queue, ffmpeg)
+        stage_timings = StageTimings()
+
+        # ffmpeg merging and conversion on a CPU-sized pool of its own, fed by the download workers
+        post_processor = PostProcessor(
+            ffmpeg=config.FFMPEG_BIN,
+            workers=config.POSTPROCESS_WORKERS,
+            audio_output=config.AUDIO_OUTPUT,
+            video_encoder=config.POSTPROCESS_VIDEO_ENCODER,
+            timings=stage_timings
+        )
+
+        # Finished files stored once by content hash; gallery names are links into the store
+        artifact_store = ArtifactStore(DOWNLOAD_DIR)
+        artifact_store.collect()
+
+        # Finished downloads reused for repeat requests
+        artifact_cache = ArtifactCache(DOWNLOAD_DIR, max_bytes=config.ARTIFACT_CACHE_MAX_BYTES,
+                                       remove_file=artifact_store.remove)
+
+        # Disk quota, free-space floor and job directory garbage collection for temp_downloads
+        storage = StorageManager(
+            TEMP_DIR,
+            artifact_cache,
+            snapshot_download,
+            quota=config.STORAGE_QUOTA_BYTES,
+            min_free=config.STORAGE_MIN_FREE_BYTES,
+            orphan_age=config.STORAGE_ORPHAN_AGE,
+            # Deduplicated files count once, not once per gallery name
+            stored_bytes=lambda: artifact_store.stats()["bytes"]
+        )
+        storage.start(config.STORAGE_GC_INTERVAL)
+
+        # Sorted index of the downloads directory behind /api/gallery
+        gallery_catalog = GalleryCatalog(DOWNLOAD_DIR)
+        gallery_catalog.watch(config.GALLERY_WATCH_INTERVAL)
+
+        # Thumbnails and ffprobe metadata for gallery files, computed in the background
+        media_info = MediaInfoCache(
+            DOWNLOAD_DIR,
+            os.path.join(DOWNLOAD_DIR, ".media"),
+            ffprobe=config.FFPROBE_BIN,
+            ffmpeg=config.FFMPEG_BIN,
+            workers=config.MEDIA_INFO_WORKERS
+        )
+
+        # Playlist and channel downloads: a parent job feeding child downloads to the scheduler
+        bulk_downloads = BulkDownloads(
+            job_store,
+            lambda url, limit: engine.extract_playlist(url, limit),
+            lambda url, format_type, quality, client: start_download(url, format_type, quality, client),
+            lambda download_id: collect_download(download_id),
+            progress_broadcaster.publish,
+            window=config.BULK_WINDOW,
+            item_retries=config.BULK_ITEM_RETRIES,
+            max_items=config.BULK_MAX_ITEMS
+        )
+
+        # Media piped straight to the client while it is fetched (GET /api/download/stream)
+        direct_streamer = DirectStreamer(
+            ffmpeg=config.FFMPEG_BIN,
+            ytdlp=config.YTDLP_BIN,
+            max_streams=config.DIRECT_STREAM_MAX,
+            chunk_size=config.DIRECT_STREAM_CHUNK_SIZE,
+            budget=bandwidth_budget
+        )
+
+        metrics.JOBS.set_function(pool_jobs)
+        metrics.TEMP_DISK_BYTES.set_function(storage.temp_bytes)
+
+        # Downloads a previous process left unfinished, picked up without holding up this request
+        threading.Thread(target=recover_interrupted_downloads, name="job-recovery", daemon=True).start()
+
+        _services_pid = os.getpid()
 
 if __name__ == "__main__":
-    app.run(debug=True, port=8095)
\ No newline at end of file
+    create_app()
+    # The reloader's parent process only watches files; the child it spawns serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        init_services()
+    app.run(debug=True, port=8095)
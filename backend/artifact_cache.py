@@ -0,0 +1,159 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+def artifact_key(video_key, format_type, quality):
+    """Cache key for one finished download (canonical video ID, format, quality)"""
+    return f"{video_key}|{format_type}|{quality}"
+
+
+class ArtifactCache:
+    """Index of finished downloads kept in the downloads directory.
+
+    Maps artifact keys to files in `directory` so a repeat request can be
+    served without fetching the video again. The index is persisted next to
+    the files and shared by the server processes using the directory: each
+    operation holds an flock on `<index>.lock` and reads the index again if
+    another process wrote it since. Entries whose file disappeared are
+    dropped on lookup, and the
+    least recently used files are deleted once the cached files exceed
+    `max_bytes` (0 disables the limit). Files are deleted by name through
+    `remove_file`, so a store behind the names can drop its copy too; it
+    returns the bytes that actually freed (0 while another name still
+    links the content), or None to count the entry's size.
+    """
+
+    def __init__(self, directory, max_bytes=0, index_name=".artifacts.json", remove_file=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.remove_file = remove_file or (lambda name: os.remove(os.path.join(directory, name)))
+        self.index_path = os.path.join(directory, index_name)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._lock_file = open(self.index_path + ".lock", "a")
+        self._entries = {}
+        self._loaded = None  # (inode, mtime, size) of the index file last read or written
+
+    @contextmanager
+    def _locked(self):
+        """Hold the index against this process's other threads and the other processes"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _signature(self):
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        signature = self._signature()
+        if signature == self._loaded:
+            return
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+        self._loaded = signature
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.index_path)
+        self._loaded = self._signature()
+
+    def lookup(self, key):
+        """Return the cached file path for `key`, or None on a miss"""
+        with self._locked():
+            entry = self._entries.get(key)
+            path = os.path.join(self.directory, entry["name"]) if entry else None
+            if path is None or not os.path.isfile(path):
+                if entry:
+                    del self._entries[key]
+                    self._save()
+                self.misses += 1
+                return None
+            # Saved so every process evicts by the same recency
+            entry["lastUsed"] = time.time()
+            self._save()
+            self.hits += 1
+            return path
+
+    def add(self, key, path):
+        """Record a file that was just published into the downloads directory"""
+        with self._locked():
+            name = os.path.basename(path)
+            # A new file under the same name replaces whatever was cached there
+            for other_key in [k for k, e in self._entries.items() if e["name"] == name]:
+                del self._entries[other_key]
+            self._entries[key] = {
+                "name": name,
+                "size": os.path.getsize(path),
+                "lastUsed": time.time()
+            }
+            self._evict(keep=key)
+            self._save()
+
+    def discard_file(self, name):
+        """Forget entries for a file that was deleted from the downloads directory"""
+        with self._locked():
+            stale = [k for k, e in self._entries.items() if e["name"] == name]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._save()
+
+    def evict(self, nbytes):
+        """Delete least recently used files until `nbytes` are freed; returns the bytes freed"""
+        with self._locked():
+            freed = self._evict_lru(nbytes)
+            if freed:
+                self._save()
+            return freed
+
+    def _evict(self, keep):
+        if not self.max_bytes:
+            return
+        total = sum(e["size"] for e in self._entries.values())
+        self._evict_lru(total - self.max_bytes, keep)
+
+    def _evict_lru(self, nbytes, keep=None):
+        freed = 0
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]["lastUsed"]):
+            if freed >= nbytes:
+                break
+            if key == keep:
+                continue
+            try:
+                removed = self.remove_file(entry["name"])
+            except OSError:
+                removed = 0
+            del self._entries[key]
+            freed += entry["size"] if removed is None else removed
+            self.evictions += 1
+        return freed
+
+    def stats(self):
+        with self._locked():
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e["size"] for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,271 @@
+"""Content-addressed storage for finished downloads.
+
+Every distinct file is stored once, under `<downloads>/.store/objects/`
+by its SHA-256, and the names in the downloads directory (the gallery) are
+hard links to it, or symbolic links where the filesystem has no hard
+links. Publishing a download is then a rename into the store plus a link,
+both O(1) on one filesystem; only a temp directory on another filesystem
+costs a copy, made into the store's staging directory first so the object
+still appears atomically. A name that is taken by other content gets a
+numbered suffix instead of being overwritten.
+
+The index records, per object, the gallery names linking to it and the
+identities it was produced for: the video, the exact format IDs and the
+post-processing applied, so a request that resolves to the same streams
+(e.g. "best" and "1080p" of a 1080p video) can reuse the file. Server
+processes sharing the downloads directory share the index: every
+operation holds an flock on `.store/index.lock` and reads the index again
+if another process replaced it since.
+"""
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Where a hard link is impossible, fall back to a symbolic link
+NO_HARDLINK_ERRORS = (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EACCES)
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Objects under `<directory>/.store`, linked into `directory` by name"""
+
+    def __init__(self, directory, store_name=".store"):
+        self.directory = directory
+        self.root = os.path.join(directory, store_name)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.staging_dir = os.path.join(self.root, "staging")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.json")
+        self._device = os.stat(self.root).st_dev
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(self.root, "index.lock"), "a")
+        self._objects = {}  # digest -> {"ext", "size", "names", "identities"}
+        self._names = {}  # gallery name -> digest
+        self._identities = {}  # identity -> digest
+        self._loaded = None  # (inode, mtime, size) of the index file last read or written
+        self.published = 0
+        self.deduplicated = 0
+        self.copied = 0
+        self.removed = 0
+        with self._locked():
+            pass
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store against this process's other threads and the other processes"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        """Read the index again if another process replaced it"""
+        signature = self._signature(self.index_path)
+        if signature == self._loaded:
+            return
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self._objects = json.load(f)
+        except (OSError, ValueError):
+            self._objects = {}
+        self._names = {}
+        self._identities = {}
+        for digest, entry in self._objects.items():
+            self._names.update((name, digest) for name in entry["names"])
+            self._identities.update((identity, digest) for identity in entry["identities"])
+        self._loaded = signature
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._objects, f)
+        os.replace(tmp_path, self.index_path)
+        self._loaded = self._signature(self.index_path)
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def publish(self, path, name, identity=None, digest=None):
+        """Move a finished file into the store and link it into the gallery as `name`.
+
+        `digest` is the file's SHA-256 when already known. Returns the
+        gallery name used, which differs from `name` when that belongs to
+        other content.
+        """
+        digest = digest or file_digest(path)
+        ext = os.path.splitext(name)[1].lower()
+        obj = self.object_path(digest, ext)
+
+        staged = path
+        if os.stat(path).st_dev != self._device:
+            # Another filesystem: copy next to the store so the object still appears by rename
+            staged = os.path.join(self.staging_dir, uuid.uuid4().hex)
+            shutil.copyfile(path, staged)
+
+        with self._locked():
+            if os.path.exists(obj):
+                os.remove(staged)
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                os.chmod(staged, 0o444)  # links share the inode; nothing may write through one
+                os.rename(staged, obj)
+            if staged != path:
+                os.remove(path)
+                self.copied += 1
+            name = self._link(obj, name)
+            previous = self._names.get(name)
+            if previous is not None and previous != digest:
+                # The name was deleted behind the store's back and is now reused
+                self._drop_name(previous, name)
+
+            entry = self._objects.setdefault(digest, {"ext": ext, "size": os.path.getsize(obj),
+                                                      "names": [], "identities": []})
+            if name not in entry["names"]:
+                entry["names"].append(name)
+            self._names[name] = digest
+            if identity and identity not in entry["identities"]:
+                entry["identities"].append(identity)
+                self._identities[identity] = digest
+            self.published += 1
+            self._save()
+        return name
+
+    def _link(self, obj, name):
+        base, ext = os.path.splitext(name)
+        candidate = name
+        number = 1
+        while True:
+            target = os.path.join(self.directory, candidate)
+            try:
+                if os.path.samefile(target, obj):
+                    return candidate
+            except OSError:
+                pass
+            try:
+                self._make_link(obj, target)
+                return candidate
+            except FileExistsError:
+                number += 1
+                candidate = f"{base} ({number}){ext}"
+
+    def _make_link(self, obj, target):
+        try:
+            os.link(obj, target)
+        except OSError as e:
+            # EEXIST is the caller's to handle
+            if e.errno not in NO_HARDLINK_ERRORS:
+                raise
+            os.symlink(os.path.relpath(obj, self.directory), target)
+
+    def lookup(self, identity):
+        """Gallery path of a stored file made for `identity`, or None"""
+        with self._locked():
+            digest = self._identities.get(identity)
+            entry = self._objects.get(digest) if digest else None
+            for name in (entry or {}).get("names", ()):
+                path = os.path.join(self.directory, name)
+                if os.path.isfile(path):
+                    return path
+            return None
+
+    def remove(self, name):
+        """Delete a gallery name; the object goes with its last name. Returns the bytes freed."""
+        with self._locked():
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            digest = self._names.pop(name, None)
+            if digest is None:
+                return 0
+            freed = self._drop_name(digest, name)
+            self._save()
+            return freed
+
+    def _drop_name(self, digest, name):
+        entry = self._objects[digest]
+        if name in entry["names"]:
+            entry["names"].remove(name)
+        if entry["names"]:
+            return 0
+        try:
+            os.remove(self.object_path(digest, entry["ext"]))
+        except OSError:
+            pass
+        for identity in entry["identities"]:
+            if self._identities.get(identity) == digest:
+                del self._identities[identity]
+        del self._objects[digest]
+        self.removed += 1
+        return entry["size"]
+
+    def collect(self, staging_age=600):
+        """Forget names deleted behind the store's back and delete objects nothing links to any more"""
+        with self._locked():
+            stale = []
+            for name, digest in self._names.items():
+                path = os.path.join(self.directory, name)
+                obj = self._objects[digest]
+                try:
+                    if os.path.samefile(path, self.object_path(digest, obj["ext"])):
+                        continue
+                except OSError:
+                    pass
+                stale.append((name, digest))
+            for name, digest in stale:
+                del self._names[name]
+                self._drop_name(digest, name)
+            for entry in os.scandir(self.staging_dir):
+                # Copies interrupted by a restart; another process may be writing a recent one
+                try:
+                    if time.time() - entry.stat().st_mtime > staging_age:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            if stale:
+                self._save()
+                log.info("Collected unlinked artifacts", extra={"names": len(stale)})
+
+    def stats(self):
+        with self._locked():
+            return {
+                "objects": len(self._objects),
+                "bytes": sum(entry["size"] for entry in self._objects.values()),
+                "names": len(self._names),
+                "published": self.published,
+                "deduplicated": self.deduplicated,
+                "copied": self.copied,
+                "removed": self.removed
+            }
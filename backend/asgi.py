@@ -0,0 +1,373 @@
+"""ASGI serving mode: the same routes, with the ones that mostly wait served on asyncio.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8095
+
+Every route of app.py keeps working. Most requests go to the Flask app
+through a WSGI adapter with ASGI_WSGI_THREADS threads. The routes whose
+requests are numerous or long-lived, and spend that time waiting, are
+served here on the event loop without holding a thread:
+
+- GET /api/download/events and /api/analysis/events: SSE streams woken by
+  the broadcasters;
+- GET /api/download/status: a job store lookup, on the default executor
+  like every job store call made here (the SQLite store blocks);
+- GET /api/video/info and /api/video/formats: the metadata cache, with
+  misses extracted by a yt-dlp child under asyncio.create_subprocess_exec
+  (concurrent requests for one video share the extraction);
+- GET /api/download/stream: the direct-stream pipeline, read from the
+  event loop and sent as fast as the client takes it. Cached files and
+  `cache=1` streams go through Flask.
+
+Model calls already run on the analysis pool, off the request path, in
+both modes. The backend's services, job recovery and background pools are
+started by the lifespan startup event, once per worker process.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import config
+import metrics
+import app as backend
+from metadata_cache import UNUSED_INFO_KEYS, canonical_video_id, normalize_url
+from artifact_cache import artifact_key
+from progress_events import async_progress_stream
+from extraction import CircuitOpen
+from ytdlp_engine import AsyncExtractor, ExtractionError
+from logs import get_logger
+
+log = get_logger(__name__)
+
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+SSE_HEADERS = [(b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+# Returned by a handler, before it sends anything, to pass the request on to Flask
+DELEGATE = object()
+
+
+class AsyncMetadata:
+    """The shared MetadataCache, filled by AsyncExtractor on a miss; one extraction per video at a time.
+
+    Misses go through the same ExtractionPolicy as Flask's: its negative
+    cache and circuit breaker are checked first and fed the outcome.
+    """
+
+    def __init__(self, cache, extractor, policy):
+        self.cache = cache
+        self.extractor = extractor
+        self.policy = policy
+        self._inflight = {}  # canonical video ID -> extraction task
+
+    async def get(self, url):
+        url = normalize_url(url)
+        info = self.cache.peek(url)
+        if info is not None:
+            return info
+        self.policy.check(url)
+        key = canonical_video_id(url)
+        task = self._inflight.get(key)
+        if task is None:
+            self.cache.record_miss()
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, url))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A client that goes away does not cancel the extraction for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, url):
+        try:
+            info = await self.extractor.extract_info(url)
+        except Exception as e:
+            error = e if isinstance(e, ExtractionError) else ExtractionError(str(e))
+            self.policy.record(url, error)
+            raise error
+        self.policy.record(url)
+        for unused_key in UNUSED_INFO_KEYS:
+            info.pop(unused_key, None)
+        self.cache.put(key, info)
+        return info
+
+    def _finished(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved, so a failure nobody waited for is not logged as lost
+
+
+class AsyncMediaStream:
+    """A direct-stream pipeline (see direct_stream.MediaStream) read on the event loop"""
+
+    def __init__(self, commands, chunk_size, budget=None):
+        self.commands = commands
+        self.chunk_size = chunk_size
+        self.budget = budget
+        self.bytes_sent = 0
+        self._errors = tempfile.TemporaryFile()
+        self._processes = []
+
+    async def start(self):
+        stdin = None
+        try:
+            for position, cmd in enumerate(self.commands):
+                read_end = write_end = None
+                if position < len(self.commands) - 1:
+                    read_end, write_end = os.pipe()
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *cmd, stdin=stdin, stderr=self._errors,
+                        stdout=write_end if write_end is not None else asyncio.subprocess.PIPE)
+                except Exception:
+                    if read_end is not None:
+                        os.close(read_end)
+                    raise
+                finally:
+                    # Each pipe end now belongs to the child using it
+                    if stdin is not None:
+                        os.close(stdin)
+                    if write_end is not None:
+                        os.close(write_end)
+                self._processes.append(process)
+                stdin = read_end
+        except Exception:
+            await self.close()
+            raise
+
+    async def chunks(self):
+        output = self._processes[-1].stdout
+        while True:
+            chunk = await output.read(self.chunk_size)
+            if not chunk:
+                break
+            wait = self.budget.reserve(len(chunk)) if self.budget is not None else 0
+            if wait:
+                await asyncio.sleep(wait)
+            self.bytes_sent += len(chunk)
+            yield chunk
+        for process in self._processes:
+            await process.wait()
+        failed = [process for process in self._processes if process.returncode != 0]
+        if failed:
+            self._errors.seek(0)
+            detail = self._errors.read().decode("utf-8", "replace").strip().splitlines()
+            log.warning("Direct stream failed: %s", detail[-1] if detail else f"exit code {failed[0].returncode}")
+
+    async def close(self):
+        for process in self._processes:
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+        self._errors.close()
+
+
+async def send_json(send, body, status=200, headers=()):
+    payload = json.dumps(body).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(payload)).encode())] + CORS_HEADERS + list(headers)})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def send_stream(receive, send, chunks, content_type, headers=()):
+    """Send an async iterable as a chunked body; stops it when the client disconnects"""
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", content_type)] + CORS_HEADERS + list(headers)})
+
+    async def pump():
+        async for chunk in chunks:
+            # The server's flow control makes this wait while the client is not reading
+            await send({"type": "http.response.body", "body": chunk.encode() if isinstance(chunk, str) else chunk,
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    sender = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (sender, watcher):
+            task.cancel()
+        outcome, _ = await asyncio.gather(sender, watcher, return_exceptions=True)
+        await chunks.aclose()
+    if isinstance(outcome, Exception):
+        log.warning("Streamed response ended early: %s", outcome)
+
+
+def query_args(scope):
+    return {key: values[0] for key, values in
+            parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True).items()}
+
+
+wsgi_application = WSGIMiddleware(backend.create_app(), workers=config.ASGI_WSGI_THREADS)
+metadata = None  # AsyncMetadata, built with the backend's services at startup
+
+
+def start_services():
+    global metadata
+    backend.init_services()
+    metadata = AsyncMetadata(backend.metadata_cache, AsyncExtractor(config.YTDLP_BIN, config.EXTRACT_HEDGE_AFTER),
+                             backend.extraction_policy)
+
+
+async def download_status(scope, receive, send, args):
+    # A SQLite job store query blocks; keep it off the event loop
+    job = await asyncio.to_thread(backend.download_status, args.get("id"))
+    if job is None:
+        return await send_json(send, {"error": "Download ID not found"}, 404)
+    await send_json(send, job)
+
+
+async def download_events(scope, receive, send, args):
+    try:
+        job_ids, rate, poll_interval = backend.download_events_params(args)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+    stream = async_progress_stream(backend.progress_broadcaster, job_ids, backend.download_status,
+                                   max_rate=rate, poll_interval=poll_interval)
+    await send_stream(receive, send, stream, b"text/event-stream", SSE_HEADERS)
+
+
+async def analysis_events(scope, receive, send, args):
+    analysis_id = args.get("id")
+    if not analysis_id:
+        return await send_json(send, {"error": "No analysis ID provided"}, 400)
+    stream = async_progress_stream(backend.analysis_broadcaster, [analysis_id], backend.analysis_service.get)
+    await send_stream(receive, send, stream, b"text/event-stream", SSE_HEADERS)
+
+
+async def video_info(scope, receive, send, args):
+    url = args.get("url")
+    if not url:
+        return await send_json(send, {"error": "No URL provided"}, 400)
+    mode = args.get("mode", "metadata")
+    if mode not in ("metadata", "transcript"):
+        return await send_json(send, {"error": "mode must be 'metadata' or 'transcript'"}, 400)
+    try:
+        video_data = await metadata.get(url)
+    except ExtractionError as e:
+        log.warning("Metadata extraction for AI analysis failed: %s", e)
+        video_data = None
+    await send_json(send, backend.video_info_body(url, mode, video_data))
+
+
+async def video_formats(scope, receive, send, args):
+    url = args.get("url")
+    if not url:
+        return await send_json(send, {"error": "No URL provided"}, 400)
+    try:
+        video_data = await metadata.get(url)
+    except CircuitOpen as e:
+        return await send_json(send, {"error": str(e)}, 503, [(b"retry-after", str(e.retry_after).encode())])
+    except ExtractionError:
+        return await send_json(send, {"error": "Failed to get video formats"}, 500)
+    await send_json(send, backend.formats_body(video_data))
+
+
+async def stream_download(scope, receive, send, args):
+    try:
+        url, format_type, quality = backend.direct_stream_params(args)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    # Finished files and streams kept on disk are file work; Flask has it
+    cache_key = artifact_key(canonical_video_id(url), format_type, quality)
+    if args.get("cache") in ("1", "true") or backend.artifact_cache.lookup(cache_key):
+        return DELEGATE
+
+    try:
+        video_data = await metadata.get(url)
+    except ExtractionError as e:
+        log.info("Metadata cache miss for direct stream, piping through yt-dlp: %s", e)
+        video_data = None
+
+    streamer = backend.direct_streamer
+    if not streamer.acquire():
+        return await send_json(send, {"error": "Too many streams in progress"}, 429, [(b"retry-after", b"30")])
+    stream = None
+    try:
+        commands = streamer.commands(url, video_data, format_type, quality, backend.audio_quality_for(quality))
+        stream = AsyncMediaStream(commands, streamer.chunk_size, streamer.budget)
+        try:
+            await stream.start()
+        except OSError as e:
+            stream = None
+            return await send_json(send, {"error": f"Failed to start stream: {e}"}, 500)
+
+        extension = "mp3" if format_type == "audio" else "mp4"
+        title = (video_data or {}).get("title") or "video"
+        download_name = f"{backend.sanitize_filename(title)}.{extension}"
+        headers = [(b"content-disposition", f'attachment; filename="{download_name}"'.encode()),
+                   (b"cache-control", b"no-store"), (b"x-accel-buffering", b"no")]
+        await send_stream(receive, send, stream.chunks(), b"audio/mpeg" if format_type == "audio" else b"video/mp4",
+                          headers)
+    finally:
+        if stream is not None:
+            await stream.close()
+        streamer.release(stream.bytes_sent if stream is not None else None)
+
+
+ROUTES = {
+    "/api/download/status": download_status,
+    "/api/download/events": download_events,
+    "/api/analysis/events": analysis_events,
+    "/api/video/info": video_info,
+    "/api/video/formats": video_formats,
+    "/api/download/stream": stream_download,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                start_services()
+            except Exception as e:
+                log.exception("Startup failed")
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    handler = ROUTES.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+    if handler is None:
+        return await wsgi_application(scope, receive, send)
+
+    started = time.perf_counter()
+    response = {}
+
+    async def timed_send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            metrics.HTTP_REQUEST_SECONDS.labels(route=scope["path"], method="GET", status=message["status"]) \
+                .observe(time.perf_counter() - started)
+        await send(message)
+
+    try:
+        if await handler(scope, receive, timed_send, query_args(scope)) is DELEGATE:
+            await wsgi_application(scope, receive, send)
+    except Exception as e:
+        log.error("Error serving %s: %s", scope["path"], e)
+        if "status" not in response:
+            await send_json(timed_send, {"error": str(e)}, 500)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(application, port=8095, log_level=config.LOG_LEVEL.lower())
@@ -0,0 +1,69 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BandwidthBudget:
+    """Token bucket of `rate` bytes per second shared by the transfers of this process.
+
+    Transfers whose bytes pass through the process (in-process yt-dlp
+    downloads, from their progress hooks, and direct streams) call
+    `reserve(nbytes)` and wait the seconds it returns, so together they
+    stay under the rate however many run, and one that finishes or stalls
+    leaves its share to the others. A yt-dlp child process cannot be slowed
+    from here: it gets `share()`, the budget split between the transfers
+    running when it starts, as --limit-rate. `begin`/`end` (or `transfer`)
+    count the running transfers. A rate of 0 disables the budget.
+    """
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._tokens = rate  # at most one second's worth of burst
+        self._updated = time.monotonic()
+        self.active = 0
+        self.throttled_seconds = 0.0
+
+    def reserve(self, nbytes):
+        """Take `nbytes` from the bucket; returns how long to wait before sending them"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate) - nbytes
+            self._updated = now
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.throttled_seconds += wait
+        return wait
+
+    def consume(self, nbytes):
+        """reserve() and sleep it off"""
+        wait = self.reserve(nbytes)
+        if wait:
+            time.sleep(wait)
+
+    def share(self):
+        """Fixed rate for a transfer that cannot be throttled as it goes"""
+        with self._lock:
+            return self.rate // max(self.active, 1)
+
+    def begin(self):
+        with self._lock:
+            self.active += 1
+
+    def end(self):
+        with self._lock:
+            self.active -= 1
+
+    @contextmanager
+    def transfer(self):
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.end()
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "active": self.active,
+                    "throttledSeconds": round(self.throttled_seconds, 1)}
@@ -0,0 +1,58 @@
+"""Compare per-request latency of the subprocess and in-process yt-dlp engines.
+
+Usage (from the backend directory):
+    python benchmarks/bench_engine.py <video_url> [--runs 5] [--yt-dlp yt-dlp]
+
+Each run performs one uncached metadata extraction, which is the work behind
+/api/video/info and /api/video/formats. The spawn-only row measures the fixed
+cost of starting a yt-dlp interpreter (`yt-dlp --version`) that the
+in-process engine no longer pays.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ytdlp_engine import InProcessEngine, SubprocessEngine  # noqa: E402
+
+
+def measure(label, fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} mean {statistics.mean(timings):8.1f} ms   "
+          f"median {statistics.median(timings):8.1f} ms   max {max(timings):8.1f} ms")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--yt-dlp", dest="executable", default="yt-dlp")
+    args = parser.parse_args()
+
+    subprocess_engine = SubprocessEngine(args.executable)
+
+    start = time.perf_counter()
+    inprocess_engine = InProcessEngine()
+    inprocess_engine.warm_up()
+    print(f"in-process engine warm-up (once per server): {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    measure("subprocess spawn only", lambda: subprocess.run(
+        [args.executable, "--version"], capture_output=True, check=True), args.runs)
+    sub = measure("subprocess extract_info", lambda: subprocess_engine.extract_info(args.url), args.runs)
+    inproc = measure("in-process extract_info", lambda: inprocess_engine.extract_info(args.url), args.runs)
+
+    saved = statistics.median(sub) - statistics.median(inproc)
+    print(f"\nmedian saving per extraction: {saved:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Micro-benchmark of yt-dlp progress parsing on recorded output.
+
+Usage (from the backend directory):
+    python benchmarks/bench_progress_parser.py [--repeat 200]
+
+Replays fixtures/ytdlp_legacy_progress.txt (console output of
+`yt-dlp --newline`) through the line loop execute_download used to run,
+and fixtures/ytdlp_template_progress.txt (the same download recorded with
+the --progress-template records) through ProgressParser. Both sides update
+a job dict under a lock like the server does; the legacy loop's debug
+prints go to os.devnull so terminal speed does not skew the result.
+"""
+import argparse
+import contextlib
+import os
+import re
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from progress_parser import ProgressParser  # noqa: E402
+
+FIXTURES = os.path.join(BACKEND_DIR, "benchmarks", "fixtures")
+
+
+class CountingLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self.acquisitions += 1
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def parse_size_to_bytes(size_str):
+    try:
+        size_str = size_str.strip()
+        if 'GiB' in size_str:
+            return int(float(size_str.replace('GiB', '')) * 1024 * 1024 * 1024)
+        elif 'MiB' in size_str:
+            return int(float(size_str.replace('MiB', '')) * 1024 * 1024)
+        elif 'KiB' in size_str:
+            return int(float(size_str.replace('KiB', '')) * 1024)
+        elif 'B' in size_str:
+            return int(float(size_str.replace('B', '')))
+        else:
+            return int(float(size_str))
+    except (ValueError, AttributeError):
+        return 0
+
+
+def legacy_loop(lines, job, lock):
+    """The per-line parsing execute_download ran before the template parser"""
+    for line in lines:
+        print(f"yt-dlp output: {line.strip()}")
+        if "[Merger] Merging formats into" in line:
+            m = re.search(r'\[Merger\] Merging formats into "([^"]+)"', line)
+            if m:
+                print(f"Final video file: {m.group(1)}")
+        elif "[ExtractAudio] Destination:" in line:
+            m = re.search(r'\[ExtractAudio\] Destination: (.+)', line)
+            if m:
+                print(f"Final audio file: {m.group(1).strip()}")
+        if "%" in line:
+            percent_match = re.search(r'(\d+\.?\d*)%', line)
+            if percent_match:
+                progress = float(percent_match.group(1))
+                print(f"Found progress: {progress}%")
+                with lock:
+                    job["progress"] = progress
+                    job["state"] = "downloading"
+                    speed_match = re.search(r'(\d+\.?\d*[KM]iB/s)', line)
+                    if speed_match:
+                        job["speed"] = speed_match.group(1)
+                        print(f"Found speed: {speed_match.group(1)}")
+                    eta_match = re.search(r'ETA (\d+:\d+)', line)
+                    if eta_match:
+                        job["eta"] = eta_match.group(1)
+                        print(f"Found ETA: {eta_match.group(1)}")
+        if "[download]" in line:
+            print(f"Found download line: {line.strip()}")
+            if "%" in line:
+                try:
+                    parts = line.split()
+                    for i, part in enumerate(parts):
+                        if "%" in part:
+                            progress = float(part.replace("%", ""))
+                            print(f"Parsed progress: {progress}%")
+                            with lock:
+                                job["progress"] = progress
+                                job["state"] = "downloading"
+                                if i + 1 < len(parts) and ("MiB/s" in parts[i + 1] or "KiB/s" in parts[i + 1]):
+                                    job["speed"] = parts[i + 1]
+                                if "ETA" in line:
+                                    job["eta"] = line[line.find("ETA"):].split()[1]
+                            break
+                except ValueError:
+                    pass
+            elif "of" in line and "at" in line:
+                try:
+                    parts = line.split()
+                    for i, part in enumerate(parts):
+                        if part == "of" and i > 0 and i + 1 < len(parts):
+                            total_bytes = parse_size_to_bytes(parts[i + 1])
+                            if total_bytes > 0:
+                                with lock:
+                                    job["progress"] = min(parse_size_to_bytes(parts[i - 1]) / total_bytes * 100, 99.9)
+                            break
+                except (ValueError, IndexError):
+                    pass
+
+
+def template_loop(lines, job, lock):
+    parser = ProgressParser()
+    for line in lines:
+        fields = parser.feed(line)
+        if fields is not None:
+            with lock:
+                job.update(fields)
+
+
+def run(label, loop, lines, repeat):
+    lock = CountingLock()
+    job = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            loop(lines, job, lock)
+        elapsed = time.perf_counter() - start
+    total = len(lines) * repeat
+    print(f"{label:<10} {total / elapsed:>12,.0f} lines/s   {elapsed / total * 1e6:6.2f} us/line   "
+          f"{lock.acquisitions / total:5.2f} lock acquisitions/line   final progress {job.get('progress')}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, "ytdlp_legacy_progress.txt"), encoding="utf-8") as f:
+        legacy_lines = f.readlines()
+    with open(os.path.join(FIXTURES, "ytdlp_template_progress.txt"), encoding="utf-8") as f:
+        template_lines = f.readlines()
+
+    legacy = run("legacy", legacy_loop, legacy_lines, args.repeat)
+    template = run("template", template_loop, template_lines, args.repeat)
+    print(f"\nspeed-up: {legacy / template:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
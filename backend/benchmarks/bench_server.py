@@ -0,0 +1,311 @@
+"""End-to-end load benchmark of the Flask backend, fully offline.
+
+Usage (from the backend directory):
+    python benchmarks/bench_server.py [--downloads 20] [--pollers 10] [--gallery-files 2000]
+                                      [--analyses 10] [--line-delay 0.001] [--json results.json]
+
+The app runs in this process on a threaded werkzeug server, in a scratch
+working directory, with every external dependency replaced:
+benchmarks/fake_ytdlp.py for yt-dlp (YTDLP_ENGINE=subprocess),
+benchmarks/fake_ffmpeg.py for ffmpeg and ffprobe, and the stub model
+(AI_BACKEND=stub). The downloads directory is seeded with --gallery-files
+files. Then:
+
+- --downloads clients each start a download of a different video, poll
+  its status until it is done, fetch the file and clean it up;
+- --pollers clients loop over /api/download/status and /api/gallery pages
+  until the downloads are finished;
+- --analyses clients request /api/video/info (stub model) and follow the
+  analysis until it completes.
+
+The report has requests per second, p50/p99/max latency per endpoint,
+end-to-end download time, the peak RSS of the server process and the
+largest peak RSS among its yt-dlp/ffmpeg children (VmHWM, sampled from
+/proc every 50 ms, so children that live shorter than that are missed). Fixture timings are deterministic, so two runs of
+the same commit differ only by scheduling noise.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+
+class Recorder:
+    """Latencies per endpoint, collected from every client thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, base_url, endpoint, path, method="GET", body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        except OSError:
+            payload, status = b"", None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if status is None or status >= 500:
+                self.errors[endpoint] += 1
+        if payload and path.startswith("/api/download?"):
+            return payload
+        try:
+            return json.loads(payload) if payload else None
+        except ValueError:
+            return None
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def seed_gallery(directory, count, size=4096):
+    rng = random.Random(0)
+    for i in range(count):
+        ext = ".mp3" if i % 4 == 0 else ".mp4"
+        path = os.path.join(directory, f"Seeded file {i:05d}{ext}")
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        # Spread the mtimes so the gallery order is meaningful
+        mtime = 1700000000 + rng.randrange(0, 10 ** 7)
+        os.utime(path, (mtime, mtime))
+
+
+def download_client(recorder, base_url, index, poll_interval, started_ids, done):
+    url = f"https://www.youtube.com/watch?v=bench{index:06d}"
+    start = time.perf_counter()
+    body = recorder.call(base_url, "POST /api/download", "/api/download", "POST", {"url": url, "format": "video"})
+    download_id = (body or {}).get("download_id")
+    if not download_id:
+        return None
+    started_ids.append(download_id)
+    state = None
+    while state not in ("done", "error"):
+        time.sleep(poll_interval)
+        status = recorder.call(base_url, "GET /api/download/status", f"/api/download/status?id={download_id}")
+        state = (status or {}).get("state")
+    elapsed = time.perf_counter() - start
+    if state == "done":
+        recorder.call(base_url, "GET /api/download", f"/api/download?download_id={download_id}")
+        recorder.call(base_url, "POST /api/download/cleanup", "/api/download/cleanup", "POST",
+                      {"download_id": download_id})
+    done.append((state, elapsed))
+    return state
+
+
+def poller(recorder, base_url, started_ids, finished, seed):
+    rng = random.Random(seed)
+    cursor = None
+    while not finished.is_set():
+        if started_ids:
+            download_id = rng.choice(started_ids)
+            recorder.call(base_url, "GET /api/download/status", f"/api/download/status?id={download_id}")
+        page = recorder.call(base_url, "GET /api/gallery",
+                             "/api/gallery?limit=50" + (f"&cursor={cursor}" if cursor else ""))
+        cursor = (page or {}).get("nextCursor")
+
+
+def analysis_client(recorder, base_url, index, poll_interval):
+    url = f"https://www.youtube.com/watch?v=bench{index:06d}"
+    body = recorder.call(base_url, "GET /api/video/info", f"/api/video/info?url={url}")
+    analysis_id = (body or {}).get("analysisId")
+    state = "done" if (body or {}).get("status") == "completed" else None
+    while analysis_id and state not in ("done", "error"):
+        time.sleep(poll_interval)
+        record = recorder.call(base_url, "GET /api/analysis/<id>", f"/api/analysis/{analysis_id}")
+        state = (record or {}).get("state")
+
+
+def vm_hwm_mib(pid):
+    """Peak RSS of a process in MiB, or None once it is gone"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def descendants(pid):
+    """PIDs of every live process below `pid`"""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as f:
+                # The command name in parentheses may contain spaces; the parent PID follows it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    found = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), ()):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def sample_children(peak, stop, interval=0.05):
+    """Keep the largest VmHWM seen among this process's descendants in peak["children"].
+
+    ru_maxrss for RUSAGE_CHILDREN would report the forked Python parent's
+    pre-exec high-water mark instead of the yt-dlp/ffmpeg processes'.
+    """
+    with open("/proc/self/cmdline", "rb") as f:
+        own_cmdline = f.read()
+    while not stop.wait(interval):
+        for pid in descendants(os.getpid()):
+            try:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    if f.read() == own_cmdline:
+                        continue  # forked but not yet exec'd: still a copy of this process
+            except OSError:
+                continue
+            hwm = vm_hwm_mib(pid)
+            if hwm is not None:
+                peak["children"] = max(peak.get("children", 0), hwm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--downloads", type=int, default=20)
+    parser.add_argument("--pollers", type=int, default=10)
+    parser.add_argument("--gallery-files", type=int, default=2000)
+    parser.add_argument("--analyses", type=int, default=10)
+    parser.add_argument("--line-delay", type=float, default=0.001,
+                        help="seconds per replayed yt-dlp progress line (about 1000 lines per stream)")
+    parser.add_argument("--extract-delay", type=float, default=0.2, help="seconds per fake metadata extraction")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024, help="bytes per fake stream file")
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.json_path:
+        args.json_path = os.path.abspath(args.json_path)
+    workdir = tempfile.mkdtemp(prefix="bench-server-")
+    os.makedirs(os.path.join(workdir, "downloads"))
+    seed_gallery(os.path.join(workdir, "downloads"), args.gallery_files)
+    os.chdir(workdir)
+    os.environ.update({
+        "YTDLP_ENGINE": "subprocess",
+        "YTDLP_BIN": os.path.join(BENCH_DIR, "fake_ytdlp.py"),
+        "FFMPEG_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "FFPROBE_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "AI_BACKEND": "stub",
+        "AI_STUB_DELAY": "0.05",
+        "JOB_STORE": "memory",
+        "RESUME_INTERRUPTED": "false",
+        "LOG_LEVEL": "WARNING",
+        "FAKE_YTDLP_LINE_DELAY": str(args.line_delay),
+        "FAKE_YTDLP_EXTRACT_DELAY": str(args.extract_delay),
+        "FAKE_YTDLP_FILE_SIZE": str(args.file_size),
+    })
+
+    from werkzeug.serving import make_server  # noqa: E402
+    import app as backend  # noqa: E402
+
+    # One INFO line per request would bury the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, backend.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    recorder = Recorder()
+    started_ids = []
+    done = []
+    finished = threading.Event()
+    peak = {}
+    threading.Thread(target=sample_children, args=(peak, finished), name="bench-sampler", daemon=True).start()
+    clients = args.downloads + args.pollers + args.analyses
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(clients, 1)) as pool:
+        pollers = [pool.submit(poller, recorder, base_url, started_ids, finished, seed)
+                   for seed in range(args.pollers)]
+        work = [pool.submit(download_client, recorder, base_url, i, args.poll_interval, started_ids, done)
+                for i in range(args.downloads)]
+        work += [pool.submit(analysis_client, recorder, base_url, i, args.poll_interval)
+                 for i in range(args.analyses)]
+        for future in work:
+            future.result()
+        finished.set()
+        for future in pollers:
+            future.result()
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    results = {
+        "config": vars(args),
+        "wallSeconds": round(wall, 3),
+        "requests": total_requests,
+        "requestsPerSecond": round(total_requests / wall, 1),
+        "downloads": {
+            "done": sum(1 for state, _ in done if state == "done"),
+            "error": sum(1 for state, _ in done if state != "done"),
+            "perMinute": round(len(done) / wall * 60, 1),
+            "p50Seconds": round(percentile([e for _, e in done], 0.5), 3) if done else None,
+            "p99Seconds": round(percentile([e for _, e in done], 0.99), 3) if done else None,
+        },
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "errors": recorder.errors.get(endpoint, 0),
+                "p50Ms": round(percentile(values, 0.5) * 1000, 2),
+                "p99Ms": round(percentile(values, 0.99) * 1000, 2),
+                "maxMs": round(max(values) * 1000, 2),
+            }
+            for endpoint, values in sorted(recorder.latencies.items())
+        },
+        "peakRssMiB": {
+            "server": round(vm_hwm_mib(os.getpid()), 1),
+            "largestChild": round(peak["children"], 1) if "children" in peak else None,
+        },
+    }
+
+    print(f"{total_requests} requests in {wall:.1f} s ({results['requestsPerSecond']} req/s), "
+          f"{results['downloads']['done']} downloads done, {results['downloads']['error']} failed, "
+          f"p50 {results['downloads']['p50Seconds']} s / p99 {results['downloads']['p99Seconds']} s end to end")
+    print(f"peak RSS: server {results['peakRssMiB']['server']} MiB, "
+          f"largest child {results['peakRssMiB']['largestChild']} MiB\n")
+    print(f"{'endpoint':<30} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for endpoint, row in results["endpoints"].items():
+        print(f"{endpoint:<30} {row['count']:>7} {row['errors']:>7} {row['p50Ms']:>9} {row['p99Ms']:>9} {row['maxMs']:>9}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Load test of the two serving modes: threaded Flask (WSGI) against asyncio (ASGI).
+
+Usage (from the backend directory):
+    python benchmarks/bench_serving.py [--mode both|wsgi|asgi] [--streams 1000] [--pollers 200]
+                                       [--info 200] [--duration 10] [--job-store memory|sqlite]
+                                       [--json results.json]
+
+Each mode gets a server in a child process, with the offline stand-ins of
+bench_server.py (fake yt-dlp and ffmpeg, stub model, --job-store jobs) in a
+scratch directory: `wsgi` is the app on a threaded werkzeug server,
+`asgi` is asgi:application on uvicorn. One asyncio client then
+
+- starts --downloads downloads that outlast the run,
+- opens --streams SSE connections to /api/download/events for them and
+  keeps them open until the end,
+- sends a burst of --info /api/video/info requests for uncached videos
+  (each one a yt-dlp extraction of --extract-delay seconds),
+- and runs --pollers keep-alive loops over /api/download/status for
+  --duration seconds while all of that is going on.
+
+The report has requests per second and p50/p99 latency per endpoint
+(time to the first event for SSE), failed requests, and the server's peak
+RSS (VmHWM) and peak thread count, sampled from /proc.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+
+def serve(mode, port):
+    """Child process: run the backend in one serving mode until killed"""
+    sys.path.insert(0, BACKEND_DIR)
+    if mode == "asgi":
+        import uvicorn
+        import asgi
+
+        uvicorn.run(asgi.application, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    else:
+        from werkzeug.serving import make_server
+        import app as backend
+
+        server = make_server("127.0.0.1", port, backend.create_app(), threaded=True)
+        server.socket.listen(4096)
+        server.serve_forever()
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 client connection, just enough for the backend's responses"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(payload)}\r\n"
+        if payload:
+            head += "Content-Type: application/json\r\n"
+        self.writer.write(head.encode() + b"\r\n" + payload)
+        status, headers = await self.read_head()
+        if "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    async def read_head(self):
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, started, ok):
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def proc_status(pid):
+    """(VmHWM in MiB, thread count) of a process, from /proc"""
+    fields = {}
+    with open(f"/proc/{pid}/status", encoding="ascii") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()
+    return int(fields["VmHWM"][0]) / 1024, int(fields["Threads"][0])
+
+
+async def call(recorder, connection, endpoint, method, path, body=None):
+    started = time.perf_counter()
+    try:
+        status, data = await connection.request(method, path, body)
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+        connection.close()
+        recorder.record(endpoint, started, False)
+        return None
+    recorder.record(endpoint, started, status < 500)
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+async def sse_client(recorder, port, path, opened, stop):
+    """Open an event stream, time its first event, then drain it until `stop`"""
+    started = time.perf_counter()
+    connection = Connection(port)
+    try:
+        connection.reader, connection.writer = await asyncio.open_connection("127.0.0.1", port)
+        connection.writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+        status, _ = await connection.read_head()
+        await connection.reader.readuntil(b"\n\n")
+        recorder.record("GET /api/download/events", started, status == 200)
+    except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError):
+        recorder.record("GET /api/download/events", started, False)
+        connection.close()
+        opened.append(False)
+        return
+    opened.append(True)
+    try:
+        while not stop.is_set() and await connection.reader.read(65536):
+            pass
+    except OSError:
+        pass
+    finally:
+        connection.close()
+
+
+async def poller(recorder, port, download_ids, stop, seed):
+    rng = random.Random(seed)
+    connection = Connection(port)
+    while not stop.is_set():
+        await call(recorder, connection, "GET /api/download/status", "GET",
+                   f"/api/download/status?id={rng.choice(download_ids)}")
+    connection.close()
+
+
+async def info_client(recorder, port, index):
+    connection = Connection(port)
+    await call(recorder, connection, "GET /api/video/info", "GET",
+               f"/api/video/info?url=https://www.youtube.com/watch?v=serve{index:06d}")
+    connection.close()
+
+
+async def sample(pid, peaks, stop):
+    while not stop.is_set():
+        try:
+            hwm, threads = proc_status(pid)
+        except OSError:
+            return
+        peaks["rssMiB"] = max(peaks.get("rssMiB", 0), hwm)
+        peaks["threads"] = max(peaks.get("threads", 0), threads)
+        await asyncio.sleep(0.2)
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        connection = Connection(port)
+        try:
+            status, _ = await connection.request("GET", "/api/stats")
+            if status == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            connection.close()
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def run_load(args, port, pid):
+    await wait_ready(port)
+    recorder = Recorder()
+    stop = asyncio.Event()
+    peaks = {}
+    sampler = asyncio.ensure_future(sample(pid, peaks, stop))
+
+    connection = Connection(port)
+    download_ids = []
+    for i in range(args.downloads):
+        body = await call(recorder, connection, "POST /api/download", "POST", "/api/download",
+                          {"url": f"https://www.youtube.com/watch?v=serve{i:06d}", "format": "video"})
+        if body and body.get("download_id"):
+            download_ids.append(body["download_id"])
+    connection.close()
+    if not download_ids:
+        raise RuntimeError("no download could be started")
+
+    opened = []
+    start = time.perf_counter()
+    streams = []
+    # Connect in batches so the listen backlog is not what is being measured
+    for batch in range(0, args.streams, 200):
+        streams += [asyncio.ensure_future(sse_client(
+            recorder, port, f"/api/download/events?id={download_ids[i % len(download_ids)]}", opened, stop))
+            for i in range(batch, min(batch + 200, args.streams))]
+        await asyncio.sleep(0.05)
+    info = [asyncio.ensure_future(info_client(recorder, port, args.downloads + i)) for i in range(args.info)]
+    pollers = [asyncio.ensure_future(poller(recorder, port, download_ids, stop, seed)) for seed in range(args.pollers)]
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*pollers, *info)
+    wall = time.perf_counter() - start
+    for task in streams:
+        task.cancel()
+    await asyncio.gather(*streams, sampler, return_exceptions=True)
+
+    try:
+        peaks["rssMiB"] = max(peaks.get("rssMiB", 0), proc_status(pid)[0])
+    except OSError:
+        pass
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "wallSeconds": round(wall, 2),
+        "requests": total,
+        "requestsPerSecond": round(total / wall, 1),
+        "streamsOpen": sum(opened),
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "errors": recorder.errors.get(endpoint, 0),
+                "p50Ms": round(percentile(values, 0.5) * 1000, 2),
+                "p99Ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+            for endpoint, values in sorted(recorder.latencies.items())
+        },
+        "server": {"peakRssMiB": round(peaks.get("rssMiB", 0), 1), "peakThreads": peaks.get("threads", 0)},
+    }
+
+
+def bench_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench-serving-{mode}-")
+    os.makedirs(os.path.join(workdir, "downloads"))
+    env = dict(os.environ, **{
+        "YTDLP_ENGINE": "subprocess",
+        "YTDLP_BIN": os.path.join(BENCH_DIR, "fake_ytdlp.py"),
+        "FFMPEG_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "FFPROBE_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "AI_BACKEND": "stub",
+        "AI_STUB_DELAY": "0.05",
+        "JOB_STORE": args.job_store,
+        "RESUME_INTERRUPTED": "false",
+        "LOG_LEVEL": "WARNING",
+        "SSE_MAX_RATE": "2",
+        # Downloads outlast the run so every stream stays open
+        "FAKE_YTDLP_LINE_DELAY": str(args.duration * 2 / 1000),
+        "FAKE_YTDLP_EXTRACT_DELAY": str(args.extract_delay),
+    })
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port)],
+                              cwd=workdir, env=env)
+    try:
+        return asyncio.run(run_load(args, port, server.pid))
+    finally:
+        server.kill()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("both", "wsgi", "asgi"), default="both")
+    parser.add_argument("--streams", type=int, default=1000, help="SSE connections held open")
+    parser.add_argument("--pollers", type=int, default=200, help="concurrent status polling loops")
+    parser.add_argument("--info", type=int, default=200, help="uncached /api/video/info requests")
+    parser.add_argument("--downloads", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of status polling")
+    parser.add_argument("--job-store", choices=("memory", "sqlite"), default="memory",
+                        help="sqlite shows the cost of blocking store queries in each mode")
+    parser.add_argument("--extract-delay", type=float, default=1.0, help="seconds per fake metadata extraction")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    parser.add_argument("--serve", choices=("wsgi", "asgi"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Thousands of sockets on both sides
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    results = {"config": vars(args), "modes": {}}
+    for mode in (("wsgi", "asgi") if args.mode == "both" else (args.mode,)):
+        result = results["modes"][mode] = bench_mode(mode, args)
+        print(f"{mode}: {result['requests']} requests in {result['wallSeconds']} s "
+              f"({result['requestsPerSecond']} req/s), {result['streamsOpen']}/{args.streams} streams open, "
+              f"peak RSS {result['server']['peakRssMiB']} MiB, peak threads {result['server']['peakThreads']}")
+        print(f"  {'endpoint':<28} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9}")
+        for endpoint, row in result["endpoints"].items():
+            print(f"  {endpoint:<28} {row['count']:>7} {row['errors']:>7} {row['p50Ms']:>9} {row['p99Ms']:>9}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Cold start benchmark of the backend: import time, app factory and first request.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py [--runs 5] [--engine auto|inprocess|subprocess]
+                                       [--top 15] [--json results.json]
+
+Every run is a fresh interpreter in a scratch working directory, with the
+offline stand-ins of bench_server.py (fake yt-dlp and ffmpeg, stub model,
+in-memory jobs). Each one measures
+
+- `import app` under `python -X importtime`, the modules' self times
+  summed per top-level package,
+- create_app(), which a pre-fork server runs once in its master,
+- init_services(), which every worker process runs once,
+- the first GET /api/stats and GET /api/gallery through the Flask test
+  client, and whether yt_dlp or google.generativeai got imported on the
+  way (neither should be until a request needs it).
+
+The report has the median of each phase over --runs and the packages
+taking the most import time.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# "import time:  self [us] | cumulative | imported package", nested imports indented
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+LAZY_MODULES = ("yt_dlp", "google.generativeai")
+
+
+def measure():
+    """Child process: time the phases of one cold start and print them as JSON"""
+    sys.path.insert(0, BACKEND_DIR)
+    start = time.perf_counter()
+    import app as backend
+    imported = time.perf_counter()
+    application = backend.create_app()
+    created = time.perf_counter()
+    backend.init_services()
+    initialized = time.perf_counter()
+    client = application.test_client()
+    statuses = [client.get("/api/stats").status_code, client.get("/api/gallery").status_code]
+    served = time.perf_counter()
+    print(json.dumps({
+        "importSeconds": imported - start,
+        "createAppSeconds": created - imported,
+        "initServicesSeconds": initialized - created,
+        "firstRequestsSeconds": served - initialized,
+        "statuses": statuses,
+        "lazyImported": [name for name in LAZY_MODULES if name in sys.modules],
+    }))
+
+
+def parse_importtime(stderr):
+    """(self microseconds per top-level package, cumulative microseconds of `import app`)"""
+    per_package = defaultdict(int)
+    total = None
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        per_package[module.split(".")[0]] += int(self_us)
+        if module == "app" and not indent:
+            total = int(cumulative_us)
+    return per_package, total
+
+
+def bench_env(engine):
+    return dict(os.environ, **{
+        "YTDLP_ENGINE": engine,
+        "YTDLP_BIN": os.path.join(BENCH_DIR, "fake_ytdlp.py"),
+        "FFMPEG_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "FFPROBE_BIN": os.path.join(BENCH_DIR, "fake_ffmpeg.py"),
+        "AI_BACKEND": "stub",
+        "JOB_STORE": "memory",
+        "RESUME_INTERRUPTED": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+
+
+def run_once(engine):
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = bench_env(engine)
+    importtime = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                                 f"import sys; sys.path.insert(0, {BACKEND_DIR!r}); import app"],
+                                cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    per_package, import_us = parse_importtime(importtime.stderr)
+
+    start = time.perf_counter()
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure"],
+                           cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    phases = json.loads(child.stdout.strip().splitlines()[-1])
+    phases["processSeconds"] = time.perf_counter() - start
+    phases["importtimeSeconds"] = import_us / 1e6 if import_us is not None else None
+    return phases, per_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--engine", default="auto", choices=("auto", "inprocess", "subprocess"))
+    parser.add_argument("--top", type=int, default=15, help="packages listed by import time")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+    if args.measure:
+        return measure()
+
+    runs = []
+    packages = defaultdict(list)
+    for _ in range(args.runs):
+        phases, per_package = run_once(args.engine)
+        runs.append(phases)
+        for package, self_us in per_package.items():
+            packages[package].append(self_us)
+
+    phase_names = ("importtimeSeconds", "importSeconds", "createAppSeconds", "initServicesSeconds",
+                   "firstRequestsSeconds", "processSeconds")
+    results = {
+        "config": {"runs": args.runs, "engine": args.engine},
+        "medianMs": {name: round(statistics.median(run[name] for run in runs) * 1000, 1)
+                     for name in phase_names if all(run[name] is not None for run in runs)},
+        "statuses": runs[-1]["statuses"],
+        "lazyImported": sorted({name for run in runs for name in run["lazyImported"]}),
+        "packagesMs": {package: round(statistics.median(values) / 1000, 1) for package, values in
+                       sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:args.top]},
+    }
+
+    print(f"median of {args.runs} cold starts (engine={args.engine}):")
+    for name, value in results["medianMs"].items():
+        print(f"  {name:<22} {value:>9.1f} ms")
+    print(f"first responses: {results['statuses']}; "
+          f"imported before needed: {', '.join(results['lazyImported']) or 'nothing'}\n")
+    print(f"{'package':<30} {'self ms':>9}")
+    for package, value in results["packagesMs"].items():
+        print(f"{package:<30} {value:>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
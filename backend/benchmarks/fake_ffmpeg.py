@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Offline stand-in for ffmpeg and ffprobe, for benchmarks.
+
+Set both FFMPEG_BIN and FFPROBE_BIN to this script. Probes (`-show_format`)
+print fixed JSON for a 300 second 1080p H.264/AAC file, `-encoders` lists
+no hardware encoders, and every other run copies its first input to the
+last argument (or stdout for `pipe:1`), which stands in for a remux.
+Network inputs (direct streams) are read as FAKE_YTDLP_FILE_SIZE zero bytes.
+"""
+import io
+import json
+import os
+import shutil
+import sys
+
+
+def main(args):
+    if "-show_format" in args:
+        print(json.dumps({
+            "format": {"duration": "300.0", "bit_rate": "4500000", "format_name": "mov,mp4,m4a,3gp,3g2,mj2"},
+            "streams": [
+                {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080},
+                {"codec_type": "audio", "codec_name": "aac"}
+            ]
+        }))
+        return 0
+    if "-encoders" in args:
+        print("Encoders:\n V..... libx264              libx264 H.264 / AVC / MPEG-4 AVC")
+        return 0
+
+    source = args[args.index("-i") + 1] if "-i" in args else None
+    target = args[-1]
+    if source is None or source == "pipe:0":
+        src = sys.stdin.buffer
+    elif source.startswith(("http://", "https://")):
+        src = io.BytesIO(b"\0" * int(os.environ.get("FAKE_YTDLP_FILE_SIZE", str(1024 * 1024))))
+    else:
+        src = open(source, "rb")
+    with src:
+        if target == "pipe:1":
+            shutil.copyfileobj(src, sys.stdout.buffer)
+        else:
+            with open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Offline stand-in for the yt-dlp CLI, for benchmarks.
+
+Point the backend at it with YTDLP_ENGINE=subprocess and
+YTDLP_BIN=benchmarks/fake_ytdlp.py. It understands the arguments
+SubprocessEngine and the direct-stream pipeline pass:
+
+    --dump-json URL              fixtures/ytdlp_info.json with the video ID and title of URL
+    --flat-playlist --dump-single-json URL
+                                 a playlist of FAKE_YTDLP_PLAYLIST_SIZE entries
+    --list-formats URL           the fixture's formats as a table
+    -o TEMPLATE -f SPEC ...      replays fixtures/ytdlp_template_progress.txt per
+                                 stream and writes FAKE_YTDLP_FILE_SIZE bytes per file
+    -o - ...                     writes FAKE_YTDLP_FILE_SIZE bytes to stdout
+
+Timing comes from the environment so runs are reproducible:
+FAKE_YTDLP_EXTRACT_DELAY (seconds per extraction, default 0.2),
+FAKE_YTDLP_LINE_DELAY (seconds per progress line, default 0.001, about
+one second per stream) and FAKE_YTDLP_FAIL_RATE (share of downloads that
+fail, decided per URL so reruns fail the same ones).
+"""
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def option(args, *names, default=None):
+    for name in names:
+        if name in args:
+            index = args.index(name)
+            if index + 1 < len(args):
+                return args[index + 1]
+    return default
+
+
+def video_id(url):
+    parsed = urlparse(url)
+    ids = parse_qs(parsed.query).get("v")
+    if ids:
+        return ids[0]
+    return parsed.path.rstrip("/").rsplit("/", 1)[-1] or "bench000000"
+
+
+def load_info(url):
+    with open(os.path.join(FIXTURES, "ytdlp_info.json"), encoding="utf-8") as f:
+        info = json.load(f)
+    info["id"] = video_id(url)
+    info["title"] = f"{info['title']} {info['id']}"
+    info["webpage_url"] = url
+    return info
+
+
+def render(template, info, fmt, ext):
+    values = {"title": info.get("title"), "id": info.get("id"), "format_id": fmt.get("format_id"), "ext": ext}
+    for key, value in values.items():
+        template = template.replace(f"%({key})s", str(value))
+    return template
+
+
+def write_bytes(out, size):
+    chunk = b"\0" * 65536
+    while size > 0:
+        out.write(chunk[:size])
+        size -= len(chunk)
+
+
+def replay_progress(delay):
+    """Progress records of the recorded download; the file and post-processing lines are our own"""
+    with open(os.path.join(FIXTURES, "ytdlp_template_progress.txt"), encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("__P__ "):
+                sys.stdout.write(line)
+                sys.stdout.flush()
+                if delay:
+                    time.sleep(delay)
+
+
+def download(args):
+    url = args[-1]
+    info_json = option(args, "--load-info-json")
+    if info_json:
+        with open(info_json, encoding="utf-8") as f:
+            info = json.load(f)
+        url = info.get("webpage_url") or url
+    else:
+        time.sleep(env_float("FAKE_YTDLP_EXTRACT_DELAY", 0.2))
+        info = load_info(url)
+
+    size = int(os.environ.get("FAKE_YTDLP_FILE_SIZE", str(1024 * 1024)))
+    output = option(args, "-o")
+    if output == "-":
+        write_bytes(sys.stdout.buffer, size)
+        return 0
+
+    fail_rate = env_float("FAKE_YTDLP_FAIL_RATE", 0)
+    if fail_rate and random.Random(url).random() < fail_rate:
+        print("ERROR: [youtube] fake failure requested by FAKE_YTDLP_FAIL_RATE")
+        return 1
+
+    formats = {fmt["format_id"]: fmt for fmt in info.get("formats", [])}
+    spec = option(args, "-f", default="best")
+    delay = env_float("FAKE_YTDLP_LINE_DELAY", 0.001)
+    audio_format = option(args, "--audio-format") if "-x" in args else None
+    merge_format = option(args, "--merge-output-format")
+
+    # "137,140" writes one file per stream; "137+140" and selectors write one merged file
+    if "," in spec:
+        streams = [formats.get(format_id, {"format_id": format_id, "ext": "mp4"}) for format_id in spec.split(",")]
+    else:
+        streams = [formats.get(spec, {"format_id": spec, "ext": merge_format or "mp4"})]
+    for fmt in streams:
+        ext = audio_format or (merge_format if "," not in spec and merge_format else fmt.get("ext", "mp4"))
+        path = render(output, info, fmt, ext)
+        replay_progress(delay)
+        if audio_format:
+            print("__PP__ started ExtractAudio")
+        elif merge_format and "+" in spec:
+            print("__PP__ started Merger")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            write_bytes(f, size)
+        print(f"__F__{path}")
+        sys.stdout.flush()
+    return 0
+
+
+def main(args):
+    if "--version" in args:
+        print("2099.01.01 (fake)")
+        return 0
+    url = args[-1] if args else ""
+    if "--flat-playlist" in args:
+        time.sleep(env_float("FAKE_YTDLP_EXTRACT_DELAY", 0.2))
+        count = int(option(args, "--playlist-end") or os.environ.get("FAKE_YTDLP_PLAYLIST_SIZE", "10"))
+        entries = [{"id": f"bench{i:06d}", "url": f"https://www.youtube.com/watch?v=bench{i:06d}",
+                    "title": f"Benchmark video bench{i:06d}", "ie_key": "Youtube"} for i in range(count)]
+        print(json.dumps({"_type": "playlist", "title": "Benchmark playlist", "entries": entries}))
+        return 0
+    if "--dump-json" in args:
+        time.sleep(env_float("FAKE_YTDLP_EXTRACT_DELAY", 0.2))
+        print(json.dumps(load_info(url)))
+        return 0
+    if "--list-formats" in args:
+        time.sleep(env_float("FAKE_YTDLP_EXTRACT_DELAY", 0.2))
+        print("ID  EXT   RESOLUTION │ VCODEC        ACODEC")
+        for fmt in load_info(url)["formats"]:
+            resolution = f"{fmt.get('width')}x{fmt['height']}" if fmt.get("height") else "audio only"
+            print(f"{fmt['format_id']:<3} {fmt['ext']:<5} {resolution:<10} │ {fmt['vcodec']:<13} {fmt['acodec']}")
+        return 0
+    return download(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,289 @@
+import threading
+import time
+import uuid
+
+from progress_parser import format_eta, format_speed, parse_speed
+from scheduler import QueueFull
+from storage import StorageFull
+from logs import get_logger
+
+log = get_logger(__name__)
+
+FINISHED = ("done", "error")
+
+
+class BulkDownloads:
+    """Playlist and channel downloads as a parent job with one child job per video.
+
+    `create` lists the playlist in the background (`list_entries(url,
+    limit)`), then starts children through `start_child(url, format,
+    quality, client)`, the same path as a single download, so children
+    share the artifact cache, single-flight and resumable work directories.
+    At most `window` children of a parent are queued or running at a time,
+    submitted as the scheduler client that asked for the playlist, so a
+    long playlist takes turns with other clients and counts against its
+    requester's queue limit like single downloads do. A failed child
+    is retried on its own up to `item_retries` times, and a finished one is
+    handed to `collect(download_id)`, which moves its file into the
+    downloads directory and returns the file name. When the disk is full
+    the parent is "paused" until one of its running children finishes
+    and frees or settles space; with none running, the remaining items
+    fail and can be queued again with `retry_failed`.
+
+    The parent job lives in the job store like any download (kind "bulk")
+    and lists its items; `aggregate(job)` adds progress, combined speed and
+    ETA computed from the children. `child_updated` must be called for
+    every child update so parents are notified and advanced.
+    """
+
+    def __init__(self, job_store, list_entries, start_child, collect, publish, window=4, item_retries=2,
+                 max_items=500, retry_delay=5.0):
+        self.job_store = job_store
+        self.list_entries = list_entries
+        self.start_child = start_child
+        self.collect = collect
+        self.publish = publish
+        self.window = window
+        self.item_retries = item_retries
+        self.max_items = max_items
+        self.retry_delay = retry_delay
+        self._lock = threading.RLock()
+        self._bulks = {}  # parent ID -> {"items", "format", "quality", "client"}
+        self._children = {}  # child download ID -> set of parent IDs
+
+    def create(self, url, format_type, quality, client, limit=None):
+        parent_id = uuid.uuid4().hex
+        limit = min(limit or self.max_items, self.max_items)
+        self.job_store.create(parent_id, {
+            "kind": "bulk",
+            "state": "expanding",
+            "url": url,
+            "format": format_type,
+            "quality": quality,
+            "title": None,
+            "items": [],
+            "itemsTotal": 0,
+            "itemsDone": 0,
+            "itemsFailed": 0,
+            "startedAt": time.time(),
+            "progress": 0,
+            "filePath": None,
+            "tempFilePath": None,
+            "jobDir": None,
+            "error_message": None,
+            "speed": None,
+            "eta": None,
+            "queuePosition": None,
+            "cacheKey": None,
+            "cached": False,
+            "subscribers": 1
+        })
+        threading.Thread(target=self._expand, args=(parent_id, url, format_type, quality, client, limit),
+                         name="bulk-expand", daemon=True).start()
+        return parent_id
+
+    def _expand(self, parent_id, url, format_type, quality, client, limit):
+        try:
+            listing = self.list_entries(url, limit)
+        except Exception as e:
+            self._set(parent_id, {"state": "error", "error_message": f"Failed to list playlist: {e}"})
+            return
+        entries = listing["entries"][:limit]
+        if not entries:
+            self._set(parent_id, {"state": "error", "error_message": "The playlist has no videos"})
+            return
+
+        items = [{"videoId": entry["id"], "url": entry["url"], "title": entry["title"], "downloadId": None,
+                  "state": "waiting", "attempts": 0, "retryAt": 0, "error": None, "file": None} for entry in entries]
+        with self._lock:
+            self._bulks[parent_id] = {"items": items, "format": format_type, "quality": quality,
+                                      "client": client}
+        self._set(parent_id, {"state": "downloading", "title": listing.get("title"), "itemsTotal": len(items)})
+        self._fill(parent_id)
+
+    def _fill(self, parent_id):
+        """Start waiting items until the parent has `window` children in flight"""
+        with self._lock:
+            bulk = self._bulks.get(parent_id)
+            if bulk is None:
+                return
+            bulk.pop("paused", None)
+            now = time.time()
+            active = sum(1 for item in bulk["items"] if item["state"] == "active")
+            due = [item for item in bulk["items"] if item["state"] == "waiting" and item["retryAt"] <= now]
+            starting = due[:max(self.window - active, 0)]
+            for item in starting:
+                item["state"] = "active"
+                item["attempts"] += 1
+            later = [item["retryAt"] for item in bulk["items"] if item["state"] == "waiting" and item["retryAt"] > now]
+
+        finished = []
+        for position, item in enumerate(starting):
+            try:
+                body = self.start_child(item["url"], bulk["format"], bulk["quality"], bulk["client"])
+            except QueueFull:
+                # The server queue is full; put the rest back and try again shortly
+                with self._lock:
+                    for waiting in starting[position:]:
+                        waiting["state"] = "waiting"
+                        waiting["attempts"] -= 1
+                        waiting["retryAt"] = time.time() + self.retry_delay
+                later.append(time.time() + self.retry_delay)
+                break
+            except StorageFull as e:
+                # Space only comes back as downloads finish: wait for a running child, else give up
+                with self._lock:
+                    for waiting in starting[position:]:
+                        waiting["state"] = "waiting"
+                        waiting["attempts"] -= 1
+                        waiting["retryAt"] = 0
+                    if any(other["state"] == "active" for other in bulk["items"]):
+                        bulk["paused"] = str(e)
+                    else:
+                        for waiting in bulk["items"]:
+                            if waiting["state"] == "waiting":
+                                waiting["state"] = "error"
+                                waiting["error"] = str(e)
+                later = []
+                log.warning("Playlist download stalled: %s", e, extra={"downloadId": parent_id})
+                break
+            except Exception as e:
+                with self._lock:
+                    item["state"] = "error"
+                    item["error"] = str(e)
+                continue
+
+            child_id = body["download_id"]
+            with self._lock:
+                item["downloadId"] = child_id
+                self._children.setdefault(child_id, set()).add(parent_id)
+            # Cached and attached children may already be finished
+            child = self.job_store.get(child_id)
+            if child is not None and child["state"] in FINISHED:
+                finished.append((child_id, child["state"], child.get("error_message")))
+
+        self._sync(parent_id)
+        for child_id, state, message in finished:
+            self._child_finished(child_id, state, message)
+        if later and not finished:
+            timer = threading.Timer(max(min(later) - time.time(), 0.1), self._fill, args=(parent_id,))
+            timer.daemon = True
+            timer.start()
+
+    def child_updated(self, download_id, fields):
+        """Hook for every child job update: notify parents, advance them when the child finishes"""
+        parents = self._children.get(download_id)
+        if not parents:
+            return
+        for parent_id in list(parents):
+            self.publish(parent_id)
+        if fields.get("state") in FINISHED:
+            self._child_finished(download_id, fields["state"], fields.get("error_message"))
+
+    def _child_finished(self, child_id, state, message):
+        with self._lock:
+            parent_ids = self._children.pop(child_id, set())
+        if not parent_ids:
+            return
+
+        file_name = None
+        if state == "done":
+            # Every parent holds one subscription to the child; the last release moves the file
+            job = self.job_store.get(child_id)
+            file_name = job.get("sanitizedFilename") if job else None
+            for _ in parent_ids:
+                try:
+                    self.collect(child_id)
+                except Exception as e:
+                    log.error("Failed to collect playlist item: %s", e, extra={"downloadId": child_id})
+
+        with self._lock:
+            for parent_id in parent_ids:
+                bulk = self._bulks.get(parent_id)
+                if bulk is None:
+                    continue
+                for item in bulk["items"]:
+                    if item["downloadId"] != child_id or item["state"] != "active":
+                        continue
+                    if state == "done":
+                        item["state"] = "done"
+                        item["error"] = None
+                        item["file"] = file_name
+                    elif item["attempts"] <= self.item_retries:
+                        item["state"] = "waiting"
+                        item["error"] = message
+                        item["retryAt"] = time.time() + self.retry_delay * item["attempts"]
+                        log.info("Retrying playlist item after error: %s", message,
+                                 extra={"downloadId": child_id, "url": item["url"]})
+                    else:
+                        item["state"] = "error"
+                        item["error"] = message
+        for parent_id in parent_ids:
+            self._fill(parent_id)
+
+    def retry_failed(self, parent_id, client):
+        """Queue the failed items of a parent again as `client`; returns how many, or None if unknown"""
+        job = self.job_store.get(parent_id)
+        if job is None or job.get("kind") != "bulk":
+            return None
+        with self._lock:
+            bulk = self._bulks.get(parent_id)
+            if bulk is None:
+                if job["state"] == "expanding":
+                    return 0
+                bulk = self._bulks[parent_id] = {"items": [dict(item) for item in job["items"]],
+                                                 "format": job["format"], "quality": job["quality"],
+                                                 "client": client}
+            failed = [item for item in bulk["items"] if item["state"] == "error"]
+            for item in failed:
+                item.update(state="waiting", attempts=0, retryAt=0)
+        if failed:
+            self._set(parent_id, {"state": "downloading", "error_message": None})
+            self._fill(parent_id)
+        return len(failed)
+
+    def _sync(self, parent_id):
+        """Copy the item list and counts to the parent job; finish it when every item is"""
+        with self._lock:
+            bulk = self._bulks.get(parent_id)
+            if bulk is None:
+                return
+            items = [dict(item) for item in bulk["items"]]
+            done = sum(1 for item in items if item["state"] == "done")
+            failed = sum(1 for item in items if item["state"] == "error")
+            fields = {"items": items, "itemsDone": done, "itemsFailed": failed,
+                      "state": "paused" if bulk.get("paused") else "downloading",
+                      "error_message": bulk.get("paused")}
+            if done + failed == len(items):
+                del self._bulks[parent_id]
+                fields.update(state="done" if done else "error", progress=100, speed=None, eta=None,
+                              error_message=f"{failed} of {len(items)} videos failed" if failed else None)
+        self._set(parent_id, fields)
+
+    def _set(self, parent_id, fields):
+        if self.job_store.update(parent_id, fields):
+            self.publish(parent_id)
+
+    def aggregate(self, job):
+        """Progress, combined speed and ETA of a parent job from its children"""
+        if job["state"] in FINISHED or not job["items"]:
+            return {}
+        progress = 0.0
+        speed = 0.0
+        for item in job["items"]:
+            if item["state"] in FINISHED:
+                progress += 100
+            elif item["state"] == "active" and item["downloadId"]:
+                child = self.job_store.get(item["downloadId"])
+                if child is not None:
+                    progress += child.get("progress") or 0
+                    speed += parse_speed(child.get("speed")) or 0
+        fraction = progress / (100 * len(job["items"]))
+        elapsed = time.time() - job["startedAt"]
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return {"progress": round(fraction * 100, 1), "speed": format_speed(speed), "eta": format_eta(eta),
+                "itemsActive": sum(1 for item in job["items"] if item["state"] == "active")}
+
+    def stats(self):
+        with self._lock:
+            return {"running": len(self._bulks), "children": len(self._children)}
@@ -0,0 +1,229 @@
+"""Direct-stream downloads: media piped to the HTTP client while it is fetched.
+
+ffmpeg reads the selected formats straight from their stream URLs (taken
+from the cached extraction) and writes fragmented MP4, or MP3 for audio,
+to stdout, so the first bytes go out after a probe instead of after the
+download and the merge. Without usable stream URLs, `yt-dlp -o -` feeds
+ffmpeg through a pipe instead. Nothing is written to disk unless the
+stream is also being cached, in which case it is copied into a file as it
+passes through.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from formats import FormatIndex, quality_max_height
+from ytdlp_engine import USER_AGENT
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Fragmented MP4 can be written to a pipe and played while it arrives
+FRAGMENTED_MP4 = ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"]
+
+
+def _headers(fmt):
+    headers = dict(fmt.get("http_headers") or {})
+    headers.setdefault("User-Agent", USER_AGENT)
+    return "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+
+
+def stream_inputs(info, format_spec):
+    """Format dicts for a spec like '137+140' with direct URLs, or None if any is missing"""
+    if not info or not format_spec:
+        return None
+    formats = {fmt.get("format_id"): fmt for fmt in info.get("formats") or []}
+    selected = [formats.get(format_id) for format_id in format_spec.split("+")]
+    if not all(fmt and fmt.get("url") for fmt in selected):
+        return None
+    return selected
+
+
+def ffmpeg_command(ffmpeg, inputs, format_type, audio_quality="0"):
+    """ffmpeg arguments writing the stream to stdout; `inputs` are format dicts, or None for stdin"""
+    cmd = [ffmpeg, "-v", "error", "-nostdin"]
+    if inputs is None:
+        cmd.extend(["-i", "pipe:0"])
+    else:
+        for fmt in inputs:
+            cmd.extend(["-headers", _headers(fmt), "-i", fmt["url"]])
+    if format_type == "audio":
+        cmd.extend(["-vn", "-c:a", "libmp3lame", "-q:a", audio_quality, "-f", "mp3"])
+    else:
+        if inputs is not None and len(inputs) > 1:
+            cmd.extend(["-map", "0:v:0", "-map", "1:a:0"])
+        # Stream copy: the container changes, the audio and video are not re-encoded
+        cmd.extend(["-c", "copy"] + FRAGMENTED_MP4)
+    cmd.append("pipe:1")
+    return cmd
+
+
+class MediaStream:
+    """Iterable of output chunks from a running pipeline, for use as a WSGI response body.
+
+    The pipe between ffmpeg and this process is the only buffer: while the
+    client is not reading, ffmpeg blocks on a full pipe and stops fetching.
+    `close()` (called by the WSGI server when the response ends or the
+    client disconnects) stops the processes. With `tee_path`, chunks are
+    also written to that file, which is handed to `on_complete(path)` if the
+    stream ended cleanly and deleted otherwise. `throttle(nbytes)`, if
+    given, is called for every chunk before it is sent and may block.
+    """
+
+    def __init__(self, commands, chunk_size=64 * 1024, tee_path=None, on_complete=None, on_close=None,
+                 throttle=None):
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        self.tee_path = tee_path
+        self.on_complete = on_complete
+        self.on_close = on_close
+        self.bytes_sent = 0
+        self._errors = tempfile.TemporaryFile()
+        self._processes = []
+        self._closed = False
+        self._tee = None
+        stdin = None
+        try:
+            for cmd in commands:
+                process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=self._errors)
+                if stdin is not None:
+                    # Only the next process reads the previous one's output
+                    stdin.close()
+                stdin = process.stdout
+                self._processes.append(process)
+            if tee_path:
+                self._tee = open(tee_path, "wb")
+        except Exception:
+            # The caller still owns whatever on_close would release
+            self.on_close = None
+            self.close()
+            raise
+
+    def __iter__(self):
+        output = self._processes[-1].stdout
+        while True:
+            chunk = output.read1(self.chunk_size)
+            if not chunk:
+                break
+            if self._tee is not None:
+                self._tee.write(chunk)
+            if self.throttle is not None:
+                self.throttle(len(chunk))
+            self.bytes_sent += len(chunk)
+            yield chunk
+        for process in self._processes:
+            process.wait()
+        failed = [process for process in self._processes if process.returncode != 0]
+        if failed:
+            self._errors.seek(0)
+            detail = self._errors.read().decode("utf-8", "replace").strip().splitlines()
+            log.warning("Direct stream failed: %s", detail[-1] if detail else f"exit code {failed[0].returncode}")
+        elif self._tee is not None:
+            self._tee.close()
+            self._tee = None
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(self.tee_path)
+                    self.tee_path = None
+                except Exception as e:
+                    log.error("Failed to keep streamed file: %s", e)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for process in self._processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            if process.stdout is not None:
+                process.stdout.close()
+        self._errors.close()
+        if self._tee is not None:
+            self._tee.close()
+        if self.tee_path:
+            shutil.rmtree(os.path.dirname(self.tee_path), ignore_errors=True)
+        if self.on_close is not None:
+            self.on_close(self)
+
+
+class DirectStreamer:
+    """Builds direct-stream pipelines and limits how many run at once.
+
+    With a `budget` (bandwidth.BandwidthBudget), open streams count as
+    transfers and their chunks are paced by it, along with the downloads.
+    """
+
+    def __init__(self, ffmpeg="ffmpeg", ytdlp="yt-dlp", max_streams=8, chunk_size=64 * 1024, budget=None):
+        self.ffmpeg = ffmpeg
+        self.ytdlp = ytdlp
+        self.chunk_size = chunk_size
+        self.budget = budget
+        self._slots = threading.BoundedSemaphore(max_streams)
+        self._lock = threading.Lock()
+        self.max_streams = max_streams
+        self.active = 0
+        self.served = 0
+        self.bytes_sent = 0
+        self.rejected = 0
+
+    def commands(self, url, info, format_type, quality, audio_quality="0"):
+        """The process pipeline for a request: ffmpeg alone, or yt-dlp piped into ffmpeg"""
+        format_spec = None
+        if info is not None:
+            format_spec = FormatIndex.from_info(info).select(format_type, quality)
+        inputs = stream_inputs(info, format_spec)
+        if inputs is not None:
+            return [ffmpeg_command(self.ffmpeg, inputs, format_type, audio_quality)]
+
+        # yt-dlp cannot merge into a pipe, so ask it for a single format
+        if format_type == "audio":
+            selector = "bestaudio/best"
+        else:
+            max_height = quality_max_height(quality)
+            selector = f"best[height<={max_height}]/best" if max_height else "best"
+        ytdlp = [self.ytdlp, "-q", "--no-progress", "--no-playlist", "--user-agent", USER_AGENT,
+                 "-f", selector, "-o", "-", url]
+        return [ytdlp, ffmpeg_command(self.ffmpeg, None, format_type, audio_quality)]
+
+    def open(self, commands, tee_path=None, on_complete=None):
+        """Start a pipeline; returns a MediaStream, or None when every slot is taken"""
+        if not self.acquire():
+            return None
+        try:
+            return MediaStream(commands, self.chunk_size, tee_path, on_complete,
+                               on_close=lambda stream: self.release(stream.bytes_sent),
+                               throttle=self.budget.consume if self.budget is not None else None)
+        except Exception:
+            self.release()
+            raise
+
+    def acquire(self):
+        """Take a stream slot without waiting; False (counted as rejected) when every slot is taken"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+        if self.budget is not None:
+            self.budget.begin()
+        return True
+
+    def release(self, bytes_sent=None):
+        """Give back a slot from acquire(); `bytes_sent` is None when no stream was served"""
+        with self._lock:
+            self.active -= 1
+            if bytes_sent is not None:
+                self.served += 1
+                self.bytes_sent += bytes_sent
+        if self.budget is not None:
+            self.budget.end()
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"active": self.active, "maxStreams": self.max_streams, "served": self.served,
+                    "bytesSent": self.bytes_sent, "rejected": self.rejected}
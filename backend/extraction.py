@@ -0,0 +1,223 @@
+"""Policy around yt-dlp metadata extraction: hedging, negative caching and a circuit breaker.
+
+BaseEngine.extract_info tries the browser user agent and then yt-dlp's
+default one in turn, so a blocked or dead URL can take 45 + 30 seconds, and
+every request for it starts over. ExtractionPolicy, the fetcher behind the
+metadata cache,
+
+- starts the fallback strategy as a hedged request once the first has run
+  `hedge_after` seconds, or at once when the first fails, and returns
+  whichever succeeds first;
+- remembers permanent failures (private, removed or unsupported videos,
+  see ytdlp_engine.is_permanent_error) for `negative_ttl` seconds and
+  answers them without running yt-dlp;
+- counts the other failures (timeouts, network errors, blocks) in a
+  CircuitBreaker, which refuses extractions for a while when most of the
+  recent ones failed, instead of queueing requests behind timeouts that
+  are all going to expire.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metadata_cache import canonical_video_id, normalize_url
+from ytdlp_engine import EXTRACT_STRATEGIES, ExtractionError, is_permanent_error
+from logs import get_logger
+
+log = get_logger(__name__)
+
+
+class CircuitOpen(ExtractionError):
+    """Raised without trying yt-dlp while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__("Video metadata extraction is failing upstream; try again later")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens when `failure_ratio` of the outcomes in the last `window` seconds were failures.
+
+    At least `min_calls` outcomes are needed to judge. Once open, calls are
+    refused for `cooldown` seconds; then a single trial call is let through
+    (half-open), whose success closes the breaker and whose failure opens it
+    for another cooldown.
+    """
+
+    def __init__(self, failure_ratio=0.5, min_calls=10, window=60, cooldown=30):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (monotonic time, ok)
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.cooldown or self._trial else "half-open"
+
+    def allow(self):
+        """Whether a call may go ahead; raises CircuitOpen otherwise"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == "closed":
+                return True
+            if state == "half-open":
+                self._trial = True
+                return True
+            self.rejected += 1
+            retry_after = max(1, int(self._opened_at + self.cooldown - now))
+        raise CircuitOpen(retry_after)
+
+    def record(self, ok):
+        with self._lock:
+            now = time.monotonic()
+            if self._opened_at is not None:
+                if not self._trial:
+                    # A call admitted before the breaker opened
+                    return
+                self._trial = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                    self._failures = 0
+                    log.info("Extraction circuit closed")
+                else:
+                    self._opened_at = now
+                return
+
+            self._outcomes.append((now, ok))
+            self._failures += not ok
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                _, old_ok = self._outcomes.popleft()
+                self._failures -= not old_ok
+            if len(self._outcomes) >= self.min_calls and self._failures >= self.failure_ratio * len(self._outcomes):
+                self._opened_at = now
+                self.opened += 1
+                log.warning("Extraction circuit opened",
+                            extra={"failures": self._failures, "calls": len(self._outcomes)})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "recentCalls": len(self._outcomes),
+                "recentFailures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class ExtractionPolicy:
+    """Hedged, negatively cached and circuit-broken `engine.extract_with` calls.
+
+    `extract_info(url)` is a drop-in for `engine.extract_info`. Attempts run
+    on a pool of `workers` threads; a hedged attempt that loses is left to
+    finish (or time out) there, since neither engine can abandon one
+    midway. `check` and `record` apply the cache and the breaker to
+    extractions made elsewhere (the asyncio server's AsyncExtractor).
+    """
+
+    def __init__(self, engine, hedge_after=8.0, negative_ttl=600, negative_max_entries=1024,
+                 breaker=None, workers=16):
+        self.engine = engine
+        self.hedge_after = hedge_after
+        self.negative_ttl = negative_ttl
+        self.negative_max_entries = negative_max_entries
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        self._lock = threading.Lock()
+        self._failures = OrderedDict()  # canonical video ID -> (expires_at, message)
+        self.negative_hits = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def extract_info(self, url):
+        url = normalize_url(url)
+        self.check(url)
+        try:
+            info = self._hedged(url)
+        except Exception as e:
+            self.record(url, e)
+            raise
+        self.record(url)
+        return info
+
+    def check(self, url):
+        """Raise the remembered error of a permanently failed video, or CircuitOpen"""
+        key = canonical_video_id(url)
+        with self._lock:
+            entry = self._failures.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.negative_hits += 1
+                    raise ExtractionError(entry[1])
+                del self._failures[key]
+        self.breaker.allow()
+
+    def record(self, url, error=None):
+        """Feed an extraction's outcome to the breaker and the negative cache"""
+        if error is None or not is_permanent_error(error):
+            self.breaker.record(error is None)
+            return
+        # yt-dlp answered, just not with a video: upstream is healthy
+        self.breaker.record(True)
+        if self.negative_ttl <= 0:
+            return
+        key = canonical_video_id(url)
+        with self._lock:
+            self._failures[key] = (time.monotonic() + self.negative_ttl, str(error))
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.negative_max_entries:
+                self._failures.popitem(last=False)
+
+    def _hedged(self, url):
+        (user_agent, timeout), (fallback_agent, fallback_timeout) = EXTRACT_STRATEGIES
+        primary = self._pool.submit(self.engine.extract_with, url, user_agent, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done and (primary.exception() is None or is_permanent_error(primary.exception())):
+            return primary.result()
+        with self._lock:
+            self.hedged += not done
+        fallback = self._pool.submit(self.engine.extract_with, url, fallback_agent, fallback_timeout)
+
+        pending = {primary, fallback}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is fallback and not primary.done():
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                # The browser user agent's error is the more telling one
+                if error is None or future is primary:
+                    error = future.exception()
+        raise error
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = {
+                "hedgeAfter": self.hedge_after,
+                "hedged": self.hedged,
+                "hedgeWins": self.hedge_wins,
+                "negativeEntries": sum(1 for expires_at, _ in self._failures.values() if expires_at > now),
+                "negativeHits": self.negative_hits
+            }
+        stats["breaker"] = self.breaker.stats()
+        return stats
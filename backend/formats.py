@@ -0,0 +1,223 @@
+from collections import defaultdict
+
+# Quality labels and their nominal heights, highest first. A height gets the
+# first label whose nominal height it reaches; anything lower is '240p'.
+QUALITY_LEVELS = [
+    ("4k", 2160),
+    ("1440p", 1440),
+    ("1080p", 1080),
+    ("720p", 720),
+    ("480p", 480),
+    ("360p", 360),
+    ("240p", 240),
+]
+QUALITY_HEIGHTS = dict(QUALITY_LEVELS)
+
+# Codec preference used when several formats share a height, best last
+VIDEO_CODEC_RANK = {"h264": 1, "h265": 2, "vp9": 3, "av1": 4}
+AUDIO_CODEC_RANK = {"mp3": 1, "aac": 2, "vorbis": 3, "opus": 4}
+
+
+def quality_label(height):
+    """Map a pixel height to its quality label (e.g. 1080 -> '1080p')"""
+    for label, min_height in QUALITY_LEVELS:
+        if height >= min_height:
+            return label
+    return QUALITY_LEVELS[-1][0]
+
+
+def quality_max_height(quality):
+    """Return the height cap for a quality label, or None for 'best'/unknown"""
+    return QUALITY_HEIGHTS.get(quality)
+
+
+def codec_family(codec):
+    """Normalize yt-dlp codec strings ('avc1.640028', 'mp4a.40.2', 'vp09...')"""
+    if not codec or codec == "none":
+        return None
+    codec = codec.lower()
+    if codec.startswith(("avc", "h264")):
+        return "h264"
+    if codec.startswith(("hev", "hvc", "h265")):
+        return "h265"
+    if codec.startswith(("vp9", "vp09")):
+        return "vp9"
+    if codec.startswith(("av01", "av1")):
+        return "av1"
+    if codec.startswith(("mp4a", "aac")):
+        return "aac"
+    return codec.split(".")[0]
+
+
+def estimate_size(fmt, duration):
+    """Best-effort size in bytes from the exact size, yt-dlp's estimate or bitrate x duration"""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    if fmt.get("tbr") and duration:
+        return int(fmt["tbr"] * 1000 / 8 * duration)
+    return None
+
+
+class FormatIndex:
+    """Index over the structured `formats` array of a yt-dlp info dict.
+
+    Formats are split into video-only, audio-only and muxed streams, each
+    sorted by preference, and indexed by height so that quality lists and
+    exact format IDs can be resolved without asking yt-dlp to evaluate a
+    selector expression.
+    """
+
+    def __init__(self, formats, duration=None):
+        self.duration = duration
+        self.video_only = []
+        self.audio_only = []
+        self.muxed = []
+        self.by_height = defaultdict(list)
+
+        for fmt in formats or []:
+            if not fmt.get("format_id") or fmt.get("ext") == "mhtml":
+                continue  # storyboards and malformed entries
+
+            vcodec = fmt.get("vcodec")
+            acodec = fmt.get("acodec")
+            height = fmt.get("height")
+            if vcodec == "none" and acodec != "none":
+                self.audio_only.append(fmt)
+            elif height and acodec == "none":
+                self.video_only.append(fmt)
+            elif height:
+                self.muxed.append(fmt)
+            else:
+                continue
+
+            if height:
+                self.by_height[int(height)].append(fmt)
+
+        self.video_only.sort(key=self._video_rank)
+        self.muxed.sort(key=self._video_rank)
+        self.audio_only.sort(key=self._audio_rank)
+        for bucket in self.by_height.values():
+            bucket.sort(key=self._video_rank)
+
+    @classmethod
+    def from_info(cls, info):
+        return cls(info.get("formats"), info.get("duration"))
+
+    @staticmethod
+    def _video_rank(fmt):
+        return (
+            fmt.get("height") or 0,
+            fmt.get("fps") or 0,
+            VIDEO_CODEC_RANK.get(codec_family(fmt.get("vcodec")), 0),
+            fmt.get("tbr") or 0,
+        )
+
+    @staticmethod
+    def _audio_rank(fmt):
+        return (
+            AUDIO_CODEC_RANK.get(codec_family(fmt.get("acodec")), 0),
+            fmt.get("abr") or fmt.get("tbr") or 0,
+        )
+
+    def best_audio(self, codecs=None):
+        """Best audio-only format, optionally only among the given codec families"""
+        for fmt in reversed(self.audio_only):
+            if codecs is None or codec_family(fmt.get("acodec")) in codecs:
+                return fmt
+        return None
+
+    def best_video(self, max_height=None):
+        """Best (video-only, muxed) candidates at or below `max_height`"""
+        def pick(candidates):
+            for fmt in reversed(candidates):
+                if max_height is None or fmt["height"] <= max_height:
+                    return fmt
+            return None
+        return pick(self.video_only), pick(self.muxed)
+
+    def select(self, format_type, quality):
+        """Resolve a request to an exact yt-dlp format spec (e.g. '137+140').
+
+        Mirrors the selectors the downloader used before,
+        `bestvideo[height<=N]+bestaudio/best[height<=N]/best`, and returns
+        None when the index has nothing usable so the caller can fall back
+        to the selector expression.
+        """
+        audio = self.best_audio()
+        if format_type == "audio":
+            if audio:
+                return audio["format_id"]
+            return self.muxed[-1]["format_id"] if self.muxed else None
+
+        video, muxed = self.best_video(quality_max_height(quality))
+        if video and audio:
+            return f"{video['format_id']}+{audio['format_id']}"
+        if muxed:
+            return muxed["format_id"]
+        if self.muxed:
+            return self.muxed[-1]["format_id"]
+        return None
+
+    def estimated_size(self, format_type, quality):
+        """Expected bytes of the streams select() picks, or None when one has no size or bitrate"""
+        format_spec = self.select(format_type, quality)
+        if not format_spec:
+            return None
+        formats = {fmt["format_id"]: fmt for fmt in self.video_only + self.audio_only + self.muxed}
+        total = 0
+        for format_id in format_spec.split("+"):
+            size = estimate_size(formats[format_id], self.duration)
+            if size is None:
+                return None
+            total += size
+        return total
+
+    def qualities(self):
+        """Sorted (highest first), deduplicated quality options with estimated sizes"""
+        audio = self.best_audio()
+        audio_size = estimate_size(audio, self.duration) if audio else None
+
+        options = []
+        seen = set()
+        for height in sorted(self.by_height, reverse=True):
+            label = quality_label(height)
+            if label in seen:
+                continue
+            seen.add(label)
+
+            video, muxed = self.best_video(QUALITY_HEIGHTS[label])
+            if video and audio:
+                fmt, format_id = video, f"{video['format_id']}+{audio['format_id']}"
+            elif muxed:
+                fmt, format_id = muxed, muxed["format_id"]
+            else:
+                continue
+
+            size = estimate_size(fmt, self.duration)
+            if size is not None and fmt is video and audio_size:
+                size += audio_size
+            options.append({
+                "quality": label,
+                "height": fmt["height"],
+                "formatId": format_id,
+                "codec": codec_family(fmt.get("vcodec")),
+                "fps": fmt.get("fps"),
+                "estimatedSize": size
+            })
+        return options
+
+    def describe(self, fmt):
+        """JSON-friendly summary of a single format"""
+        height = fmt.get("height")
+        return {
+            "id": fmt["format_id"],
+            "resolution": quality_label(height) if height else "audio",
+            "format": fmt.get("ext"),
+            "height": height,
+            "fps": fmt.get("fps"),
+            "vcodec": codec_family(fmt.get("vcodec")),
+            "acodec": codec_family(fmt.get("acodec")),
+            "bitrate": fmt.get("tbr"),
+            "estimatedSize": estimate_size(fmt, self.duration)
+        }
@@ -0,0 +1,286 @@
+import base64
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+MEDIA_TYPES = {
+    ".mp4": "video",
+    ".webm": "video",
+    ".mp3": "audio",
+    ".m4a": "audio",
+}
+
+
+def _encode(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+def _decode(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+
+
+class GalleryCatalog:
+    """In-memory index of the media files in the downloads directory.
+
+    Files are kept in a list sorted newest first, so a page is a bisect plus
+    a slice instead of a directory scan and a sort. Every add and remove is
+    appended to a change log file beside the gallery, shared by the server
+    processes using the directory; `changes(token)` returns what happened
+    since the token was issued, whichever process issued it, or asks for a
+    full reload once the log has been started over. A log starts with a
+    snapshot of the gallery, so a process replays it to catch up and only
+    logs what differs. The endpoints that move files in and out call `add`
+    and `remove`; `watch` notices everything else by polling the
+    directory's mtime, which changes whenever an entry is created, renamed
+    or deleted.
+    """
+
+    def __init__(self, directory, max_log_bytes=8 * 1024 * 1024, log_name=".gallery-changes.jsonl"):
+        self.directory = directory
+        self.max_log_bytes = max_log_bytes
+        self.log_path = os.path.join(directory, log_name)
+        self._lock = threading.Lock()
+        self._lock_file = open(self.log_path + ".lock", "a")
+        self._files = {}  # name -> entry
+        self._bytes = 0
+        self._order = []  # (-modified, name), newest first
+        self._log_inode = None  # log file read so far
+        self._log_epoch = None  # its ID, which tokens carry in case the inode is reused
+        self._log_offset = 0
+        self._rotate_at = max_log_bytes
+        self.logged = 0
+        self._dir_mtime = None
+        self.refresh()
+
+    @contextmanager
+    def _shared_log(self, exclusive=True):
+        """Hold the index and the change log, caught up with what other processes logged"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_log(self, offset, size=-1):
+        """(inode, whole lines from `offset`) of the log, or (None, b"") without one"""
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return None, b""
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._log_inode:
+                offset = 0
+            f.seek(offset)
+            data = f.read(size if inode == self._log_inode else -1)
+        return inode, data[:data.rfind(b"\n") + 1]
+
+    def _catch_up(self):
+        inode, data = self._read_log(self._log_offset)
+        if inode is None:
+            return
+        changes = [json.loads(line) for line in data.splitlines()]
+        if inode == self._log_inode:
+            self._log_offset += len(data)
+            for change in changes:
+                self._apply(change)
+            return
+
+        # A new log: its snapshot and changes are the whole gallery
+        self._log_inode, self._log_offset = inode, len(data)
+        present = {}
+        for change in changes:
+            if change["op"] == "log":
+                self._log_epoch = change["id"]
+            elif change["op"] == "upsert":
+                present[change["file"]["name"]] = change["file"]
+            else:
+                present.pop(change["name"], None)
+        for name in [name for name in self._files if name not in present]:
+            self._drop(name)
+        for entry in present.values():
+            self._put(entry)
+
+    def _apply(self, change):
+        """Apply a logged change to the index; whether it changed anything"""
+        if change["op"] == "upsert":
+            return self._put(change["file"])
+        if change["op"] == "delete":
+            return self._drop(change["name"])
+        return False
+
+    def _record(self, changes):
+        """Apply changes to the index and log those that changed it (log held exclusively)"""
+        data = "".join(json.dumps(change) + "\n" for change in changes if self._apply(change)).encode("utf-8")
+        if not data and self._log_inode is not None:
+            return
+        self.logged += data.count(b"\n")
+        if self._log_inode is None or self._log_offset + len(data) > self._rotate_at:
+            self._rotate()
+            return
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            self._log_offset = f.tell()
+
+    def _rotate(self):
+        """Start the log over with a snapshot of the index; tokens of the old one get a reset"""
+        epoch = uuid.uuid4().hex[:8]
+        lines = [{"op": "log", "id": epoch}] + [{"op": "upsert", "file": entry} for entry in self._files.values()]
+        data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        tmp_path = f"{self.log_path}.{epoch}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.log_path)
+        self._log_inode = os.stat(self.log_path).st_ino
+        self._log_epoch = epoch
+        self._log_offset = len(data)
+        # A large gallery's snapshot alone may be near the limit
+        self._rotate_at = max(self.max_log_bytes, 2 * len(data))
+
+    @staticmethod
+    def media_type(name):
+        return MEDIA_TYPES.get(os.path.splitext(name)[1].lower())
+
+    def _stat_entry(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return {"name": name, "size": st.st_size, "modified": st.st_mtime, "type": self.media_type(name),
+                "inode": st.st_ino, "mtimeNs": st.st_mtime_ns}
+
+    def _put(self, entry):
+        old = self._files.get(entry["name"])
+        if old is not None:
+            if old["size"] == entry["size"] and old["modified"] == entry["modified"]:
+                return False
+            self._order.pop(bisect.bisect_left(self._order, (-old["modified"], old["name"])))
+            self._bytes -= old["size"]
+        self._files[entry["name"]] = entry
+        self._bytes += entry["size"]
+        bisect.insort(self._order, (-entry["modified"], entry["name"]))
+        return True
+
+    def _drop(self, name):
+        old = self._files.pop(name, None)
+        if old is None:
+            return False
+        self._order.pop(bisect.bisect_left(self._order, (-old["modified"], name)))
+        self._bytes -= old["size"]
+        return True
+
+    def _own_change(self):
+        # Our own moves and deletes should not make the watcher rescan everything
+        try:
+            self._dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            pass
+
+    def add(self, name):
+        """Index (or re-index) a file that was just written to the directory"""
+        if self.media_type(name) is None:
+            return
+        with self._shared_log():
+            # Looked at under the lock, so no other process logs an older view after it
+            entry = self._stat_entry(name)
+            self._record([{"op": "delete", "name": name} if entry is None else {"op": "upsert", "file": entry}])
+            self._own_change()
+
+    def remove(self, name):
+        with self._shared_log():
+            self._record([{"op": "delete", "name": name}])
+            self._own_change()
+
+    def refresh(self):
+        """Reconcile the index with a full directory listing"""
+        with self._shared_log():
+            try:
+                dir_mtime = os.stat(self.directory).st_mtime_ns
+                names = [e.name for e in os.scandir(self.directory) if self.media_type(e.name) and e.is_file()]
+            except OSError:
+                dir_mtime, names = None, []
+            entries = [entry for entry in map(self._stat_entry, names) if entry is not None]
+            self._dir_mtime = dir_mtime
+            present = {entry["name"] for entry in entries}
+            self._record([{"op": "delete", "name": name} for name in self._files if name not in present] +
+                         [{"op": "upsert", "file": entry} for entry in entries])
+
+    def watch(self, interval=2.0):
+        """Start a daemon thread that refreshes the index when the directory changes"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if os.stat(self.directory).st_mtime_ns != self._dir_mtime:
+                        self.refresh()
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=run, name="gallery-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def change_token(self):
+        with self._shared_log(exclusive=False):
+            return f"{self._log_epoch}:{self._log_offset}"
+
+    def page(self, cursor=None, limit=None, media_type=None, min_size=None, max_size=None):
+        """Files newest first after `cursor`; returns (files, next_cursor, total)"""
+        with self._lock:
+            start = 0
+            if cursor:
+                key = _decode(cursor)
+                if isinstance(key, list) and len(key) == 2:
+                    start = bisect.bisect_right(self._order, (key[0], key[1]))
+
+            files = []
+            next_cursor = None
+            last_key = None
+            for position in range(start, len(self._order)):
+                key = self._order[position]
+                entry = self._files[key[1]]
+                if media_type and entry["type"] != media_type:
+                    continue
+                if min_size is not None and entry["size"] < min_size:
+                    continue
+                if max_size is not None and entry["size"] > max_size:
+                    continue
+                if limit is not None and len(files) == limit:
+                    next_cursor = _encode(list(last_key))
+                    break
+                files.append(dict(entry))
+                last_key = key
+            return files, next_cursor, len(self._files)
+
+    def changes(self, token):
+        """Changes since `token` as (changes, new_token); changes is None when a full reload is needed"""
+        with self._shared_log(exclusive=False):
+            current = f"{self._log_epoch}:{self._log_offset}"
+            epoch, _, offset = (token or "").partition(":")
+            if epoch != self._log_epoch or not offset.isdigit() or int(offset) > self._log_offset:
+                return None, current
+            _, data = self._read_log(int(offset), self._log_offset - int(offset))
+            try:
+                changes = [json.loads(line) for line in data.splitlines()]
+            except ValueError:
+                # Not a line boundary: not a token this log issued
+                return None, current
+            return [change for change in changes if change["op"] != "log"], current
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": self._bytes, "changesLogged": self.logged,
+                    "changeLogBytes": self._log_offset}
@@ -0,0 +1,25 @@
+"""gunicorn settings for pre-fork deployment of the backend:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+The app is imported once in the master (preload_app) and every worker is
+forked from it, so starting a worker costs a fork and init_services()
+instead of a fresh interpreter importing Flask and the backend. Services
+are built after the fork, in each worker, because their threads, pools and
+SQLite connections would not survive it. Use JOB_STORE=sqlite so the
+workers share download jobs.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+# Threads per worker: SSE and direct streams hold one each while open
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+preload_app = True
+
+
+def post_fork(server, worker):
+    import app
+
+    app.init_services()
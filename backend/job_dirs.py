@@ -0,0 +1,150 @@
+"""Stable working directories for downloads.
+
+Each (video, format, quality) download runs in `<temp_dir>/work_<hash>`,
+named after its artifact key, so a retry or a restarted server finds the
+`.part` files of the previous attempt and yt-dlp continues them. A small
+job.json manifest records what the directory is for and which process owns
+it, which is what the startup scan uses to resume or discard it. Claims
+and the scan hold an flock on `<temp_dir>/.claims.lock`, so when several
+server processes start at once each interrupted download is taken over
+by exactly one of them.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+from contextlib import contextmanager
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+MANIFEST_NAME = "job.json"
+WORK_DIR_PREFIX = "work_"
+LEGACY_DIR_PREFIX = "job_"  # tempfile.mkdtemp directories from older versions
+STREAM_DIR_PREFIX = "stream-"  # direct streams being written to disk (cache=1)
+CLAIMS_LOCK_NAME = ".claims.lock"
+OWNER_FIELDS = ("pid", "host", "claimed")
+
+
+def work_dir_for(temp_dir, cache_key):
+    digest = hashlib.sha1(cache_key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(temp_dir, WORK_DIR_PREFIX + digest)
+
+
+def read_manifest(job_dir):
+    try:
+        with open(os.path.join(job_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(job_dir, fields):
+    """Merge `fields` into the directory's manifest, replacing it atomically"""
+    manifest = read_manifest(job_dir) or {}
+    manifest.update(fields)
+    path = os.path.join(job_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+@contextmanager
+def claims_locked(temp_dir):
+    """Hold the claims on `temp_dir`'s job directories against other threads and processes"""
+    with open(os.path.join(temp_dir, CLAIMS_LOCK_NAME), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _owner():
+    return {"pid": os.getpid(), "host": socket.gethostname(), "claimed": time.time()}
+
+
+def claim(job_dir, fields):
+    """Create the directory if needed and record this process as its owner"""
+    with claims_locked(os.path.dirname(job_dir)):
+        os.makedirs(job_dir, exist_ok=True)
+        return write_manifest(job_dir, dict(fields, **_owner()))
+
+
+def take_over(job_dir, previous):
+    """Claim an interrupted job's directory unless another process got there first.
+
+    `previous` is the manifest `scan` returned for it. Returns the new
+    manifest, or None when the directory is gone or changed owner since.
+    """
+    with claims_locked(os.path.dirname(job_dir)):
+        manifest = read_manifest(job_dir)
+        if manifest is None or any(manifest.get(key) != previous.get(key) for key in OWNER_FIELDS):
+            return None
+        return write_manifest(job_dir, _owner())
+
+
+def release(job_dir):
+    """Undo `claim` for a job that never ran, keeping any partial data"""
+    try:
+        os.remove(os.path.join(job_dir, MANIFEST_NAME))
+        os.rmdir(job_dir)
+    except OSError:
+        pass
+
+
+def owner_alive(manifest):
+    """Whether the process recorded in a manifest is still running on this host"""
+    pid = manifest.get("pid")
+    if not pid or manifest.get("host") != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def directory_age(job_dir):
+    """Seconds since anything in the directory was last written"""
+    latest = os.path.getmtime(job_dir)
+    for entry in os.scandir(job_dir):
+        try:
+            latest = max(latest, entry.stat().st_mtime)
+        except OSError:
+            pass
+    return time.time() - latest
+
+
+def scan(temp_dir, max_age):
+    """Find interrupted downloads left in `temp_dir`.
+
+    Returns (job_dir, manifest) pairs for directories whose owner is gone
+    and that were written to within `max_age` seconds; pass each to
+    `take_over` before resuming it. Older ones, and directories without a
+    manifest, are deleted.
+    """
+    interrupted = []
+    if not os.path.isdir(temp_dir):
+        return interrupted
+    # A directory claim() just created has no manifest until it lets go of the lock
+    with claims_locked(temp_dir):
+        for entry in os.scandir(temp_dir):
+            if not entry.is_dir() or not entry.name.startswith((WORK_DIR_PREFIX, LEGACY_DIR_PREFIX)):
+                continue
+            manifest = read_manifest(entry.path)
+            if manifest is not None and owner_alive(manifest):
+                continue
+            if manifest is None or directory_age(entry.path) > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                log.info("Removed abandoned job directory", extra={"jobDir": entry.path})
+                continue
+            interrupted.append((entry.path, manifest))
+    return interrupted
@@ -0,0 +1,335 @@
+"""Download job state backends.
+
+Both stores keep each job as a dict of the fields /api/download/status
+returns and offer the same operations, including the atomic ones the
+download endpoints need (`attach` for single-flight and `release` for
+cleanup). MemoryJobStore is the single-process default; SQLiteJobStore keeps
+jobs in a WAL-mode database so they survive restarts and can be shared by
+several worker processes on one host.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from logs import get_logger
+from metrics import LOCK_WAIT_SECONDS, TimedLock
+
+log = get_logger(__name__)
+
+FINISHED_STATES = ("done", "error")
+
+
+class MemoryJobStore:
+    """Jobs in a dict guarded by one lock, with secondary indexes by state and cache key"""
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self._jobs = {}
+        self._finished_at = {}
+        self._by_state = {}
+        self._by_cache_key = {}
+        # The lock every status poll, progress tick and cleanup goes through; its waits are measured
+        self._lock = TimedLock(threading.RLock(), LOCK_WAIT_SECONDS.labels(lock="job_store"))
+
+    def create(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+            self._index(job_id, None, job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, fields, buffered=False):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            old = dict(job)
+            job.update(fields)
+            self._index(job_id, old, job)
+            return True
+
+    def delete(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                self._index(job_id, job, None)
+            return job
+
+    def attach(self, cache_key, job_id, job):
+        """Join the active job for `cache_key` or create `job`; returns the owning job ID"""
+        with self._lock:
+            for existing_id in self._by_cache_key.get(cache_key, ()):
+                existing = self._jobs[existing_id]
+                if existing["state"] != "error":
+                    existing["subscribers"] += 1
+                    return existing_id
+            self.create(job_id, job)
+            return job_id
+
+    def release(self, job_id):
+        """Drop one subscriber from a job and return its updated fields"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job["subscribers"] = job.get("subscribers", 1) - 1
+            return dict(job)
+
+    def ids_by_state(self, state):
+        with self._lock:
+            return list(self._by_state.get(state, ()))
+
+    def expire(self, now=None):
+        """Remove finished jobs older than the TTL and return them"""
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, finished in self._finished_at.items() if finished < cutoff]
+            return [(job_id, self.delete(job_id)) for job_id in expired]
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "jobs": len(self._jobs),
+                    "byState": {state: len(ids) for state, ids in self._by_state.items()}}
+
+    def _index(self, job_id, old, new):
+        for field, index in (("state", self._by_state), ("cacheKey", self._by_cache_key)):
+            old_value = old.get(field) if old else None
+            new_value = new.get(field) if new else None
+            if old_value == new_value and old is not None and new is not None:
+                continue
+            if old_value is not None:
+                ids = index.get(old_value)
+                if ids is not None:
+                    ids.discard(job_id)
+                    if not ids:
+                        del index[old_value]
+            if new_value is not None:
+                index.setdefault(new_value, set()).add(job_id)
+
+        if new is not None and new.get("state") in FINISHED_STATES:
+            self._finished_at.setdefault(job_id, time.time())
+        else:
+            self._finished_at.pop(job_id, None)
+
+
+class SQLiteJobStore:
+    """Jobs in a SQLite database in WAL mode.
+
+    Progress updates marked `buffered` are merged in memory and written in
+    one transaction every `flush_interval` seconds by a background thread;
+    everything else, state transitions included, is written immediately.
+    Reads in this process see buffered fields right away.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            state TEXT,
+            cache_key TEXT,
+            finished_at REAL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+        CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key);
+        CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+    """
+
+    def __init__(self, path, ttl=86400, flush_interval=0.5):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending = {}
+        self._pending_lock = TimedLock(threading.Lock(), LOCK_WAIT_SECONDS.labels(lock="job_store_pending"))
+        # Keeps a batch flush from landing after a newer direct write
+        self._write_lock = TimedLock(threading.Lock(), LOCK_WAIT_SECONDS.labels(lock="job_store_write"))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flush", daemon=True)
+        self._flusher.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_values(job):
+        state = job.get("state")
+        finished_at = time.time() if state in FINISHED_STATES else None
+        return state, job.get("cacheKey"), finished_at, json.dumps(job)
+
+    def _read(self, conn, job_id):
+        row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, conn, job_id, job):
+        state, cache_key, finished_at, data = self._row_values(job)
+        conn.execute(
+            "UPDATE jobs SET state = ?, cache_key = ?, finished_at = COALESCE(finished_at, ?), data = ? WHERE id = ?",
+            (state, cache_key, finished_at, data, job_id)
+        )
+
+    def create(self, job_id, job):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (id, state, cache_key, finished_at, data) VALUES (?, ?, ?, ?, ?)",
+            (job_id, *self._row_values(job))
+        )
+
+    def get(self, job_id):
+        job = self._read(self._conn(), job_id)
+        if job is not None:
+            with self._pending_lock:
+                job.update(self._pending.get(job_id, {}))
+        return job
+
+    def update(self, job_id, fields, buffered=False):
+        if buffered:
+            with self._pending_lock:
+                self._pending.setdefault(job_id, {}).update(fields)
+            return True
+
+        with self._write_lock:
+            with self._pending_lock:
+                fields = {**self._pending.pop(job_id, {}), **fields}
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._read(conn, job_id)
+                if job is not None:
+                    job.update(fields)
+                    self._write(conn, job_id, job)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job is not None
+
+    def delete(self, job_id):
+        with self._pending_lock:
+            self._pending.pop(job_id, None)
+        conn = self._conn()
+        job = self._read(conn, job_id)
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return job
+
+    def attach(self, cache_key, job_id, job):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, data FROM jobs WHERE cache_key = ? AND state != 'error' LIMIT 1", (cache_key,)
+            ).fetchone()
+            if row:
+                existing = json.loads(row[1])
+                existing["subscribers"] = existing.get("subscribers", 1) + 1
+                self._write(conn, row[0], existing)
+                owner = row[0]
+            else:
+                conn.execute(
+                    "INSERT INTO jobs (id, state, cache_key, finished_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, *self._row_values(job))
+                )
+                owner = job_id
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return owner
+
+    def release(self, job_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = self._read(conn, job_id)
+            if job is not None:
+                job["subscribers"] = job.get("subscribers", 1) - 1
+                self._write(conn, job_id, job)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if job is not None:
+            with self._pending_lock:
+                job.update(self._pending.get(job_id, {}))
+        return job
+
+    def ids_by_state(self, state):
+        rows = self._conn().execute("SELECT id FROM jobs WHERE state = ?", (state,)).fetchall()
+        return [row[0] for row in rows]
+
+    def expire(self, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, data FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            ).fetchall()
+            conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def flush(self):
+        """Write all buffered progress updates in a single transaction"""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job_id, fields in pending.items():
+                    job = self._read(conn, job_id)
+                    if job is not None:
+                        job.update(fields)
+                        self._write(conn, job_id, job)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                log.error("Job store flush failed: %s", e)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {"backend": "sqlite", "jobs": sum(count for _, count in rows),
+                "byState": dict(rows), "pendingWrites": pending}
+
+
+def create_job_store(backend="memory", path="jobs.db", ttl=86400, flush_interval=0.5):
+    if backend == "sqlite":
+        return SQLiteJobStore(path, ttl=ttl, flush_interval=flush_interval)
+    return MemoryJobStore(ttl=ttl)
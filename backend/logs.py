@@ -0,0 +1,80 @@
+"""Leveled, rate-limited, structured logging for the backend.
+
+Modules log through `get_logger(__name__)` with %-style messages and put
+identifiers in `extra` (e.g. `extra={"downloadId": download_id}`), which
+the JSON formatter emits as fields of their own. The rate limit applies
+per call site: a message template logged more than `burst` times within
+`interval` seconds is dropped, and the next record that gets through
+reports how many were suppressed.
+"""
+import json
+import logging
+import threading
+import time
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `burst` records per message template through every `interval` seconds"""
+
+    def __init__(self, burst=10, interval=1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows = {}  # (logger, template) -> [window start, count, suppressed]
+
+    def filter(self, record):
+        if self.burst <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                window = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+def configure(level="INFO", fmt="json", burst=10, interval=1.0):
+    """Install the handler on the root logger; called once at startup"""
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(RateLimitFilter(burst, interval))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+
+def get_logger(name):
+    return logging.getLogger(name)
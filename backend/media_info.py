@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+
+def file_key(inode, mtime_ns, size):
+    """Cache key for one version of a file: its inode, mtime and size"""
+    raw = f"{inode}-{mtime_ns}-{size}"
+    return hashlib.sha1(raw.encode("ascii")).hexdigest()
+
+
+def parse_probe(probe):
+    """Pick the fields the gallery shows out of `ffprobe -show_format -show_streams` JSON"""
+    fmt = probe.get("format") or {}
+    streams = probe.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not (s.get("disposition") or {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    cover = next((s for s in streams if (s.get("disposition") or {}).get("attached_pic")), None)
+
+    def number(value, cast=float):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        "duration": number(fmt.get("duration")),
+        "bitrate": number(fmt.get("bit_rate"), int),
+        "container": fmt.get("format_name"),
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "videoCodec": video.get("codec_name") if video else None,
+        "audioCodec": audio.get("codec_name") if audio else None,
+        "hasPicture": bool(video or cover),
+    }
+
+
+class MediaInfoCache:
+    """Thumbnails and ffprobe metadata for the files in the downloads directory.
+
+    Results live in `cache_dir` as `<key>.json` and `<key>.jpg`, where the
+    key is derived from the file's inode, mtime and size, so a file is only
+    probed once per version and a replaced file never gets stale data.
+    `lookup` never blocks on ffmpeg: a miss queues the file on a small
+    thread pool of its own (separate from the download workers) and returns
+    None until the result is ready. At most `max_pending` files wait at a
+    time; files dropped past that are queued again on their next lookup.
+    """
+
+    def __init__(self, directory, cache_dir, ffprobe="ffprobe", ffmpeg="ffmpeg", workers=2,
+                 max_pending=1000, thumbnail_width=320, timeout=60):
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self.ffprobe = ffprobe
+        self.ffmpeg = ffmpeg
+        self.max_pending = max_pending
+        self.thumbnail_width = thumbnail_width
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-info")
+        self._lock = threading.Lock()
+        self._results = {}  # key -> metadata
+        self._failed = {}  # key -> error message, retried after a restart
+        self._pending = set()
+        self._keys = {}  # file name -> (key, inode) of its last looked-up version
+        self.probed = 0
+        self.dropped = 0
+
+    def thumbnail_path(self, key):
+        return os.path.join(self.cache_dir, key + ".jpg")
+
+    def _json_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def lookup(self, name, version=None):
+        """Metadata for a file, or None while it is being computed (or failed).
+
+        `version` is the file's (inode, mtime_ns, size) if the caller already
+        has it; otherwise the file is stat'ed.
+        """
+        if version is None:
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                return None
+            version = (st.st_ino, st.st_mtime_ns, st.st_size)
+        key = file_key(*version)
+        with self._lock:
+            self._keys[name] = (key, version[0])
+            result = self._results.get(key)
+            if result is not None or key in self._failed:
+                return result
+
+        try:
+            with open(self._json_path(key), encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self._schedule(name, key)
+            return None
+        with self._lock:
+            self._results[key] = result
+        return result
+
+    def schedule(self, name):
+        """Compute a file's metadata in the background, e.g. right after it was added"""
+        self.lookup(name)
+
+    def _schedule(self, name, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.add(key)
+        self._executor.submit(self._process, name, key)
+
+    def _process(self, name, key):
+        path = os.path.join(self.directory, name)
+        try:
+            result = self._probe(path)
+            if result["hasPicture"] and self._thumbnail(path, key, result.get("duration")):
+                result["thumbnail"] = key + ".jpg"
+            else:
+                result["thumbnail"] = None
+            # Other server processes may be probing the same file
+            tmp_path = f"{self._json_path(key)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._json_path(key))
+            with self._lock:
+                self._results[key] = result
+                self.probed += 1
+        except Exception as e:
+            log.warning("Media info failed: %s", e, extra={"file": name})
+            with self._lock:
+                self._failed[key] = str(e)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _probe(self, path):
+        cmd = [self.ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ffprobe failed with exit code {result.returncode}")
+        return parse_probe(json.loads(result.stdout))
+
+    def _thumbnail(self, path, key, duration):
+        # A frame a little way in is more representative than the first one
+        offset = min(duration * 0.1, 10) if duration else 0
+        tmp_path = f"{self.thumbnail_path(key)}.{uuid.uuid4().hex}.tmp.jpg"
+        cmd = [self.ffmpeg, "-v", "error", "-y", "-ss", f"{offset:.2f}", "-i", path, "-an",
+               "-frames:v", "1", "-vf", f"scale={self.thumbnail_width}:-2", "-q:v", "5", tmp_path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            result = None
+        if result is None or result.returncode != 0 or not os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        os.replace(tmp_path, self.thumbnail_path(key))
+        return True
+
+    def discard(self, name):
+        """Delete the cached results of a file that was removed, unless other names link to it"""
+        with self._lock:
+            entry = self._keys.pop(name, None)
+        if entry is None:
+            return
+        key, inode = entry
+        # Names the artifact store deduplicated share the inode, and so the results
+        try:
+            for other in os.scandir(self.directory):
+                try:
+                    if other.is_file() and other.stat().st_ino == inode:
+                        return
+                except OSError:
+                    pass
+        except OSError:
+            pass
+        with self._lock:
+            self._results.pop(key, None)
+            self._failed.pop(key, None)
+        for path in (self._json_path(key), self.thumbnail_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._results), "pending": len(self._pending),
+                    "failed": len(self._failed), "probed": self.probed, "dropped": self.dropped}
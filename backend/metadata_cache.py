@@ -0,0 +1,157 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from ytdlp_engine import ExtractionError
+
+# Keys of the --dump-json payload that nothing in the backend reads but that
+# make up most of its size (caption track listings and the replay heatmap)
+UNUSED_INFO_KEYS = ('automatic_captions', 'subtitles', 'heatmap')
+
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+
+def normalize_url(url):
+    """Normalize Shorts URLs to watch URLs to avoid extractor quirks"""
+    if "/shorts/" in url:
+        video_id_match = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
+        if video_id_match:
+            url = f"https://www.youtube.com/watch?v={video_id_match.group(1)}"
+    return url
+
+
+def canonical_video_id(url):
+    """Return a stable cache key for a URL ('youtube:<id>' for YouTube links)"""
+    match = _YOUTUBE_ID_RE.search(url)
+    if match:
+        return f"youtube:{match.group(1)}"
+    return url.strip()
+
+
+class _Flight:
+    """A single extraction that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.info = None
+        self.error = None
+
+
+class MetadataCache:
+    """LRU cache of yt-dlp info dicts keyed by canonical video ID.
+
+    `fetcher` is the extraction function, normally `ExtractionPolicy.extract_info`.
+
+    Entries expire after `ttl` seconds (stream URLs in the info dict are signed
+    and go stale), and the cache is capped both by entry count and by the
+    approximate size of the cached JSON. Concurrent lookups for the same video
+    share one extraction. `misses` counts extractions started, so lookups that
+    joined one (`coalesced`) or only peeked do not lower the hit ratio.
+    """
+
+    def __init__(self, fetcher, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=1800):
+        self.fetcher = fetcher
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, info)
+        self._total_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Return the info dict for `url`, extracting it at most once per TTL"""
+        url = normalize_url(url)
+        key = canonical_video_id(url)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._remove(key)
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.info
+
+        try:
+            info = self.fetcher(url)
+            for unused_key in UNUSED_INFO_KEYS:
+                info.pop(unused_key, None)
+            flight.info = info
+            self.put(key, info)
+            return info
+        except Exception as e:
+            flight.error = e if isinstance(e, ExtractionError) else ExtractionError(str(e))
+            raise flight.error
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def peek(self, url):
+        """The cached info dict for `url`, or None; never extracts (for callers that extract on their own)"""
+        key = canonical_video_id(normalize_url(url))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            return None
+
+    def record_miss(self):
+        """Count an extraction a `peek` caller starts on its own after a miss"""
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, info):
+        size = len(json.dumps(info))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, info)
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, url):
+        with self._lock:
+            key = canonical_video_id(normalize_url(url))
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
@@ -0,0 +1,286 @@
+"""Prometheus-style metrics for the backend, served as text by GET /metrics.
+
+A small stdlib implementation of counters, gauges and histograms with
+labels, so the hot paths can be instrumented without another dependency.
+Metrics are module-level objects registered in REGISTRY; gauges that
+describe state owned elsewhere (queue lengths, disk usage) are computed by
+callbacks at scrape time instead of being kept up to date on every change.
+"""
+import bisect
+import threading
+import time
+
+# Seconds; from a cache hit to a long download
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Lock waits are normally far below a millisecond
+LOCK_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+# Bytes per second, 64 KiB/s to 128 MiB/s
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 2 ** i for i in range(12))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for one metric family; `labels(**values)` returns the child for a label set"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        (registry if registry is not None else REGISTRY).register(self)
+        if not self.labelnames:
+            # Exported as zero before the first observation
+            self._default()
+
+    def labels(self, **values):
+        key = tuple(str(values[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        # Metrics without labels are used directly
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) tuples for the exposition"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.labelnames, values, extra)} {_number(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        return [("_total", key, (), child.value) for key, child in children]
+
+
+class Gauge(Metric):
+    """Gauge set directly, or computed at scrape time by `set_function`"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._function = None
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().inc(-amount)
+
+    def set_function(self, function):
+        """Compute the value when scraped; `function` returns a number, or {label values tuple: number}"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception:
+                return []
+            if isinstance(result, dict):
+                return [("", tuple(str(v) for v in key), (), value) for key, value in result.items()]
+            return [("", (), (), result)]
+        with self._lock:
+            children = list(self._children.items())
+        return [("", key, (), child.value) for key, child in children]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self.observe)
+
+
+class _Timer:
+    """Context manager observing the seconds its block took"""
+
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _Histogram(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        samples = []
+        for key, child in children:
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _number(float(bound))),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """The text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+class TimedLock:
+    """Lock wrapper recording how long each acquisition waited in a histogram child"""
+
+    def __init__(self, lock, histogram):
+        self._lock = lock
+        self._histogram = histogram
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time until the response headers, by route, method and status",
+    ["route", "method", "status"])
+YTDLP_SECONDS = Histogram(
+    "ytdlp_operation_duration_seconds", "yt-dlp operations by engine, operation and outcome",
+    ["engine", "operation", "outcome"])
+YTDLP_SPAWN_SECONDS = Histogram(
+    "ytdlp_spawn_duration_seconds", "Time to start a yt-dlp child process, by operation",
+    ["operation"], buckets=LOCK_BUCKETS + (2.5, 5))
+MODEL_SECONDS = Histogram(
+    "model_request_duration_seconds", "AI model calls by model and outcome, without rate-limit waits",
+    ["model", "outcome"])
+DOWNLOAD_THROUGHPUT = Histogram(
+    "download_throughput_bytes_per_second", "Average transfer rate of finished downloads",
+    buckets=THROUGHPUT_BUCKETS)
+DOWNLOAD_BYTES = Counter("download_bytes", "Bytes of finished downloads")
+DOWNLOADS = Counter("downloads", "Finished download jobs by outcome", ["outcome"])
+LOCK_WAIT_SECONDS = Histogram(
+    "lock_wait_seconds", "Time spent waiting to acquire a shared lock", ["lock"], buckets=LOCK_BUCKETS)
+STAGE_SECONDS = Histogram(
+    "download_stage_duration_seconds", "Download pipeline stages (queue waits, download, post-processing)",
+    ["stage"])
+JOBS = Gauge("download_jobs", "Download jobs queued or running on a pool", ["pool", "state"])
+TEMP_DISK_BYTES = Gauge("temp_disk_usage_bytes", "Bytes used by partial and unfinished downloads")
@@ -0,0 +1,280 @@
+"""Post-processing stage: ffmpeg muxing and audio conversion after the download.
+
+With the stage on, yt-dlp only fetches the selected streams (`137,140`
+instead of `137+140`) and the download worker hands the files to a
+PostProcessor, whose pool is sized to the CPU cores rather than to the
+network. Streams are copied into the target container whenever their
+codecs allow it and re-encoded only when they do not.
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import get_logger
+from metrics import STAGE_SECONDS
+
+log = get_logger(__name__)
+
+# Codec families (see formats.codec_family) an MP4 or M4A file can carry as they are
+MP4_VIDEO_CODECS = {"h264", "h265", "vp9", "av1"}
+MP4_AUDIO_CODECS = {"aac", "mp3", "opus"}
+
+# Hardware H.264 encoders tried, in order, before libx264 when a video must be re-encoded
+HARDWARE_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+# "Title.f137.mp4" -> "Title": the format suffix of a split stream file
+STREAM_SUFFIX = re.compile(r"\.f[^.]+$")
+
+
+class PostProcessError(Exception):
+    """Raised when ffmpeg could not produce the output file"""
+
+
+def plan_output(streams, format_type, audio_quality="0", audio_output="auto"):
+    """How to turn downloaded streams into the delivered file.
+
+    `streams` are dicts with `path`, `vcodec` and `acodec` (codec families,
+    None when absent). Returns {"ext", "video", "audio"} where video is
+    "copy", "encode" or None and audio is "copy", "aac", "mp3" or None.
+    With `audio_output="auto"`, best-quality AAC or MP3 audio is kept as it
+    is (AAC in .m4a) instead of being transcoded to MP3.
+    """
+    video = next((s["vcodec"] for s in streams if s.get("vcodec")), None)
+    audio = next((s["acodec"] for s in streams if s.get("acodec")), None)
+
+    if format_type == "audio":
+        if audio_output == "auto" and audio_quality == "0" and audio in ("aac", "mp3"):
+            return {"ext": "m4a" if audio == "aac" else "mp3", "video": None, "audio": "copy"}
+        return {"ext": "mp3", "video": None, "audio": "mp3"}
+
+    return {
+        "ext": "mp4",
+        "video": "copy" if video in MP4_VIDEO_CODECS else "encode",
+        "audio": None if audio is None else "copy" if audio in MP4_AUDIO_CODECS else "aac",
+    }
+
+
+def output_path(streams, ext):
+    """Delivered file next to the first stream, without its format suffix"""
+    first = streams[0]["path"]
+    stem = STREAM_SUFFIX.sub("", os.path.splitext(os.path.basename(first))[0])
+    return os.path.join(os.path.dirname(first), f"{stem}.{ext}")
+
+
+def ffmpeg_command(ffmpeg, streams, plan, output, audio_quality="0", video_encoder="libx264", threads=0):
+    """ffmpeg arguments carrying out a plan_output() plan"""
+    cmd = [ffmpeg, "-v", "error", "-nostdin", "-y"]
+    for stream in streams:
+        cmd.extend(["-i", stream["path"]])
+
+    # Take the video and audio from whichever input has them
+    video_input = next((i for i, s in enumerate(streams) if s.get("vcodec")), None)
+    audio_input = next((i for i, s in enumerate(streams) if s.get("acodec")), None)
+    if plan["video"] and video_input is not None:
+        cmd.extend(["-map", f"{video_input}:v:0"])
+        if plan["video"] == "copy":
+            cmd.extend(["-c:v", "copy"])
+        else:
+            cmd.extend(["-c:v", video_encoder, "-pix_fmt", "yuv420p"])
+    else:
+        cmd.append("-vn")
+    if plan["audio"] and audio_input is not None:
+        cmd.extend(["-map", f"{audio_input}:a:0"])
+        if plan["audio"] == "copy":
+            cmd.extend(["-c:a", "copy"])
+        elif plan["audio"] == "mp3":
+            cmd.extend(["-c:a", "libmp3lame", "-q:a", audio_quality])
+        else:
+            cmd.extend(["-c:a", "aac", "-b:a", "192k"])
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+    if plan["ext"] in ("mp4", "m4a"):
+        cmd.extend(["-movflags", "+faststart"])
+    cmd.append(output)
+    return cmd
+
+
+def detect_video_encoder(ffmpeg, preference="auto"):
+    """Encoder for re-encoded video: `preference` itself, or with "auto" the first hardware encoder ffmpeg has"""
+    if preference != "auto":
+        return preference
+    try:
+        result = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return "libx264"
+    available = result.stdout if result.returncode == 0 else ""
+    for encoder in HARDWARE_ENCODERS:
+        if re.search(rf"\s{encoder}\s", available):
+            return encoder
+    return "libx264"
+
+
+class StageTimings:
+    """Count, total and max seconds per pipeline stage (queue waits, download, post-processing).
+
+    Every sample also goes into the download_stage_duration_seconds histogram.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, seconds):
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0})
+            entry["count"] += 1
+            entry["totalSeconds"] += seconds
+            entry["maxSeconds"] = max(entry["maxSeconds"], seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                stage: dict(entry,
+                            totalSeconds=round(entry["totalSeconds"], 3),
+                            maxSeconds=round(entry["maxSeconds"], 3),
+                            meanSeconds=round(entry["totalSeconds"] / entry["count"], 3))
+                for stage, entry in self._stages.items()
+            }
+
+
+class PostProcessor:
+    """ffmpeg jobs on a pool of their own, sized to the CPU rather than to the network.
+
+    `submit(streams, format_type, audio_quality, on_done)` queues one job and
+    returns at once, so the download worker is free for the next transfer.
+    `on_done(path, error, timings)` runs on the pool thread with the output
+    path (or None and an error message) and the seconds the job waited and
+    ran. Each ffmpeg gets an equal share of the cores as its thread count.
+    The stream files are deleted once the output exists and kept for the
+    next attempt when it fails.
+    """
+
+    def __init__(self, ffmpeg="ffmpeg", workers=None, audio_output="auto", video_encoder="auto",
+                 timeout=3600, timings=None):
+        cpus = os.cpu_count() or 1
+        self.ffmpeg = ffmpeg
+        self.workers = workers or cpus
+        self.threads = max(cpus // self.workers, 1)
+        self.audio_output = audio_output
+        self.timeout = timeout
+        self.timings = timings or StageTimings()
+        self._video_encoder_preference = video_encoder
+        self._video_encoder = None
+        self._encoder_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.modes = {"none": 0, "copy": 0, "transcode": 0}
+
+    def video_encoder(self):
+        with self._encoder_lock:
+            if self._video_encoder is None:
+                self._video_encoder = detect_video_encoder(self.ffmpeg, self._video_encoder_preference)
+            return self._video_encoder
+
+    def submit(self, streams, format_type, audio_quality, on_done):
+        with self._lock:
+            self.queued += 1
+        submitted = time.monotonic()
+        self._executor.submit(self._run, streams, format_type, audio_quality, on_done, submitted)
+
+    def _run(self, streams, format_type, audio_quality, on_done, submitted):
+        started = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        path, error = None, None
+        try:
+            path = self.process(streams, format_type, audio_quality)
+        except Exception as e:
+            error = str(e)
+        finished = time.monotonic()
+        with self._lock:
+            self.active -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        timings = {"postprocessWait": round(started - submitted, 3), "postprocess": round(finished - started, 3)}
+        for stage, seconds in timings.items():
+            self.timings.record(stage, seconds)
+        on_done(path, error, timings)
+
+    def process(self, streams, format_type, audio_quality="0"):
+        """Produce the delivered file from the stream files and return its path"""
+        plan = plan_output(streams, format_type, audio_quality, self.audio_output)
+        output = output_path(streams, plan["ext"])
+
+        # A single stream already in the target container only needs its name
+        source = streams[0]["path"]
+        if (len(streams) == 1 and plan["video"] in ("copy", None) and plan["audio"] in ("copy", None)
+                and os.path.splitext(source)[1].lstrip(".") == plan["ext"]):
+            os.replace(source, output)
+            self._count("none")
+            return output
+
+        encoder = self.video_encoder() if plan["video"] == "encode" else None
+        error = self._ffmpeg(streams, plan, output, audio_quality, encoder)
+        if error is not None and encoder not in (None, "libx264"):
+            # Listed hardware encoders can still lack a device to run on
+            log.warning("Hardware encoder %s failed, using libx264: %s", encoder, error)
+            error = self._ffmpeg(streams, plan, output, audio_quality, "libx264")
+        if error is not None:
+            raise PostProcessError(error)
+
+        for stream in streams:
+            if os.path.abspath(stream["path"]) != os.path.abspath(output):
+                try:
+                    os.remove(stream["path"])
+                except OSError:
+                    pass
+        self._count("transcode" if plan["video"] == "encode" or plan["audio"] in ("aac", "mp3") else "copy")
+        return output
+
+    def _ffmpeg(self, streams, plan, output, audio_quality, encoder):
+        # Write next to the output and rename, so a half-written file is never delivered
+        root, ext = os.path.splitext(output)
+        tmp_output = f"{root}.pp{ext}"
+        cmd = ffmpeg_command(self.ffmpeg, streams, plan, tmp_output, audio_quality,
+                             video_encoder=encoder or "libx264", threads=self.threads)
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            result = None
+        except OSError as e:
+            return f"Failed to run ffmpeg: {e}"
+        if result is None or result.returncode != 0:
+            try:
+                os.remove(tmp_output)
+            except OSError:
+                pass
+            if result is None:
+                return "ffmpeg timed out"
+            detail = result.stderr.strip().splitlines()
+            return detail[-1] if detail else f"ffmpeg failed with exit code {result.returncode}"
+        os.replace(tmp_output, output)
+        return None
+
+    def _count(self, mode):
+        with self._lock:
+            self.modes[mode] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "threadsPerJob": self.threads,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "modes": dict(self.modes),
+                "videoEncoder": self._video_encoder
+            }
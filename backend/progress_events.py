@@ -0,0 +1,215 @@
+import asyncio
+import json
+import threading
+import time
+
+
+class ProgressBroadcaster:
+    """Wakes up progress streams when the jobs they follow change.
+
+    Every job carries a version number that `publish` bumps. A stream
+    registers one Event for all the job IDs it follows, so an update only
+    wakes the streams interested in that job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._subscribers = {}  # job_id -> set of Events
+
+    def publish(self, job_id):
+        with self._lock:
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            for event in self._subscribers.get(job_id, ()):
+                event.set()
+
+    def forget(self, job_id):
+        """Wake streams for a job that no longer exists and drop its version"""
+        with self._lock:
+            self._versions.pop(job_id, None)
+            for event in self._subscribers.get(job_id, ()):
+                event.set()
+
+    def subscribe(self, job_ids, event=None):
+        """Register `event` (anything with a thread-safe `set()`, a new threading.Event by default)"""
+        event = event if event is not None else threading.Event()
+        with self._lock:
+            for job_id in job_ids:
+                self._subscribers.setdefault(job_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, job_ids, event):
+        with self._lock:
+            for job_id in job_ids:
+                subscribers = self._subscribers.get(job_id)
+                if subscribers is not None:
+                    subscribers.discard(event)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+    def changed_since(self, seen):
+        """Job IDs whose version differs from the `seen` mapping (updated in place)"""
+        changed = []
+        with self._lock:
+            for job_id, version in seen.items():
+                current = self._versions.get(job_id, -1)
+                if current != version:
+                    seen[job_id] = current
+                    changed.append(job_id)
+        return changed
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class _StreamState:
+    """What one progress stream has sent so far, shared by the sync and async generators"""
+
+    def __init__(self, broadcaster, job_ids, snapshot, terminal_states):
+        self.broadcaster = broadcaster
+        self.job_ids = job_ids
+        self.snapshot = snapshot
+        self.terminal_states = terminal_states
+        self.seen = {job_id: None for job_id in job_ids}  # None forces an initial full snapshot
+        self.sent = {}
+        self.finished = set()
+
+    def batch(self):
+        """SSE messages for every job that changed since the last batch"""
+        messages = []
+        for job_id in self.broadcaster.changed_since(self.seen):
+            job = self.snapshot(job_id)
+            if job is None:
+                self.finished.add(job_id)
+                messages.append(format_sse("gone", {"id": job_id}))
+                continue
+
+            previous = self.sent.get(job_id, {})
+            delta = {k: v for k, v in job.items() if previous.get(k, object()) != v}
+            self.sent[job_id] = job
+            if delta:
+                delta["id"] = job_id
+                messages.append(format_sse("progress", delta))
+            if job.get("state") in self.terminal_states:
+                self.finished.add(job_id)
+        return messages
+
+    def done(self):
+        return self.finished >= set(self.job_ids)
+
+    def repoll(self):
+        """Re-read every unfinished job on the next batch"""
+        for job_id in self.job_ids:
+            if job_id not in self.finished:
+                self.seen[job_id] = None
+
+
+def progress_stream(broadcaster, job_ids, snapshot, max_rate=4.0, keepalive=15.0, poll_interval=None,
+                    terminal_states=("done", "error")):
+    """Server-sent event generator pushing coalesced per-job field deltas.
+
+    `snapshot(job_id)` returns a copy of the job dict or None if it is gone.
+    At most `max_rate` batches are sent per second; updates that land in
+    between are folded into the next batch. The stream ends once every
+    followed job is finished or gone.
+
+    With a job store shared between processes, updates made by other
+    workers never reach this process's broadcaster; `poll_interval` then
+    re-reads unfinished jobs that often and sends whatever changed.
+    """
+    min_interval = 1.0 / max_rate if max_rate > 0 else 0
+    event = broadcaster.subscribe(job_ids)
+    state = _StreamState(broadcaster, job_ids, snapshot, terminal_states)
+    last_emit = 0.0
+    last_sent = time.monotonic()
+    wait = min(keepalive, poll_interval) if poll_interval else keepalive
+
+    try:
+        while True:
+            messages = state.batch()
+            if messages:
+                last_sent = time.monotonic()
+            yield from messages
+
+            if state.done():
+                yield format_sse("end", {"ids": list(job_ids)})
+                return
+
+            last_emit = time.monotonic()
+            if not event.wait(wait):
+                if poll_interval:
+                    state.repoll()
+                if time.monotonic() - last_sent >= keepalive:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+            event.clear()
+
+            # Coalesce bursts of updates into one batch per interval
+            delay = min_interval - (time.monotonic() - last_emit)
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        broadcaster.unsubscribe(job_ids, event)
+
+
+class _AsyncEvent:
+    """threading.Event stand-in that wakes an asyncio.Event from any thread"""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.event = asyncio.Event()
+
+    def set(self):
+        try:
+            self._loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # the loop has shut down; the stream is gone
+
+
+async def async_progress_stream(broadcaster, job_ids, snapshot, max_rate=4.0, keepalive=15.0, poll_interval=None,
+                                terminal_states=("done", "error")):
+    """progress_stream for asyncio servers: waiting for updates holds no thread.
+
+    Snapshots are taken on the default executor, since `snapshot` may be a
+    blocking store query (the SQLite job store) that must not stall the
+    event loop.
+    """
+    min_interval = 1.0 / max_rate if max_rate > 0 else 0
+    waker = _AsyncEvent(asyncio.get_running_loop())
+    broadcaster.subscribe(job_ids, waker)
+    state = _StreamState(broadcaster, job_ids, snapshot, terminal_states)
+    last_emit = 0.0
+    last_sent = time.monotonic()
+    wait = min(keepalive, poll_interval) if poll_interval else keepalive
+
+    try:
+        while True:
+            messages = await asyncio.to_thread(state.batch)
+            if messages:
+                last_sent = time.monotonic()
+            for message in messages:
+                yield message
+
+            if state.done():
+                yield format_sse("end", {"ids": list(job_ids)})
+                return
+
+            last_emit = time.monotonic()
+            try:
+                await asyncio.wait_for(waker.event.wait(), wait)
+            except asyncio.TimeoutError:
+                if poll_interval:
+                    state.repoll()
+                if time.monotonic() - last_sent >= keepalive:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+            waker.event.clear()
+
+            delay = min_interval - (time.monotonic() - last_emit)
+            if delay > 0:
+                await asyncio.sleep(delay)
+    finally:
+        broadcaster.unsubscribe(job_ids, waker)
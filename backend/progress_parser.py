@@ -0,0 +1,131 @@
+"""Single-pass parser for yt-dlp progress output.
+
+The CLI is asked (through --progress-template and --print) to emit one
+compact, space-separated record per event instead of its human-readable
+console lines:
+
+    __P__ <status> <downloaded> <total> <total_estimate> <speed> <eta>
+    __PP__ <status> <postprocessor>
+    __F__<final file path>
+
+Missing values are printed by yt-dlp as "NA".
+"""
+PROGRESS_MARK = "__P__ "
+POSTPROCESS_MARK = "__PP__ "
+FILEPATH_MARK = "__F__"
+
+PROGRESS_ARGS = [
+    "--newline",
+    "--progress",
+    "--progress-template",
+    "download:" + PROGRESS_MARK + "%(progress.status)s %(progress.downloaded_bytes)s %(progress.total_bytes)s "
+    "%(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s",
+    "--progress-template",
+    "postprocess:" + POSTPROCESS_MARK + "%(progress.status)s %(progress.postprocessor)s",
+    # --print implies --simulate, so ask for the download explicitly
+    "--print", "after_move:" + FILEPATH_MARK + "%(filepath)s",
+    "--no-simulate",
+]
+
+# Post-processors that mean the download is done and ffmpeg is working
+PROCESSING_POSTPROCESSORS = ("Merger", "ExtractAudio", "FFmpegExtractAudio")
+
+
+def format_speed(bytes_per_second):
+    """Format a byte rate the way yt-dlp prints it (e.g. '2.30MiB/s')"""
+    if not bytes_per_second:
+        return None
+    for unit, scale in (("GiB/s", 1024 ** 3), ("MiB/s", 1024 ** 2), ("KiB/s", 1024)):
+        if bytes_per_second >= scale:
+            return f"{bytes_per_second / scale:.2f}{unit}"
+    return f"{bytes_per_second:.2f}B/s"
+
+
+def parse_speed(text):
+    """Bytes per second from a format_speed() string, or None"""
+    if not text:
+        return None
+    for unit, scale in (("GiB/s", 1024 ** 3), ("MiB/s", 1024 ** 2), ("KiB/s", 1024), ("B/s", 1)):
+        if text.endswith(unit):
+            try:
+                return float(text[:-len(unit)]) * scale
+            except ValueError:
+                return None
+    return None
+
+
+def format_eta(seconds):
+    """Format an ETA in seconds as MM:SS (or HH:MM:SS)"""
+    if seconds is None:
+        return None
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def _number(value):
+    if value == "NA":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class ProgressParser:
+    """Turns yt-dlp template output into job field updates.
+
+    `feed(line)` looks at each line once and returns a dict of changed job
+    fields, or None when nothing the client sees has changed, so callers
+    take their lock at most once per line and usually not at all.
+    """
+
+    __slots__ = ("final_path", "paths", "error", "_last")
+
+    def __init__(self):
+        self.final_path = None
+        self.paths = []  # every file written, in order (one per stream of a "137,140" format)
+        self.error = None
+        self._last = {}
+
+    def feed(self, line):
+        if line.startswith(PROGRESS_MARK):
+            parts = line[len(PROGRESS_MARK):].split()
+            if len(parts) != 6 or parts[0] != "downloading":
+                return None
+            downloaded = _number(parts[1])
+            total = _number(parts[2]) or _number(parts[3])
+            fields = {"state": "downloading"}
+            if downloaded is not None and total:
+                fields["progress"] = round(min(downloaded / total * 100, 99.9), 1)
+            speed = _number(parts[4])
+            if speed:
+                fields["speed"] = format_speed(speed)
+            eta = _number(parts[5])
+            if eta is not None:
+                fields["eta"] = format_eta(eta)
+            return self.changed(fields)
+
+        if line.startswith(POSTPROCESS_MARK):
+            parts = line[len(POSTPROCESS_MARK):].split()
+            if len(parts) == 2 and parts[0] == "started" and parts[1] in PROCESSING_POSTPROCESSORS:
+                return self.changed({"state": "processing", "progress": 95})
+            return None
+
+        if line.startswith(FILEPATH_MARK):
+            self.final_path = line[len(FILEPATH_MARK):].rstrip("\r\n")
+            self.paths.append(self.final_path)
+        elif line.startswith("ERROR:"):
+            self.error = line.strip()
+        return None
+
+    def changed(self, fields):
+        """Keep only the fields whose value differs from the last reported one"""
+        last = self._last
+        delta = {k: v for k, v in fields.items() if last.get(k) != v}
+        if not delta:
+            return None
+        last.update(delta)
+        return delta
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict, deque
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler refuses a job because its queue is full"""
+
+
+class DownloadScheduler:
+    """Fixed pool of worker threads fed from a bounded, prioritized queue.
+
+    Jobs are placed in priority lanes (0 runs first). Inside a lane every
+    client has its own FIFO and clients are served round-robin, so one client
+    queueing many downloads cannot starve the others. `submit` raises
+    QueueFull once `max_queued` jobs are waiting in total or a client already
+    has `max_queued_per_client` waiting.
+    """
+
+    def __init__(self, worker_count=4, max_queued=100, max_queued_per_client=10, lanes=4):
+        self.worker_count = worker_count
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self._lanes = [OrderedDict() for _ in range(lanes)]  # client -> deque of (job_id, fn)
+        self._queued = {}  # job_id -> (lane, client)
+        self._per_client = {}
+        self._active = set()
+        self._cond = threading.Condition()
+        self._workers = []
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        with self._cond:
+            while len(self._workers) < self.worker_count:
+                worker = threading.Thread(target=self._run, name=f"download-worker-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+
+    def submit(self, job_id, fn, priority=0, client=None):
+        """Queue `fn` to run on a worker and return its 1-based queue position"""
+        lane = min(max(int(priority), 0), len(self._lanes) - 1)
+        with self._cond:
+            if len(self._queued) >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull("Download queue is full, try again later")
+            if self._per_client.get(client, 0) >= self.max_queued_per_client:
+                self.rejected += 1
+                raise QueueFull("Too many queued downloads for this client")
+
+            self._lanes[lane].setdefault(client, deque()).append((job_id, fn))
+            self._queued[job_id] = (lane, client)
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+            self._cond.notify()
+            return self._position(job_id)
+
+    def cancel(self, job_id):
+        """Drop a job that has not started yet"""
+        with self._cond:
+            if job_id not in self._queued:
+                return False
+            lane, client = self._queued[job_id]
+            queue = self._lanes[lane][client]
+            for item in queue:
+                if item[0] == job_id:
+                    queue.remove(item)
+                    break
+            if not queue:
+                del self._lanes[lane][client]
+            self._forget(job_id, client)
+            return True
+
+    def position(self, job_id):
+        """1-based position of a waiting job, or None if it is running or unknown"""
+        with self._cond:
+            return self._position(job_id)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.worker_count,
+                "active": len(self._active),
+                "queued": len(self._queued),
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+    def _position(self, job_id):
+        if job_id not in self._queued:
+            return None
+        target_lane, target_client = self._queued[job_id]
+
+        # Everything in higher-priority lanes runs first
+        ahead = sum(len(queue) for lane in self._lanes[:target_lane] for queue in lane.values())
+
+        # Inside the lane, the n-th job of each client runs in round n
+        clients = list(self._lanes[target_lane].items())
+        round_index = next(i for i, item in enumerate(self._lanes[target_lane][target_client]) if item[0] == job_id)
+        client_index = next(i for i, (client, _) in enumerate(clients) if client == target_client)
+        for i, (client, queue) in enumerate(clients):
+            ahead += min(len(queue), round_index + (1 if i < client_index else 0))
+        return ahead + 1
+
+    def _next_job(self):
+        for lane in self._lanes:
+            if lane:
+                client, queue = next(iter(lane.items()))
+                job_id, fn = queue.popleft()
+                # Rotate the client to the back of its lane for round-robin
+                del lane[client]
+                if queue:
+                    lane[client] = queue
+                self._forget(job_id, client)
+                return job_id, fn
+        return None
+
+    def _forget(self, job_id, client):
+        del self._queued[job_id]
+        self._per_client[client] -= 1
+        if not self._per_client[client]:
+            del self._per_client[client]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active.add(job[0])
+
+            job_id, fn = job
+            try:
+                fn()
+            except Exception:
+                log.exception("Download worker error", extra={"downloadId": job_id})
+            finally:
+                with self._cond:
+                    self._active.discard(job_id)
+                    self.completed += 1
@@ -1,6 +1,9 @@
 import requests
 import json
 import sys
+import time
+
+BASE_URL = "http://127.0.0.1:8095"
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -8,8 +11,8 @@ if __name__ == "__main__":
         sys.exit(1)
 
     youtube_url = sys.argv[1]
-    
-    url = "http://127.0.0.1:5000/analyze"
+
+    url = f"{BASE_URL}/analyze"
     payload = {"url": youtube_url}
     headers = {'Content-Type': 'application/json'}
 
@@ -17,5 +20,15 @@ if __name__ == "__main__":
         response = requests.post(url, data=json.dumps(payload), headers=headers)
         print(f"Status Code: {response.status_code}")
         print(f"Response Body: {response.text}")
+
+        # The analysis runs in the background unless it was cached; poll until it finishes
+        body = response.json()
+        if response.ok and body.get("status") == "pending":
+            while True:
+                time.sleep(1)
+                record = requests.get(f"{BASE_URL}/api/analysis/{body['analysisId']}").json()
+                if record.get("state") in ("done", "error"):
+                    print(f"Analysis: {json.dumps(record, indent=2)}")
+                    break
     except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
\ No newline at end of file
+        print(f"Request failed: {e}")
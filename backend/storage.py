@@ -0,0 +1,250 @@
+"""Disk budget for downloads: temp directory accounting, admission and garbage collection.
+
+Downloads run in job directories under temp_downloads (see job_dirs) and
+their files end up in the downloads directory, where the artifact cache
+keeps them for repeat requests. StorageManager
+
+- measures the bytes in each job directory and in total,
+- admits a new download only if its estimated size fits the quota (temp
+  files plus cached artifacts) and leaves `min_free` bytes free on the
+  disk, evicting least recently used artifacts to make room,
+- holds that space as a reservation until the job finishes, so downloads
+  admitted at the same time cannot promise each other the same bytes,
+- and deletes, on a schedule, directories nothing will use again: job
+  directories no job refers to, stream files that stopped being written
+  and, while the disk is short, the partial files of failed jobs.
+"""
+import os
+import shutil
+import threading
+import time
+
+import job_dirs
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Streams are merged or converted into a new file next to them, so a job
+# briefly needs room for its inputs and its output together
+WORKING_SPACE_FACTOR = 2
+
+
+class StorageFull(Exception):
+    """Raised when a download does not fit the storage quota or the free disk space.
+
+    Unlike QueueFull it does not clear up by itself within seconds: space
+    comes back only as downloads finish and artifacts are evicted.
+    """
+
+
+def tree_size(path):
+    """Bytes of all files under `path`"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class StorageManager:
+    """Quota, free-space floor and garbage collector for `temp_dir`.
+
+    `job_lookup(download_id)` returns a job dict or None; a job directory
+    whose manifest names a job that is gone, or that moved on to another
+    directory, is an orphan. `stored_bytes()` is the disk space finished
+    files take, each stored file counted once however many gallery names
+    link to it (default: the artifact cache's own count). Usage is
+    rescanned at most every `refresh` seconds.
+    """
+
+    def __init__(self, temp_dir, artifact_cache, job_lookup, quota=0, min_free=0, orphan_age=3600, refresh=5.0,
+                 stored_bytes=None):
+        self.temp_dir = temp_dir
+        self.artifact_cache = artifact_cache
+        self.stored_bytes = stored_bytes or (lambda: artifact_cache.stats()["bytes"])
+        self.job_lookup = job_lookup
+        self.quota = quota
+        self.min_free = min_free
+        self.orphan_age = orphan_age
+        self.refresh = refresh
+        # Deleting cached artifacts only frees temp disk space when they share the disk
+        self.shared_disk = os.stat(temp_dir).st_dev == os.stat(artifact_cache.directory).st_dev
+        self._lock = threading.Lock()
+        self._reserved = {}  # download ID -> (job dir, bytes)
+        self._usage = {}  # path under temp_dir -> bytes, as of the last scan
+        self._scanned_at = 0.0
+        self.admitted = 0
+        self.downgraded = 0
+        self.refused = 0
+        self.collected = 0
+        self.collected_bytes = 0
+
+    def scan(self, force=False):
+        """Bytes per entry of `temp_dir`"""
+        with self._lock:
+            if not force and time.monotonic() - self._scanned_at < self.refresh:
+                return dict(self._usage)
+        usage = {}
+        for entry in os.scandir(self.temp_dir):
+            try:
+                usage[entry.path] = tree_size(entry.path) if entry.is_dir(follow_symlinks=False) else entry.stat().st_size
+            except OSError:
+                pass
+        with self._lock:
+            self._usage = usage
+            self._scanned_at = time.monotonic()
+        return dict(usage)
+
+    def temp_bytes(self):
+        return sum(self.scan().values())
+
+    def reserve(self, download_id, options):
+        """Reserve room for a new download.
+
+        `options` are (job dir, estimated bytes or None) pairs in order of
+        preference, the requested quality first. Cached artifacts are
+        evicted to fit the first one before settling for another. Returns
+        the index of the option that fits; raises StorageFull.
+        """
+        needs = [(size or 0) * WORKING_SPACE_FACTOR for _, size in options]
+        usage = self.scan()
+        with self._lock:
+            quota_short, disk_short = self._shortfall(usage, needs[0])
+        if quota_short > 0 or disk_short > 0:
+            self._make_room(quota_short, disk_short)
+            usage = self.scan(force=True)
+
+        with self._lock:
+            for position, need in enumerate(needs):
+                if max(self._shortfall(usage, need)) <= 0:
+                    self._reserved[download_id] = (options[position][0], need)
+                    self.admitted += 1
+                    if position:
+                        self.downgraded += 1
+                    return position
+            self.refused += 1
+        raise StorageFull("Not enough disk space for this download")
+
+    def release(self, download_id):
+        """Return a job's reservation once it has finished (its files are counted as they are)"""
+        with self._lock:
+            self._reserved.pop(download_id, None)
+
+    def _outstanding(self, usage):
+        """Reserved bytes not written yet"""
+        return sum(max(0, need - usage.get(job_dir, 0)) for job_dir, need in self._reserved.values())
+
+    def _shortfall(self, usage, need):
+        """(bytes over the quota, bytes under the free-space floor) if `need` more were admitted"""
+        outstanding = self._outstanding(usage)
+        quota_short = disk_short = 0
+        if self.quota:
+            used = sum(usage.values()) + self.stored_bytes() + outstanding
+            quota_short = used + need - self.quota
+        if self.min_free:
+            free = shutil.disk_usage(self.temp_dir).free - outstanding
+            disk_short = self.min_free - (free - need)
+        return quota_short, disk_short
+
+    def _make_room(self, quota_short, disk_short):
+        """Free space: partial files of failed jobs first, then least recently used artifacts"""
+        freed = self.collect(failed=True)
+        wanted = max(quota_short, disk_short if self.shared_disk else 0) - freed
+        if wanted > 0:
+            evicted = self.artifact_cache.evict(wanted)
+            if evicted:
+                log.info("Evicted cached artifacts for disk space", extra={"bytes": evicted})
+
+    def collect(self, failed=False):
+        """Delete directories nothing will use again; with `failed`, also failed jobs' partial files.
+
+        Directories owned by another live process are left to it. Those of
+        a process that died are taken over and deleted once untouched for
+        `orphan_age`, unless they hold a finished file a job still serves.
+        Returns the bytes freed.
+        """
+        with self._lock:
+            active = {job_dir for job_dir, _ in self._reserved.values()}
+        freed = 0
+        for entry in os.scandir(self.temp_dir):
+            if not entry.is_dir(follow_symlinks=False) or entry.path in active:
+                continue
+            if entry.name.startswith(job_dirs.STREAM_DIR_PREFIX):
+                # A stream being cached writes to its file continuously
+                remove = job_dirs.directory_age(entry.path) > self.orphan_age
+            elif entry.name.startswith((job_dirs.WORK_DIR_PREFIX, job_dirs.LEGACY_DIR_PREFIX)):
+                remove = self._collectable(entry.path, failed)
+            else:
+                continue
+            if remove:
+                size = tree_size(entry.path)
+                shutil.rmtree(entry.path, ignore_errors=True)
+                freed += size
+                with self._lock:
+                    self.collected += 1
+                    self.collected_bytes += size
+                log.info("Collected job directory", extra={"jobDir": entry.path, "bytes": size})
+        return freed
+
+    def _collectable(self, job_dir, failed):
+        manifest = job_dirs.read_manifest(job_dir)
+        if manifest is None:
+            # claim() writes the manifest right after creating the directory
+            return job_dirs.directory_age(job_dir) > self.orphan_age
+        download_id = manifest.get("downloadId")
+        job = self.job_lookup(download_id) if download_id else None
+        if not job_dirs.owner_alive(manifest):
+            stale = job_dirs.directory_age(job_dir) > self.orphan_age
+            if not stale and not (failed and manifest.get("state") == "error"):
+                return False
+            # Nothing runs a dead process's job any more; only a finished file may still be wanted
+            if job is not None and job.get("jobDir") == job_dir and job.get("state") == "done":
+                return False
+            # Taken over first, in case a starting process is resuming it right now
+            return job_dirs.take_over(job_dir, manifest) is not None
+        if manifest.get("pid") != os.getpid():
+            return False
+        if job is None or job.get("jobDir") != job_dir:
+            return job_dirs.directory_age(job_dir) > self.orphan_age
+        # Partial files only save a retry some time
+        return failed and job.get("state") == "error"
+
+    def run(self, interval):
+        """Collect every `interval` seconds, and enforce the quota when it is exceeded"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect()
+                usage = self.scan(force=True)
+                with self._lock:
+                    quota_short, disk_short = self._shortfall(usage, 0)
+                if quota_short > 0 or disk_short > 0:
+                    self._make_room(quota_short, disk_short)
+            except Exception:
+                log.exception("Error collecting job directories")
+
+    def start(self, interval):
+        threading.Thread(target=self.run, args=(interval,), name="storage-gc", daemon=True).start()
+
+    def stats(self):
+        usage = self.scan()
+        disk = shutil.disk_usage(self.temp_dir)
+        largest = sorted(usage.items(), key=lambda item: item[1], reverse=True)[:5]
+        with self._lock:
+            return {
+                "tempBytes": sum(usage.values()),
+                "jobDirs": len(usage),
+                "largest": [{"path": path, "bytes": size} for path, size in largest],
+                "reservedBytes": self._outstanding(usage),
+                "quota": self.quota,
+                "freeBytes": disk.free,
+                "minFree": self.min_free,
+                "admitted": self.admitted,
+                "downgraded": self.downgraded,
+                "refused": self.refused,
+                "collected": self.collected,
+                "collectedBytes": self.collected_bytes
+            }
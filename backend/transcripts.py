@@ -0,0 +1,134 @@
+"""YouTube transcripts for transcript-grounded analysis.
+
+`fetch_transcript` wraps youtube-transcript-api (both the 0.x class
+methods and the 1.x instance API). TranscriptCache keeps fetched
+transcripts on disk so a video's captions are only downloaded once, and
+`chunk_transcript` cuts them into pieces small enough for one prompt each.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class TranscriptUnavailable(Exception):
+    """The video has no transcript we can use (disabled, missing, or the API is not installed)"""
+
+
+def fetch_transcript(video_id, languages=("en",)):
+    """Transcript segments as a list of {"text", "start", "duration"} dicts"""
+    try:
+        from youtube_transcript_api import YouTubeTranscriptApi
+    except ImportError:
+        raise TranscriptUnavailable("youtube-transcript-api is not installed")
+
+    try:
+        if hasattr(YouTubeTranscriptApi, "fetch"):
+            # 1.x: instance method returning a FetchedTranscript of snippets
+            fetched = YouTubeTranscriptApi().fetch(video_id, languages=list(languages))
+            return [{"text": s.text, "start": s.start, "duration": s.duration} for s in fetched]
+        # 0.x: class method returning plain dicts
+        return YouTubeTranscriptApi.get_transcript(video_id, languages=list(languages))
+    except Exception as e:
+        raise TranscriptUnavailable(f"{type(e).__name__}: {e}".splitlines()[0])
+
+
+def chunk_transcript(segments, chunk_chars=6000):
+    """Group consecutive segments into chunks of about `chunk_chars` characters.
+
+    Chunks always end on a segment boundary, so the chunks of a transcript
+    that later grows (a stream that was still live) stay the same and their
+    cached summaries are reused. Each chunk is {"index", "start", "end",
+    "text", "key"}, where key is a hash of the text.
+    """
+    chunks = []
+    lines = []
+    size = 0
+    start = None
+    end = 0.0
+
+    def close():
+        text = "\n".join(lines)
+        chunks.append({"index": len(chunks), "start": start, "end": end, "text": text,
+                       "key": hashlib.sha1(text.encode("utf-8")).hexdigest()})
+
+    for segment in segments:
+        text = " ".join((segment.get("text") or "").split())
+        if not text:
+            continue
+        if lines and size + len(text) > chunk_chars:
+            close()
+            lines, size, start = [], 0, None
+        if start is None:
+            start = float(segment.get("start") or 0)
+        end = float(segment.get("start") or 0) + float(segment.get("duration") or 0)
+        lines.append(text)
+        size += len(text) + 1
+    if lines:
+        close()
+    return chunks
+
+
+class TranscriptCache:
+    """Transcripts by video ID, fetched once and kept as JSON files in `cache_dir`.
+
+    Videos without a transcript are remembered for `negative_ttl` seconds so
+    a retry does not hit YouTube again straight away.
+    """
+
+    def __init__(self, cache_dir, fetch=fetch_transcript, languages=("en",), ttl=7 * 24 * 3600, negative_ttl=3600):
+        self.cache_dir = cache_dir
+        self.fetch = fetch
+        self.languages = tuple(languages)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._missing = {}  # video ID -> (expires, message)
+        self.hits = 0
+        self.fetched = 0
+
+    def _path(self, video_id):
+        digest = hashlib.sha1(video_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".json")
+
+    def get(self, video_id):
+        """Segments for a video; raises TranscriptUnavailable"""
+        path = self._path(video_id)
+        try:
+            if time.time() - os.path.getmtime(path) < self.ttl:
+                with open(path, encoding="utf-8") as f:
+                    segments = json.load(f)
+                with self._lock:
+                    self.hits += 1
+                return segments
+        except (OSError, ValueError):
+            pass
+
+        with self._lock:
+            missing = self._missing.get(video_id)
+            if missing is not None and missing[0] > time.time():
+                raise TranscriptUnavailable(missing[1])
+
+        try:
+            segments = self.fetch(video_id, self.languages)
+        except TranscriptUnavailable as e:
+            with self._lock:
+                self._missing[video_id] = (time.time() + self.negative_ttl, str(e))
+            raise
+
+        # Other server processes may be writing the same transcript
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(segments, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.fetched += 1
+            self._missing.pop(video_id, None)
+        return segments
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "fetched": self.fetched, "unavailable": len(self._missing)}
@@ -0,0 +1,503 @@
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import YTDLP_SECONDS, YTDLP_SPAWN_SECONDS
+from progress_parser import PROGRESS_ARGS, ProgressParser, format_eta, format_speed
+from logs import get_logger
+
+log = get_logger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Metadata extraction attempts as (user agent, timeout in seconds), preferred
+# first: the browser user agent, then yt-dlp's default one
+EXTRACT_STRATEGIES = ((USER_AGENT, 45), (None, 30))
+
+# yt-dlp error messages (lowercased) for videos no retry or user agent will
+# bring back. "Sign in to confirm you're not a bot" is a block of this
+# server, not of the video, and is deliberately absent.
+PERMANENT_ERRORS = (
+    "private video",
+    "video unavailable",
+    "this video has been removed",
+    "this video is no longer available",
+    "this video is not available",
+    "account associated with this video has been terminated",
+    "members-only content",
+    "sign in to confirm your age",
+    "unsupported url",
+    "is not a valid url",
+    "incomplete youtube id",
+    "http error 404",
+)
+
+
+class ExtractionError(Exception):
+    """Raised when yt-dlp could not extract metadata for a URL"""
+
+
+class DownloadError(Exception):
+    """Raised when a yt-dlp download or post-processing step fails"""
+
+
+def is_permanent_error(error):
+    """Whether an ExtractionError says the video itself cannot be extracted (private, removed, bad URL)"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in PERMANENT_ERRORS)
+
+
+def playlist_entries(info):
+    """Flat playlist info as {"title", "entries": [{"id", "url", "title"}]}; a single video is a one-item list"""
+    if info.get("_type") not in ("playlist", "multi_video"):
+        url = info.get("webpage_url") or info.get("original_url") or info.get("url")
+        return {"title": info.get("title"), "entries": [{"id": info.get("id"), "url": url, "title": info.get("title")}]}
+
+    entries = []
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        url = entry.get("webpage_url") or entry.get("url")
+        if url and not url.startswith(("http://", "https://")) and entry.get("ie_key") == "Youtube":
+            url = f"https://www.youtube.com/watch?v={entry.get('id') or url}"
+        if url:
+            entries.append({"id": entry.get("id"), "url": url, "title": entry.get("title")})
+    return {"title": info.get("title"), "entries": entries}
+
+
+@contextmanager
+def timed_operation(engine, operation):
+    """Record the duration and outcome of one yt-dlp operation"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        YTDLP_SECONDS.labels(engine=engine, operation=operation, outcome=outcome).observe(time.perf_counter() - start)
+
+
+def extract_command(executable, url, user_agent=None):
+    """yt-dlp CLI arguments printing the info dict of one video as JSON"""
+    cmd = [executable, "--dump-json", "--no-playlist"]
+    if user_agent:
+        cmd.extend(["--user-agent", user_agent])
+    cmd.append(url)
+    return cmd
+
+
+def extraction_result(returncode, stdout, stderr):
+    """The info dict from a finished extract_command() run; raises ExtractionError"""
+    if returncode != 0:
+        raise ExtractionError(stderr.strip() or f"yt-dlp failed with exit code {returncode}")
+    try:
+        return json.loads(stdout)
+    except json.JSONDecodeError as e:
+        raise ExtractionError(f"Invalid metadata from yt-dlp: {e}")
+
+
+class BaseEngine:
+    """Common policy for both yt-dlp engines.
+
+    Engines expose `extract_info(url)` returning a JSON-serializable info dict,
+    `extract_playlist(url, limit)` listing the videos of a playlist or
+    channel (see playlist_entries) and `download_files(url,
+    output_template, options, info, on_update)` returning the paths of the
+    files it wrote, one per stream for a split format such as `137,140`;
+    `download` returns the last of them, the final file (or None if it
+    could not be determined). `options` holds `format`, `extract_audio`,
+    `audio_quality`, `merge_output_format`, `concurrent_fragments`,
+    `rate_limit` (bytes per second) and `throttle(nbytes)`, which engines
+    that see the bytes arrive call as they do (and may block) instead of
+    applying `rate_limit`; `on_update` receives dicts of job
+    fields such as progress, speed, eta and state. Every operation is timed
+    into the ytdlp_operation_duration_seconds metric.
+    """
+
+    name = None
+
+    def extract_info(self, url):
+        """Try each of EXTRACT_STRATEGIES in turn (see extraction.ExtractionPolicy for hedging them)"""
+        (user_agent, timeout), (fallback_agent, fallback_timeout) = EXTRACT_STRATEGIES
+        try:
+            return self.extract_with(url, user_agent, timeout)
+        except ExtractionError:
+            return self.extract_with(url, fallback_agent, fallback_timeout)
+
+    def extract_with(self, url, user_agent, timeout):
+        """One extraction attempt with the given user agent (None for yt-dlp's default)"""
+        with timed_operation(self.name, "extract"):
+            return self._extract(url, user_agent, timeout)
+
+    def _extract(self, url, user_agent, timeout):
+        raise NotImplementedError
+
+    def extract_playlist(self, url, limit=None):
+        with timed_operation(self.name, "playlist"):
+            return self._extract_playlist(url, limit)
+
+    def _extract_playlist(self, url, limit):
+        raise NotImplementedError
+
+    def download(self, url, output_template, options, info=None, on_update=None):
+        paths = self.download_files(url, output_template, options, info, on_update)
+        return paths[-1] if paths else None
+
+    def download_files(self, url, output_template, options, info=None, on_update=None):
+        with timed_operation(self.name, "download"):
+            return self._download_files(url, output_template, options, info, on_update)
+
+    def _download_files(self, url, output_template, options, info, on_update):
+        raise NotImplementedError
+
+
+class SubprocessEngine(BaseEngine):
+    """Runs the yt-dlp CLI in a child process for every operation"""
+
+    name = "subprocess"
+
+    def __init__(self, executable="yt-dlp"):
+        self.executable = executable
+
+    @staticmethod
+    def _spawn(cmd, operation, **kwargs):
+        """Popen with the time to start the interpreter recorded per operation"""
+        start = time.perf_counter()
+        process = subprocess.Popen(cmd, **kwargs)
+        YTDLP_SPAWN_SECONDS.labels(operation=operation).observe(time.perf_counter() - start)
+        return process
+
+    def _run(self, cmd, operation, timeout):
+        """subprocess.run(capture_output=True, text=True) through _spawn"""
+        process = self._spawn(cmd, operation, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    def _extract(self, url, user_agent, timeout):
+        try:
+            result = self._run(extract_command(self.executable, url, user_agent), "extract", timeout)
+        except subprocess.TimeoutExpired:
+            raise ExtractionError("yt-dlp timed out while extracting metadata")
+        return extraction_result(result.returncode, result.stdout, result.stderr)
+
+    def _extract_playlist(self, url, limit, timeout=300):
+        # Flat extraction lists the entries without resolving every video
+        cmd = [self.executable, "--flat-playlist", "--dump-single-json", "--user-agent", USER_AGENT]
+        if limit:
+            cmd.extend(["--playlist-end", str(limit)])
+        cmd.append(url)
+        try:
+            result = self._run(cmd, "playlist", timeout)
+        except subprocess.TimeoutExpired:
+            raise ExtractionError("yt-dlp timed out while listing the playlist")
+        if result.returncode != 0:
+            raise ExtractionError(result.stderr.strip() or f"yt-dlp failed with exit code {result.returncode}")
+        try:
+            return playlist_entries(json.loads(result.stdout))
+        except json.JSONDecodeError as e:
+            raise ExtractionError(f"Invalid playlist data from yt-dlp: {e}")
+
+    def build_command(self, url, output_template, options, info_json_path=None):
+        cmd = [self.executable, "-o", output_template, "--user-agent", USER_AGENT]
+        # Keep .part files and pick them up again when the job is retried
+        cmd.extend(["--continue", "--part"])
+        cmd.extend(PROGRESS_ARGS)
+        if info_json_path:
+            cmd.extend(["--load-info-json", info_json_path])
+        else:
+            cmd.append(url)
+        if options.get("format"):
+            cmd.extend(["-f", options["format"]])
+        if options.get("extract_audio"):
+            cmd.extend(["-x", "--audio-format", options["extract_audio"]])
+            cmd.extend(["--audio-quality", options.get("audio_quality", "0")])
+        if options.get("merge_output_format"):
+            cmd.extend(["--merge-output-format", options["merge_output_format"]])
+        if options.get("concurrent_fragments", 1) > 1:
+            cmd.extend(["--concurrent-fragments", str(options["concurrent_fragments"])])
+        if options.get("rate_limit"):
+            cmd.extend(["--limit-rate", str(int(options["rate_limit"]))])
+        return cmd
+
+    def _download_files(self, url, output_template, options, info, on_update):
+        info_json_path = None
+        if info is not None:
+            # Hand the cached extraction to yt-dlp instead of extracting again
+            info_json_path = os.path.join(os.path.dirname(output_template), "info.json")
+            with open(info_json_path, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+
+        cmd = self.build_command(url, output_template, options, info_json_path)
+        process = self._spawn(cmd, "download", stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+        parser = ProgressParser()
+        tail = deque(maxlen=5)  # last lines, reported if yt-dlp fails
+        for line in process.stdout:
+            fields = parser.feed(line)
+            if fields is not None:
+                if on_update is not None:
+                    on_update(fields)
+            else:
+                tail.append(line)
+
+        process.wait()
+        if process.returncode != 0:
+            detail = parser.error or (tail[-1].strip() if tail else "")
+            message = f"yt-dlp failed with exit code {process.returncode}"
+            raise DownloadError(f"{message}: {detail}" if detail else message)
+        return parser.paths
+
+
+class InProcessEngine(BaseEngine):
+    """Drives yt_dlp.YoutubeDL inside the server process.
+
+    The yt_dlp package and its extractors are imported once, on the first
+    operation (it takes the better part of a second), so each later one only
+    pays for the network work. A fresh YoutubeDL is created per operation
+    because instances are not safe to share between threads.
+    """
+
+    name = "inprocess"
+
+    def __init__(self, socket_timeout=30):
+        if importlib.util.find_spec("yt_dlp") is None:
+            raise ImportError("No module named 'yt_dlp'")
+        self.socket_timeout = socket_timeout
+        self._module = None
+        self._warm_lock = threading.Lock()
+        self._warm = False
+
+    @property
+    def _yt_dlp(self):
+        if self._module is None:
+            with self._warm_lock:
+                if self._module is None:
+                    import yt_dlp
+                    self._module = yt_dlp
+        return self._module
+
+    def warm_up(self):
+        """Load the extractor classes up front instead of on the first request"""
+        yt_dlp = self._yt_dlp
+        with self._warm_lock:
+            if not self._warm:
+                with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+                    ydl.get_info_extractor("Youtube")
+                self._warm = True
+
+    def _base_params(self, user_agent=USER_AGENT):
+        params = {
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+            "noplaylist": True,
+            "socket_timeout": self.socket_timeout,
+        }
+        if user_agent:
+            params["http_headers"] = {"User-Agent": user_agent}
+        return params
+
+    def _extract(self, url, user_agent, timeout):
+        params = self._base_params(user_agent)
+        params["socket_timeout"] = min(self.socket_timeout, timeout)
+        try:
+            with self._yt_dlp.YoutubeDL(params) as ydl:
+                info = ydl.extract_info(url, download=False)
+                return ydl.sanitize_info(info)
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise ExtractionError(str(e))
+
+    def _extract_playlist(self, url, limit):
+        params = self._base_params()
+        params["noplaylist"] = False
+        params["extract_flat"] = "in_playlist"
+        if limit:
+            params["playlistend"] = limit
+        try:
+            with self._yt_dlp.YoutubeDL(params) as ydl:
+                info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise ExtractionError(str(e))
+        return playlist_entries(info)
+
+    def build_params(self, output_template, options, on_update):
+        params = self._base_params()
+        params["outtmpl"] = output_template
+        # Keep .part files and pick them up again when the job is retried
+        params["continuedl"] = True
+        params["nopart"] = False
+        if options.get("format"):
+            params["format"] = options["format"]
+        if options.get("merge_output_format"):
+            params["merge_output_format"] = options["merge_output_format"]
+        if options.get("concurrent_fragments", 1) > 1:
+            params["concurrent_fragment_downloads"] = options["concurrent_fragments"]
+        if options.get("rate_limit") and not options.get("throttle"):
+            params["ratelimit"] = int(options["rate_limit"])
+        if options.get("extract_audio"):
+            params["postprocessors"] = [{
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": options["extract_audio"],
+                "preferredquality": options.get("audio_quality", "0"),
+            }]
+
+        # Hooks fire per received chunk; only changed fields reach on_update
+        parser = ProgressParser()
+
+        def report(fields):
+            fields = parser.changed(fields)
+            if fields:
+                on_update(fields)
+
+        params["progress_hooks"] = [lambda d: self._on_progress(d, report)]
+        if options.get("throttle"):
+            params["progress_hooks"].append(self._throttle_hook(options["throttle"]))
+        params["postprocessor_hooks"] = [lambda d: self._on_postprocess(d, report)]
+        return params
+
+    @staticmethod
+    def _on_progress(d, on_update):
+        if d.get("status") != "downloading":
+            return
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        fields = {"state": "downloading"}
+        if total:
+            fields["progress"] = round(min(d.get("downloaded_bytes", 0) / total * 100, 99.9), 1)
+        if d.get("speed"):
+            fields["speed"] = format_speed(d["speed"])
+        if d.get("eta") is not None:
+            fields["eta"] = format_eta(d["eta"])
+        on_update(fields)
+
+    @staticmethod
+    def _throttle_hook(throttle):
+        """Progress hook passing the bytes received since the last call to `throttle`.
+
+        Hooks run in the downloading thread after every block, so a
+        throttle that blocks slows the download down.
+        """
+        received = {}  # file name -> downloaded_bytes at the last hook
+
+        def hook(d):
+            if d.get("status") != "downloading":
+                return
+            name = d.get("filename")
+            downloaded = d.get("downloaded_bytes") or 0
+            # The first report of a resumed file includes what earlier attempts fetched
+            previous = received.get(name, downloaded)
+            received[name] = downloaded
+            if downloaded > previous:
+                throttle(downloaded - previous)
+        return hook
+
+    @staticmethod
+    def _on_postprocess(d, on_update):
+        if d.get("status") == "started" and d.get("postprocessor") in ("Merger", "ExtractAudio"):
+            on_update({"state": "processing", "progress": 95})
+
+    def _download_files(self, url, output_template, options, info, on_update):
+        on_update = on_update or (lambda fields: None)
+        params = self.build_params(output_template, options, on_update)
+        try:
+            with self._yt_dlp.YoutubeDL(params) as ydl:
+                if info is not None:
+                    try:
+                        result = ydl.process_ie_result(ydl.sanitize_info(info, True), download=True)
+                    except self._yt_dlp.utils.DownloadError:
+                        # Stream URLs in the cached info may have expired
+                        result = ydl.extract_info(info.get("webpage_url") or url, download=True)
+                else:
+                    result = ydl.extract_info(url, download=True)
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise DownloadError(str(e))
+
+        downloads = (result or {}).get("requested_downloads") or []
+        return [d["filepath"] for d in downloads if d.get("filepath")]
+
+
+class AsyncExtractor:
+    """Metadata extraction for asyncio servers, with the same strategies as BaseEngine.extract_info.
+
+    The yt-dlp CLI runs under asyncio.create_subprocess_exec, so waiting for
+    it holds no thread, whichever engine serves the rest of the backend.
+    With `hedge_after` set, the fallback strategy is also started once the
+    first has run that many seconds (as in extraction.ExtractionPolicy);
+    the first success wins and the other child is killed.
+    """
+
+    name = "asyncio"
+
+    def __init__(self, executable="yt-dlp", hedge_after=None):
+        self.executable = executable
+        self.hedge_after = hedge_after
+
+    async def extract_info(self, url):
+        (user_agent, timeout), (fallback_agent, fallback_timeout) = EXTRACT_STRATEGIES
+        primary = asyncio.ensure_future(self._timed_extract(url, user_agent, timeout))
+        fallback = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+            if done and (primary.exception() is None or is_permanent_error(primary.exception())):
+                return primary.result()
+            fallback = asyncio.ensure_future(self._timed_extract(url, fallback_agent, fallback_timeout))
+            pending = {primary, fallback}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    # The browser user agent's error is the more telling one
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in (primary, fallback):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _timed_extract(self, url, user_agent, timeout):
+        with timed_operation(self.name, "extract"):
+            return await self._extract(url, user_agent, timeout)
+
+    async def _extract(self, url, user_agent, timeout):
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *extract_command(self.executable, url, user_agent),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        YTDLP_SPAWN_SECONDS.labels(operation="extract").observe(time.perf_counter() - start)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise ExtractionError("yt-dlp timed out while extracting metadata")
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        # Info dicts run to megabytes; parse them off the event loop
+        return await asyncio.to_thread(extraction_result, process.returncode,
+                                       stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"))
+
+
+def create_engine(name="auto", executable="yt-dlp"):
+    """Build the configured engine; 'auto' prefers in-process when the yt_dlp package is installed"""
+    if name in ("auto", "inprocess"):
+        try:
+            return InProcessEngine()
+        except ImportError:
+            if name == "inprocess":
+                raise
+            log.warning("yt_dlp package not importable, falling back to the yt-dlp CLI")
+    return SubprocessEngine(executable)
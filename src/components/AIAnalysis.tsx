@@ -9,6 +9,7 @@ import { Textarea } from "@/components/ui/textarea";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { useToast } from "@/hooks/use-toast";
 import axios from 'axios';
+import { followAnalysis, AnalysisStatus } from '@/lib/downloadEvents';
 
 interface AIAnalysisProps {
   url: string;
@@ -33,6 +34,31 @@ const AIAnalysis: React.FC<AIAnalysisProps> = ({ url, videoTitle }) => {
   const [summaryLength, setSummaryLength] = useState<'brief' | 'detailed' | 'comprehensive'>('detailed');
   const { toast } = useToast();
 
+  // Resolves with the finished analysis once the background job is done;
+  // `onProgress` sees every intermediate status (e.g. transcript chunk summaries)
+  const waitForAnalysis = (
+    analysisId: string,
+    onProgress?: (status: AnalysisStatus) => void
+  ) => new Promise<AnalysisStatus>((resolve, reject) => {
+    const stop = followAnalysis(
+      analysisId,
+      (status) => {
+        onProgress?.(status);
+        if (status.state === 'done') {
+          stop();
+          resolve(status);
+        } else if (status.state === 'error') {
+          stop();
+          reject(new Error(status.error_message || 'Analysis failed'));
+        }
+      },
+      (error) => {
+        stop();
+        reject(error);
+      }
+    );
+  });
+
   const validateYouTubeUrl = (url: string) => {
     const youtubeRegex = /^(https?:\/\/)?(www\.)?(youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/|youtube\.com\/shorts\/)/;
     return youtubeRegex.test(url);
@@ -55,19 +81,46 @@ const AIAnalysis: React.FC<AIAnalysisProps> = ({ url, videoTitle }) => {
 
     setIsAnalyzing(true);
     try {
-      const response = await axios.get(`http://localhost:8095/api/video/info?url=${encodeURIComponent(currentUrl)}`);
+      const response = await axios.get(`http://localhost:8095/api/video/info?mode=transcript&url=${encodeURIComponent(currentUrl)}`);
 
       console.log('AI Analysis response:', response.data);
 
-      if (response.data) {
+      let data = response.data;
+      if (data && data.status !== 'completed' && data.analysisId) {
+        // Not cached yet: the analysis runs in the background. Show the
+        // transcript chunk summaries as they come in.
+        const pending = data;
+        const analysis = await waitForAnalysis(data.analysisId, (status) => {
+          const partials = (status.partials as { summary: string; keyPoints: string[]; topics: string[] }[] | undefined) || [];
+          if (status.state !== 'done' && partials.length > 0) {
+            setAnalysisResult({
+              title: pending.title || 'Unknown Title',
+              summary: partials.map((part) => part.summary).join('\n\n'),
+              keyPoints: partials.flatMap((part) => part.keyPoints || []),
+              topics: Array.from(new Set(partials.flatMap((part) => part.topics || []))),
+              sentiment: 'positive',
+              duration: pending.duration || 0,
+              status: `analyzing (${partials.length}/${status.chunks} parts)`
+            });
+          }
+        });
+        data = {
+          ...data,
+          aiSummary: analysis.result?.summary,
+          keyPoints: analysis.result?.keyPoints,
+          topics: analysis.result?.topics
+        };
+      }
+
+      if (data) {
         // Transform the response to match the expected format
         const transformedResult = {
-          title: response.data.title || 'Unknown Title',
-          summary: response.data.aiSummary || '',
-          keyPoints: response.data.keyPoints || [],
-          topics: response.data.topics || [],
+          title: data.title || 'Unknown Title',
+          summary: data.aiSummary || '',
+          keyPoints: data.keyPoints || [],
+          topics: data.topics || [],
           sentiment: 'positive', // Default sentiment since our API doesn't provide it
-          duration: response.data.duration || 0, // Use duration from backend
+          duration: data.duration || 0, // Use duration from backend
           status: 'completed'
         };
         
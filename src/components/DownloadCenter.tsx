@@ -6,6 +6,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { useToast } from "@/hooks/use-toast";
 import axios from 'axios';
+import { followDownload } from '@/lib/downloadEvents';
 
 const DownloadCenter: React.FC = () => {
   const [url, setUrl] = useState('');
@@ -154,11 +155,10 @@ const DownloadCenter: React.FC = () => {
           description: "Your download is being processed. Watch the progress below.",
         });
         
-        // Poll for download status
-        const pollStatus = async () => {
-          try {
-            const statusRes = await axios.get(`http://localhost:8095/api/download/status?id=${res.data.download_id}`);
-            const status = statusRes.data;
+        // Follow the pushed progress stream (falls back to polling)
+        const stopFollowing = followDownload(
+          res.data.download_id,
+          (status) => {
             
             // Update progress and additional info
             if (status.progress !== undefined) {
@@ -190,7 +190,7 @@ const DownloadCenter: React.FC = () => {
             } else if (status.state === 'error') {
               toast({
                 title: "Download Failed",
-                description: status.error || "An error occurred during download",
+                description: status.error_message || "An error occurred during download",
                 variant: "destructive",
               });
               setIsDownloading(false);
@@ -198,11 +198,10 @@ const DownloadCenter: React.FC = () => {
               setDownloadSpeed(null);
               setDownloadEta(null);
               setDownloadId(null);
-            } else {
-              // Continue polling
-              setTimeout(pollStatus, 2000);
             }
-          } catch (error) {
+          },
+          () => {
+            stopFollowing();
             toast({
               title: "Status Check Failed",
               description: "Unable to check download status",
@@ -214,10 +213,7 @@ const DownloadCenter: React.FC = () => {
             setDownloadEta(null);
             setDownloadId(null);
           }
-        };
-        
-        // Start polling
-        setTimeout(pollStatus, 2000);
+        );
         
       } else {
         toast({
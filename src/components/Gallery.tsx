@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Video, Music, FileText, Download, Trash2, Eye, Calendar, HardDrive } from 'lucide-react';
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
@@ -7,6 +7,13 @@ import { Input } from "@/components/ui/input";
 import { useToast } from "@/hooks/use-toast";
 import axios from 'axios';
 
+interface MediaInfo {
+  duration: number | null;
+  width: number | null;
+  height: number | null;
+  thumbnailUrl: string | null;
+}
+
 interface FileInfo {
   name: string;
   size: number;
@@ -14,8 +21,13 @@ interface FileInfo {
   downloadUrl: string;
   deleteUrl: string;
   type: 'video' | 'audio' | 'other';
+  media?: MediaInfo | null;
 }
 
+const API_BASE = 'http://localhost:8095';
+const GALLERY_URL = `${API_BASE}/api/gallery`;
+const PAGE_SIZE = 500;
+
 const Gallery: React.FC = () => {
   const [files, setFiles] = useState<FileInfo[]>([]);
   const [isLoading, setIsLoading] = useState(true);
@@ -24,6 +36,8 @@ const Gallery: React.FC = () => {
   const [sortBy, setSortBy] = useState<'name' | 'size' | 'date'>('date');
   const [sortOrder, setSortOrder] = useState<'asc' | 'desc'>('desc');
   const { toast } = useToast();
+  // Catalog position of the last response; refreshes only fetch what changed after it
+  const changeToken = useRef<string | null>(null);
 
   // Add auto-refresh functionality
   useEffect(() => {
@@ -54,12 +68,11 @@ const Gallery: React.FC = () => {
       setIsRefreshing(true);
     }
     try {
-      const response = await axios.get('http://localhost:8095/api/gallery');
-      const fileList = response.data.files.map((file: any) => ({
-        ...file,
-        type: getFileType(file.name)
-      }));
-      setFiles(fileList);
+      if (changeToken.current) {
+        await applyChanges();
+      } else {
+        await loadAllFiles();
+      }
     } catch (error: any) {
       toast({
         title: "Error",
@@ -75,6 +88,52 @@ const Gallery: React.FC = () => {
     }
   };
 
+  const toFileInfo = (file: any): FileInfo => ({
+    ...file,
+    lastModified: file.modified * 1000,
+    type: file.type || getFileType(file.name)
+  });
+
+  // Page through the whole catalog, newest first
+  const loadAllFiles = async () => {
+    const allFiles: FileInfo[] = [];
+    let cursor: string | null = null;
+    let token: string | null = null;
+    do {
+      const params: Record<string, string | number> = { limit: PAGE_SIZE };
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get(GALLERY_URL, { params });
+      // The first page's token also replays changes made while paging
+      if (token === null) token = response.data.changeToken;
+      allFiles.push(...response.data.files.map(toFileInfo));
+      cursor = response.data.nextCursor;
+    } while (cursor);
+    changeToken.current = token;
+    setFiles(allFiles);
+  };
+
+  const applyChanges = async () => {
+    const response = await axios.get(GALLERY_URL, { params: { since: changeToken.current } });
+    if (response.data.reset) {
+      await loadAllFiles();
+      return;
+    }
+    changeToken.current = response.data.changeToken;
+    const changes = response.data.changes;
+    if (changes.length === 0) return;
+    setFiles(current => {
+      const byName = new Map(current.map(file => [file.name, file]));
+      for (const change of changes) {
+        if (change.op === 'delete') {
+          byName.delete(change.name);
+        } else {
+          byName.set(change.file.name, toFileInfo(change.file));
+        }
+      }
+      return Array.from(byName.values());
+    });
+  };
+
   const getFileType = (filename: string): 'video' | 'audio' | 'other' => {
     const ext = filename.toLowerCase().split('.').pop();
     if (['mp4', 'webm', 'mkv', 'avi', 'mov'].includes(ext || '')) return 'video';
@@ -90,6 +149,22 @@ const Gallery: React.FC = () => {
     return `${parseFloat((bytes / Math.pow(k, i)).toFixed(1))} ${sizes[i]}`;
   };
 
+  const formatDuration = (seconds: number): string => {
+    const total = Math.round(seconds);
+    const h = Math.floor(total / 3600);
+    const m = Math.floor((total % 3600) / 60);
+    const s = String(total % 60).padStart(2, '0');
+    return h > 0 ? `${h}:${String(m).padStart(2, '0')}:${s}` : `${m}:${s}`;
+  };
+
+  const describeMedia = (media?: MediaInfo | null): string => {
+    if (!media) return '';
+    const parts: string[] = [];
+    if (media.duration) parts.push(formatDuration(media.duration));
+    if (media.width && media.height) parts.push(`${media.width}×${media.height}`);
+    return parts.join(' · ');
+  };
+
   const formatDate = (timestamp: number): string => {
     return new Date(timestamp).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -376,6 +451,14 @@ const Gallery: React.FC = () => {
           {filteredAndSortedFiles.map((file, index) => (
             <Card key={index} className="border-0 shadow-lg bg-white dark:bg-slate-800 hover:shadow-xl transition-shadow">
               <CardContent className="p-4">
+                {file.media?.thumbnailUrl && (
+                  <img
+                    src={`${API_BASE}${file.media.thumbnailUrl}`}
+                    alt=""
+                    loading="lazy"
+                    className="w-full aspect-video object-cover rounded-md mb-3 bg-slate-100 dark:bg-slate-700"
+                  />
+                )}
                 <div className="flex items-start justify-between mb-3">
                   <div className="flex items-start space-x-2 flex-1 min-w-0">
                     {getFileIcon(file.type)}
@@ -385,6 +468,7 @@ const Gallery: React.FC = () => {
                       </p>
                       <p className="text-xs text-slate-600 dark:text-slate-400">
                         {formatFileSize(file.size)}
+                        {describeMedia(file.media) && ` · ${describeMedia(file.media)}`}
                       </p>
                     </div>
                   </div>
@@ -4,7 +4,7 @@ import { Progress } from "@/components/ui/progress";
 import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
 import { Clock, Download, Pause, Play, X, CheckCircle, AlertCircle } from 'lucide-react';
-import axios from 'axios';
+import { followDownload } from '@/lib/downloadEvents';
 
 interface ProgressTrackerProps {
   downloadId: string | null;
@@ -34,43 +34,33 @@ const ProgressTracker: React.FC<ProgressTrackerProps> = ({
   const [eta, setEta] = useState<string>('');
 
   useEffect(() => {
-    if (downloadId && isDownloading) {
-      setStartTime(Date.now());
-      pollProgress();
-    } else {
+    if (!downloadId || !isDownloading) {
       setProgress(null);
       setStartTime(null);
       setEta('');
+      return;
     }
-  }, [downloadId, isDownloading]);
-
-  const pollProgress = async () => {
-    if (!downloadId || !isDownloading) return;
-
-    try {
-              const response = await axios.get(`http://localhost:8095/api/download/status?id=${downloadId}`);
-      const data = response.data;
-      
-      setProgress(data);
-      
-      // Calculate ETA
-      if (data.progress > 0 && startTime) {
-        const elapsed = (Date.now() - startTime) / 1000;
-        const rate = data.progress / elapsed;
-        const remaining = (100 - data.progress) / rate;
-        setEta(formatTime(remaining));
-      }
 
-      // Continue polling if not completed or error
-      if (data.state === 'downloading' || data.state === 'processing') {
-        setTimeout(pollProgress, 1000);
-      }
-    } catch (error) {
-      console.error('Error polling progress:', error);
-      // Retry after 2 seconds
-      setTimeout(pollProgress, 2000);
-    }
-  };
+    const started = Date.now();
+    setStartTime(started);
+
+    // Progress is pushed by the server; followDownload falls back to polling
+    return followDownload(
+      downloadId,
+      (data) => {
+        setProgress(data);
+
+        // Calculate ETA
+        if (data.progress > 0) {
+          const elapsed = (Date.now() - started) / 1000;
+          const rate = data.progress / elapsed;
+          const remaining = (100 - data.progress) / rate;
+          setEta(formatTime(remaining));
+        }
+      },
+      (error) => console.error('Error following progress:', error)
+    );
+  }, [downloadId, isDownloading]);
 
   const formatTime = (seconds: number): string => {
     if (seconds < 60) return `${Math.round(seconds)}s`;
@@ -0,0 +1,119 @@
+import axios from 'axios';
+
+const API_BASE = 'http://localhost:8095';
+
+export interface DownloadStatus {
+  state: string;
+  progress: number;
+  speed?: string | null;
+  eta?: string | null;
+  filePath?: string | null;
+  error_message?: string | null;
+  queuePosition?: number | null;
+  [key: string]: unknown;
+}
+
+export interface AnalysisStatus {
+  state: string;
+  result?: { summary: string; keyPoints: string[]; topics: string[] } | null;
+  error_message?: string | null;
+  [key: string]: unknown;
+}
+
+const isFinished = (status: { state: string }) => status.state === 'done' || status.state === 'error';
+
+/**
+ * Follow a background job through its server-sent event stream, merging the
+ * pushed deltas into a full status object. Falls back to polling
+ * `statusUrl` if EventSource is unavailable or the stream drops.
+ * Returns a function that stops following.
+ */
+function followJob<T extends { state: string }>(
+  statusUrl: string,
+  eventsUrl: string,
+  initial: T,
+  onStatus: (status: T) => void,
+  onError: (error: unknown) => void,
+  pollInterval: number
+): () => void {
+  let stopped = false;
+  let timer: ReturnType<typeof setTimeout> | null = null;
+  let source: EventSource | null = null;
+  let status = initial;
+
+  const poll = async () => {
+    if (stopped) return;
+    try {
+      const res = await axios.get(statusUrl);
+      status = res.data;
+      onStatus(status);
+      if (!isFinished(status) && !stopped) {
+        timer = setTimeout(poll, pollInterval);
+      }
+    } catch (error) {
+      if (!stopped) onError(error);
+    }
+  };
+
+  if (typeof EventSource === 'undefined') {
+    poll();
+  } else {
+    source = new EventSource(eventsUrl);
+    source.addEventListener('progress', (event) => {
+      const { id: _id, ...delta } = JSON.parse((event as MessageEvent).data);
+      status = { ...status, ...delta };
+      onStatus(status);
+    });
+    source.addEventListener('end', () => source?.close());
+    source.addEventListener('gone', () => {
+      source?.close();
+      onError(new Error('Job not found'));
+    });
+    source.onerror = () => {
+      source?.close();
+      if (!isFinished(status) && !stopped) poll();
+    };
+  }
+
+  return () => {
+    stopped = true;
+    source?.close();
+    if (timer) clearTimeout(timer);
+  };
+}
+
+/** Follow a download's progress (see followJob). */
+export function followDownload(
+  downloadId: string,
+  onStatus: (status: DownloadStatus) => void,
+  onError: (error: unknown) => void,
+  pollInterval = 2000
+): () => void {
+  const id = encodeURIComponent(downloadId);
+  return followJob(
+    `${API_BASE}/api/download/status?id=${id}`,
+    `${API_BASE}/api/download/events?id=${id}`,
+    { state: 'started', progress: 0 } as DownloadStatus,
+    onStatus,
+    onError,
+    pollInterval
+  );
+}
+
+/** Follow a background AI analysis until its result is ready (see followJob). */
+export function followAnalysis(
+  analysisId: string,
+  onStatus: (status: AnalysisStatus) => void,
+  onError: (error: unknown) => void,
+  pollInterval = 1000
+): () => void {
+  const id = encodeURIComponent(analysisId);
+  return followJob(
+    `${API_BASE}/api/analysis/${id}`,
+    `${API_BASE}/api/analysis/events?id=${id}`,
+    { state: 'pending' } as AnalysisStatus,
+    onStatus,
+    onError,
+    pollInterval
+  );
+}